@@ -2,13 +2,14 @@ import argparse
 import cv2
 import os
 import torch
-from torch.utils.data import Dataset, DataLoader
-from torchvision import transforms
-from dataloader import ToTensor, Normalize
 from model import EventDetector
 import numpy as np
 import torch.nn.functional as F
 from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from frame_source import FrameSource
 
 EVENT_NAMES_8 = {
     0: 'Address',
@@ -48,131 +49,167 @@ def decode_events_independent(probs: np.ndarray, num_events: int) -> np.ndarray:
     return np.asarray([int(np.argmax(probs[:, i])) for i in range(num_events)], dtype=np.int32)
 
 
-def decode_events_ordered(probs: np.ndarray, num_events: int, eps: float = 1e-9) -> np.ndarray:
-    """Decode event frames with an ordering constraint.
+# score of frames outside a decode window (finite, so masked sums stay comparable)
+_MASKED = -1e18
 
-    Finds frames f_0 <= f_1 <= ... <= f_{E-1} maximizing sum log P(class=i | f_i).
-    This avoids "later event happens before earlier event" artifacts.
-    """
-    logp = np.log(np.clip(probs[:, :num_events], eps, 1.0)).astype(np.float64)
-    T = logp.shape[0]
-    E = num_events
 
-    dp = np.full((E, T), -1e18, dtype=np.float64)
-    ptr = np.full((E, T), -1, dtype=np.int32)
+def _ordered_dp(logp: np.ndarray):
+    """Ordered decode on a (T, E) log-prob matrix; returns (frames, total log-prob).
+
+    The running "best previous frame" is a prefix max (np.maximum.accumulate). Its argmax
+    keeps the earliest frame among ties, the same as a strict '>' scan.
+    """
+    T, E = logp.shape
+    arange = np.arange(T, dtype=np.int32)
+    ptr = np.empty((E, T), dtype=np.int32)
+    ptr[0, :] = -1
 
-    dp[0, :] = logp[:, 0]
+    prev = logp[:, 0].copy()
     for e in range(1, E):
-        best_val = np.empty(T, dtype=np.float64)
-        best_idx = np.empty(T, dtype=np.int32)
-        cur_val = -1e18
-        cur_idx = 0
-        for t in range(T):
-            if dp[e - 1, t] > cur_val:
-                cur_val = dp[e - 1, t]
-                cur_idx = t
-            best_val[t] = cur_val
-            best_idx[t] = cur_idx
-        dp[e, :] = logp[:, e] + best_val
-        ptr[e, :] = best_idx
-
-    t = int(np.argmax(dp[E - 1, :]))
+        best_val = np.maximum.accumulate(prev)
+        # frame t starts a new prefix max only if it beats everything before it
+        is_new = prev > np.concatenate(([-1e18], best_val[:-1]))
+        ptr[e, :] = np.maximum.accumulate(np.where(is_new, arange, 0))
+        prev = logp[:, e] + best_val
+
+    t = int(np.argmax(prev))
+    score = float(prev[t])
     frames = np.empty(E, dtype=np.int32)
     for e in range(E - 1, -1, -1):
         frames[e] = t
         if e > 0:
             t = int(ptr[e, t])
+    return frames, score
+
+
+def decode_events_ordered(probs: np.ndarray, num_events: int, eps: float = 1e-9) -> np.ndarray:
+    """Decode event frames with an ordering constraint.
+
+    Finds frames f_0 <= f_1 <= ... <= f_{E-1} maximizing sum log P(class=i | f_i).
+    This avoids "later event happens before earlier event" artifacts.
+    Runs in O(E*T) with NumPy prefix maxima.
+    """
+    logp = np.log(np.clip(probs[:, :num_events], eps, 1.0)).astype(np.float64)
+    frames, _ = _ordered_dp(logp)
     return frames
 
 
-class SampleVideo(Dataset):
-    def __init__(self, path, target_h=380, target_w=678, transform=None):
-        self.path = path
-        self.target_h = int(target_h)
-        self.target_w = int(target_w)
-        self.transform = transform
+def _window_scores(logp: np.ndarray, starts: np.ndarray, ends: np.ndarray, chunk: int = 256) -> np.ndarray:
+    """Best ordered-decode score of every window logp[starts[i]:ends[i]] (all windows at most W frames long).
 
-    def __len__(self):
-        return 1
+    Frames past a window's end are masked, so windows are scored in batches as (n, W, E) views of a padded
+    logp; the score equals _ordered_dp(logp[a:b])[1].
+    """
+    T, E = logp.shape
+    W = int(np.max(ends - starts)) if len(starts) else 0
+    scores = np.empty(len(starts), dtype=np.float64)
+    if W == 0:
+        return scores
+    padded = np.concatenate((logp, np.full((W, E), _MASKED)))
+    windows = np.lib.stride_tricks.sliding_window_view(padded, W, axis=0)  # (T + 1, E, W)
+    offsets = np.arange(W)
+    for i in range(0, len(starts), chunk):
+        a = starts[i:i + chunk]
+        win = windows[a].transpose(0, 2, 1)  # (n, W, E)
+        valid = offsets[None, :] < (ends[i:i + chunk] - a)[:, None]
+        prev = np.where(valid, win[:, :, 0], _MASKED)
+        for e in range(1, E):
+            prev = np.where(valid, win[:, :, e], _MASKED) + np.maximum.accumulate(prev, axis=1)
+        scores[i:i + chunk] = prev.max(axis=1)
+    return scores
+
+
+def decode_events_topk(
+    probs: np.ndarray,
+    num_events: int,
+    top_k: int = 1,
+    min_gap: int = 0,
+    min_confidence: float | None = None,
+    max_span: int | None = None,
+    eps: float = 1e-9,
+):
+    """Decode up to top_k non-overlapping ordered event sequences (one per swing).
 
-    def __getitem__(self, idx):
-        cap = cv2.VideoCapture(self.path)
-        if not cap.isOpened():
-            raise FileNotFoundError(f'Cannot open video: {self.path}')
-        frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        th, tw = self.target_h, self.target_w
+    Each pick is the best ordered sequence that lies entirely inside a free span. After a
+    pick, [f_0 - min_gap, f_{E-1} + min_gap] is blocked. Decoding stops early when the
+    geometric-mean event confidence exp(score / E) drops below min_confidence.
 
-        scale = min(tw / max(frame_w, 1), th / max(frame_h, 1))
-        new_w = max(1, int(round(frame_w * scale)))
-        new_h = max(1, int(round(frame_h * scale)))
-        delta_w = tw - new_w
-        delta_h = th - new_h
-        top, bottom = delta_h // 2, delta_h - (delta_h // 2)
-        left, right = delta_w // 2, delta_w - (delta_w // 2)
-
-        # preprocess and return frames
-        images = []
-        for pos in range(int(cap.get(cv2.CAP_PROP_FRAME_COUNT))):
-            ret, img = cap.read()
-            if not ret or img is None:
+    max_span limits f_{E-1} - f_0 of every pick. Without it one pick can take the Address of one
+    swing and the later events of the next swing. Candidates are then windows [a, a + max_span]
+    truncated at the first blocked frame; their scores are computed once and after each pick only
+    the windows that reach into the newly blocked frames are rescored.
+
+    Returns (events, scores): events (K, E) int32 and scores (K,) float64, sorted by start frame.
+    """
+    logp = np.log(np.clip(probs[:, :num_events], eps, 1.0)).astype(np.float64)
+    T, E = logp.shape
+    blocked = np.zeros(T, dtype=bool)
+    picks = []
+
+    if max_span is not None:
+        W = max(int(max_span), 0) + 1
+        starts = np.arange(T)
+        ends = np.minimum(starts + W, T)
+        scores = _window_scores(logp, starts, ends)
+
+    for _ in range(max(int(top_k), 0)):
+        if max_span is not None:
+            if blocked.all():
+                break
+            a = int(np.argmax(np.where(blocked, -np.inf, scores)))
+            frames, score = _ordered_dp(logp[a:ends[a]])
+            frames = frames + a
+        else:
+            # free contiguous spans [starts[i], ends[i])
+            edges = np.diff(np.concatenate(([1], blocked.astype(np.int8), [1])))
+            span_starts = np.flatnonzero(edges == -1)
+            span_ends = np.flatnonzero(edges == 1)
+            if len(span_starts) == 0:
                 break
-            resized = cv2.resize(img, (new_w, new_h))
-            b_img = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT,
-                                       value=[0.406 * 255, 0.456 * 255, 0.485 * 255])  # ImageNet means (BGR)
 
-            if b_img.shape[0] != th or b_img.shape[1] != tw:
-                b_img = cv2.resize(b_img, (tw, th))
+            best = None
+            for a, b in zip(span_starts, span_ends):
+                frames, score = _ordered_dp(logp[a:b])
+                if best is None or score > best[1]:
+                    best = (frames + a, score)
+            frames, score = best
 
-            b_img_rgb = cv2.cvtColor(b_img, cv2.COLOR_BGR2RGB)
-            images.append(b_img_rgb)
-        cap.release()
+        if min_confidence is not None and np.exp(score / E) < min_confidence:
+            break
+        picks.append((frames, score))
+        lo = max(int(frames[0]) - int(min_gap), 0)
+        hi = min(int(frames[-1]) + int(min_gap) + 1, T)
+        blocked[lo:hi] = True
 
-        if len(images) == 0:
-            raise ValueError('No frames were read from the video (empty decode).')
+        if max_span is not None:
+            # windows starting before lo now end at lo; windows starting inside [lo, hi) are never picked
+            touched = np.flatnonzero((starts < lo) & (ends > lo))
+            ends[touched] = lo
+            scores[touched] = _window_scores(logp, touched, ends[touched])
 
-        labels = np.zeros(len(images)) # only for compatibility with transforms
-        sample = {'images': np.stack(images, axis=0), 'labels': np.asarray(labels)}
-        if self.transform:
-            sample = self.transform(sample)
-        return sample
+    picks.sort(key=lambda x: int(x[0][0]))
+    events = np.asarray([f for f, _ in picks], dtype=np.int32).reshape(len(picks), E)
+    scores = np.asarray([sc for _, sc in picks], dtype=np.float64)
+    return events, scores
 
 
-def extract_key_frames(
-    video_path: str,
-    weights: str,
-    seq_length: int = 64,
-    num_events: int | None = 8,
-    decode: str = "ordered",
-    height: int = 224,
-    width: int = 224,
-    output_root: str | None = None,
-):
-    """Extract swing event keyframes from a video.
+# 常驻进程内复用已加载的模型：{(权重绝对路径, mtime, num_events): (model, device, effective_num_events)}
+_MODEL_CACHE = {}
 
-    Returns a dict with:
-      - out_dir: str
-      - events: np.ndarray
-      - confidence: list[float]
-      - device: str
-      - num_events: int
-    """
-    if output_root is None:
-        output_root = str(Path(__file__).resolve().parent / "output")
 
-    if decode not in {"ordered", "independent"}:
-        raise ValueError("decode must be 'ordered' or 'independent'")
+def load_event_detector(weights: str, num_events: int | None = 8):
+    """加载 SwingNet(EventDetector) 并缓存，同一进程内重复调用直接返回已加载的模型。
 
-    ds = SampleVideo(
-        video_path,
-        target_h=height,
-        target_w=width,
-        transform=transforms.Compose([
-            ToTensor(),
-            Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225]),
-        ]),
-    )
-    dl = DataLoader(ds, batch_size=1, shuffle=False, drop_last=False)
+    Returns (model, device, effective_num_events).
+    """
+    weights_path = Path(weights).resolve()
+    try:
+        mtime = weights_path.stat().st_mtime
+    except OSError:
+        mtime = None
+    cache_key = (str(weights_path), mtime, num_events)
+    if cache_key in _MODEL_CACHE:
+        return _MODEL_CACHE[cache_key]
 
     try:
         save_dict = _torch_load(weights, map_location="cpu")
@@ -207,39 +244,306 @@ def extract_key_frames(
     model.to(device)
     model.eval()
 
-    with torch.inference_mode():
-        probs = None
-        for sample in dl:
-            images = sample["images"]
-            batch = 0
-            while batch * seq_length < images.shape[1]:
-                if (batch + 1) * seq_length > images.shape[1]:
-                    image_batch = images[:, batch * seq_length:, :, :, :]
-                else:
-                    image_batch = images[:, batch * seq_length:(batch + 1) * seq_length, :, :, :]
-                logits = model(image_batch.to(device))
-                p = F.softmax(logits, dim=1).cpu().numpy()
-                probs = p if probs is None else np.append(probs, p, 0)
-                batch += 1
-
-    if probs is None:
-        raise ValueError("Failed to compute event probabilities (empty video?).")
+    _MODEL_CACHE.clear()
+    _MODEL_CACHE[cache_key] = (model, device, int(effective_num_events))
+    return _MODEL_CACHE[cache_key]
+
+
+class SwingNetPreprocessor:
+    """SwingNet 预处理订阅者：挂到 FrameSource 上，逐帧等比缩放 + 填充到模型输入尺寸并转为 RGB。"""
+
+    def __init__(self, target_h=380, target_w=678):
+        self.target_h = int(target_h)
+        self.target_w = int(target_w)
+        self.frames = []
+
+    def on_start(self, meta):
+        frame_h = int(meta["height"])
+        frame_w = int(meta["width"])
+        th, tw = self.target_h, self.target_w
+
+        scale = min(tw / max(frame_w, 1), th / max(frame_h, 1))
+        self.new_w = max(1, int(round(frame_w * scale)))
+        self.new_h = max(1, int(round(frame_h * scale)))
+        delta_w = tw - self.new_w
+        delta_h = th - self.new_h
+        self.top, self.bottom = delta_h // 2, delta_h - (delta_h // 2)
+        self.left, self.right = delta_w // 2, delta_w - (delta_w // 2)
+        self.frames = []
+
+    def preprocess(self, img):
+        th, tw = self.target_h, self.target_w
+        resized = cv2.resize(img, (self.new_w, self.new_h))
+        b_img = cv2.copyMakeBorder(resized, self.top, self.bottom, self.left, self.right, cv2.BORDER_CONSTANT,
+                                   value=[0.406 * 255, 0.456 * 255, 0.485 * 255])  # ImageNet means (BGR)
+
+        if b_img.shape[0] != th or b_img.shape[1] != tw:
+            b_img = cv2.resize(b_img, (tw, th))
+
+        return cv2.cvtColor(b_img, cv2.COLOR_BGR2RGB)
+
+    def on_frame(self, idx, frame):
+        self.frames.append(self.preprocess(frame))
+
+    def images(self):
+        """返回 (T,H,W,3) uint8 RGB 数组。"""
+        if len(self.frames) == 0:
+            raise ValueError('No frames were read from the video (empty decode).')
+        return np.stack(self.frames, axis=0)
+
+
+class SwingNetStreamer:
+    """流式 SwingNet 推理订阅者：挂到 FrameSource 上，每攒满 seq_length 帧就做一次前向推理。
+
+    只保留一个 (seq_length,H,W,3) 的窗口缓冲，概率写入预分配数组（不够时容量翻倍），
+    内存占用与视频长度无关。每个窗口独立初始化 LSTM 状态，与整段载入后按 seq_length 切片推理的结果完全一致。
+    """
+
+    def __init__(self, model, device, num_events, seq_length=64, target_h=224, target_w=224):
+        self.model = model
+        self.device = device
+        self.num_events = int(num_events)
+        self.seq_length = int(seq_length)
+        self.prep = SwingNetPreprocessor(target_h=target_h, target_w=target_w)
+        self.window = np.empty((self.seq_length, self.prep.target_h, self.prep.target_w, 3), dtype=np.uint8)
+        self.mean = torch.tensor([0.485, 0.456, 0.406], dtype=torch.float32)[None, :, None, None]
+        self.std = torch.tensor([0.229, 0.224, 0.225], dtype=torch.float32)[None, :, None, None]
+        self._n = 0
+        self._probs = None
+        self._num_probs = 0
+        self._capacity = 0
+
+    def on_start(self, meta):
+        self.prep.on_start(meta)
+        self._n = 0
+        self._num_probs = 0
+        # 按视频帧数预分配，帧数未知时先给 1024
+        self._capacity = max(int(meta.get("frame_count") or 0), 1024)
+        self._probs = None
+
+    def on_frame(self, idx, frame):
+        self.window[self._n] = self.prep.preprocess(frame)
+        self._n += 1
+        if self._n == self.seq_length:
+            self._flush()
+
+    def on_end(self):
+        if self._n > 0:
+            self._flush()
+
+    def _flush(self):
+        # 与 ToTensor + Normalize 相同的运算顺序，保证数值一致
+        x = torch.from_numpy(self.window[:self._n].transpose((0, 3, 1, 2))).float().div(255.)
+        x.sub_(self.mean).div_(self.std)
+        with torch.inference_mode():
+            logits = self.model(x.unsqueeze(0).to(self.device))
+            p = F.softmax(logits, dim=1).cpu().numpy()
+        self._append(p)
+        self._n = 0
+
+    def _append(self, p):
+        if self._probs is None:
+            self._probs = np.empty((self._capacity, p.shape[1]), dtype=p.dtype)
+        need = self._num_probs + len(p)
+        if need > len(self._probs):
+            grown = np.empty((max(need, 2 * len(self._probs)), self._probs.shape[1]), dtype=self._probs.dtype)
+            grown[:self._num_probs] = self._probs[:self._num_probs]
+            self._probs = grown
+        self._probs[self._num_probs:need] = p
+        self._num_probs = need
+
+    def probs(self):
+        """返回 (T, num_classes) 的逐帧事件概率。"""
+        if self._probs is None or self._num_probs == 0:
+            raise ValueError("Failed to compute event probabilities (empty video?).")
+        return self._probs[:self._num_probs]
+
+
+class CachedProbs:
+    """已缓存的逐帧事件概率，接口与跑完的 SwingNetStreamer 相同（可作为 streamer 传给 extract_key_frames / extract_swings）。"""
+
+    def __init__(self, probs, num_events, device="cache"):
+        self._probs = np.asarray(probs)
+        self.num_events = int(num_events)
+        self.device = device
+
+    def probs(self):
+        return self._probs
+
+
+def make_swingnet_streamer(weights: str, num_events: int | None = 8, seq_length: int = 64,
+                           height: int = 224, width: int = 224):
+    """加载（缓存的）SwingNet 并创建流式推理订阅者。"""
+    model, device, effective_num_events = load_event_detector(weights, num_events=num_events)
+    return SwingNetStreamer(model, device, effective_num_events, seq_length=seq_length,
+                            target_h=height, target_w=width)
+
+
+def extract_key_frames(
+    video_path: str,
+    weights: str,
+    seq_length: int = 64,
+    num_events: int | None = 8,
+    decode: str = "ordered",
+    height: int = 224,
+    width: int = 224,
+    output_root: str | None = None,
+    streamer: SwingNetStreamer | None = None,
+):
+    """Extract swing event keyframes from a video.
+
+    streamer: 可选，已挂在共用 FrameSource 上并跑完的 SwingNetStreamer（与其他阶段共用一次解码时传入），
+    为 None 时自行流式解码视频。
+
+    Returns a dict with:
+      - out_dir: str
+      - events: np.ndarray
+      - confidence: list[float]
+      - device: str
+      - num_events: int
+      - probs: np.ndarray 逐帧事件概率（供结果缓存）
+    """
+    if output_root is None:
+        output_root = str(Path(__file__).resolve().parent / "output")
+
+    if decode not in {"ordered", "independent"}:
+        raise ValueError("decode must be 'ordered' or 'independent'")
+
+    if streamer is None:
+        source = FrameSource(video_path)
+        streamer = source.subscribe(make_swingnet_streamer(
+            weights, num_events=num_events, seq_length=seq_length, height=height, width=width
+        ))
+        source.run()
+
+    probs = streamer.probs()
+    device = streamer.device
+    effective_num_events = streamer.num_events
+
+    events, confidence = _decode_events(probs, effective_num_events, decode)
+
+    from datetime import datetime
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_dir = str(Path(output_root) / ts)
+    _save_event_frames(video_path, events, confidence, out_dir)
+
+    return {
+        "out_dir": out_dir,
+        "events": events,
+        "confidence": confidence,
+        "device": str(device),
+        "num_events": int(effective_num_events),
+        "probs": probs,
+    }
+
+
+def segment_swings(
+    probs: np.ndarray,
+    num_events: int,
+    max_swings: int = 30,
+    min_gap: int = 30,
+    min_confidence: float | None = 0.2,
+    pad: int = 15,
+    max_frames: int | None = 300,
+):
+    """按逐帧事件概率把长视频切分成多个挥杆片段（Address -> Finish）。
+
+    用 decode_events_topk 逐个找出互不重叠的有序事件序列，每段前后各留 pad 帧（不超过 min_gap 的一半，保证片段不重叠）。
+    max_frames: 单次挥杆 Address 到 Finish 最多跨越的帧数，超过的序列不认定为挥杆（None 表示不限）。
+    返回按时间排序的列表，每项: {start, end(不含), events(绝对帧号), confidence, score}
+    """
+    events, scores = decode_events_topk(
+        probs, num_events, top_k=max_swings, min_gap=min_gap, min_confidence=min_confidence, max_span=max_frames
+    )
+    T = len(probs)
+    pad = max(0, min(int(pad), int(min_gap) // 2))
+    swings = []
+    for ev, sc in zip(events, scores):
+        if max_frames is not None and int(ev[-1]) - int(ev[0]) > int(max_frames):
+            print(f"[挥杆切分] 跳过跨度过长的序列: 帧 {int(ev[0])}-{int(ev[-1])}（上限 {int(max_frames)} 帧）")
+            continue
+        swings.append({
+            "start": max(int(ev[0]) - pad, 0),
+            "end": min(int(ev[-1]) + pad + 1, T),
+            "events": ev,
+            "confidence": [float(probs[int(e), i]) for i, e in enumerate(ev)],
+            "score": float(sc),
+        })
+    return swings
+
+
+def extract_swings(
+    video_path: str,
+    weights: str,
+    seq_length: int = 64,
+    num_events: int | None = 8,
+    height: int = 224,
+    width: int = 224,
+    output_root: str | None = None,
+    streamer: SwingNetStreamer | None = None,
+    max_swings: int = 30,
+    min_gap: int = 30,
+    min_confidence: float | None = 0.2,
+    pad: int = 15,
+    max_frames: int | None = 300,
+):
+    """Multi-swing version of extract_key_frames for long range-session videos.
+
+    Returns a dict with:
+      - out_dir: str (每个挥杆的关键帧图片在 out_dir/swing_XX 下)
+      - swings: list[dict]（见 segment_swings，另含 out_dir）
+      - device: str
+      - num_events: int
+    """
+    if output_root is None:
+        output_root = str(Path(__file__).resolve().parent / "output")
+
+    if streamer is None:
+        source = FrameSource(video_path)
+        streamer = source.subscribe(make_swingnet_streamer(
+            weights, num_events=num_events, seq_length=seq_length, height=height, width=width
+        ))
+        source.run()
+
+    probs = streamer.probs()
+    swings = segment_swings(probs, streamer.num_events, max_swings=max_swings, min_gap=min_gap,
+                            min_confidence=min_confidence, pad=pad, max_frames=max_frames)
 
+    from datetime import datetime
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    out_dir = str(Path(output_root) / ts)
+    os.makedirs(out_dir, exist_ok=True)
+    for k, sw in enumerate(swings):
+        sw["out_dir"] = str(Path(out_dir) / f"swing_{k:02d}")
+        _save_event_frames(video_path, sw["events"], sw["confidence"], sw["out_dir"])
+
+    return {
+        "out_dir": out_dir,
+        "swings": swings,
+        "device": str(streamer.device),
+        "num_events": int(streamer.num_events),
+    }
+
+
+def _decode_events(probs: np.ndarray, num_events: int, decode: str):
+    """由逐帧概率解码事件帧，返回 (events, confidence)。"""
     if decode == "ordered":
-        events = decode_events_ordered(probs, num_events=effective_num_events)
+        events = decode_events_ordered(probs, num_events=num_events)
     else:
-        events = decode_events_independent(probs, num_events=effective_num_events)
+        events = decode_events_independent(probs, num_events=num_events)
 
     confidence = [float(probs[int(e), i]) for i, e in enumerate(events)]
+    return events, confidence
+
 
+def _save_event_frames(video_path: str, events, confidence, out_dir: str):
+    """把每个事件帧标上置信度后保存为 JPEG。"""
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         raise FileNotFoundError(f"Cannot open video: {video_path}")
 
-    from datetime import datetime
-
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    out_dir = str(Path(output_root) / ts)
     os.makedirs(out_dir, exist_ok=True)
 
     try:
@@ -263,13 +567,105 @@ def extract_key_frames(
     finally:
         cap.release()
 
-    return {
-        "out_dir": out_dir,
-        "events": events,
-        "confidence": confidence,
-        "device": str(device),
-        "num_events": int(effective_num_events),
-    }
+
+def _iter_windows(video_path: str, prep: SwingNetPreprocessor, seq_length: int):
+    """流式解码视频，依次产出预处理后的 (n,H,W,3) uint8 窗口（n <= seq_length）。"""
+    source = FrameSource(video_path)
+    window = None
+    n = 0
+    for _, frame in source.frames():
+        if window is None:
+            prep.on_start(source.meta)
+            window = np.empty((seq_length, prep.target_h, prep.target_w, 3), dtype=np.uint8)
+        window[n] = prep.preprocess(frame)
+        n += 1
+        if n == seq_length:
+            yield window.copy()
+            n = 0
+    if n > 0:
+        yield window[:n].copy()
+
+
+def extract_key_frames_batch(
+    videos,
+    weights: str,
+    seq_length: int = 64,
+    num_events: int | None = 8,
+    decode: str = "ordered",
+    height: int = 224,
+    width: int = 224,
+    output_root: str | None = None,
+    batch_windows: int = 16,
+):
+    """Extract swing event keyframes from many videos with batched inference.
+
+    videos: 视频路径列表。各视频按 seq_length 切成窗口后跨视频拼成一个批次（最多 batch_windows 个窗口），
+    不足 seq_length 的尾窗口补零并通过 lengths 交给 EventDetector 打包，结果与逐个视频调用 extract_key_frames 一致。
+
+    Returns a list of dicts (same keys as extract_key_frames, plus video_path), in input order.
+    """
+    if output_root is None:
+        output_root = str(Path(__file__).resolve().parent / "output")
+
+    if decode not in {"ordered", "independent"}:
+        raise ValueError("decode must be 'ordered' or 'independent'")
+
+    videos = [str(v) for v in videos]
+    model, device, effective_num_events = load_event_detector(weights, num_events=num_events)
+    mean = torch.tensor([0.485, 0.456, 0.406], dtype=torch.float32)[None, None, :, None, None]
+    std = torch.tensor([0.229, 0.224, 0.225], dtype=torch.float32)[None, None, :, None, None]
+
+    probs_parts = [[] for _ in videos]
+    pending = []  # [(视频序号, 窗口)]
+
+    def run_batch():
+        lengths = [len(w) for _, w in pending]
+        batch = np.zeros((len(pending), seq_length, height, width, 3), dtype=np.uint8)
+        for b, (_, w) in enumerate(pending):
+            batch[b, :len(w)] = w
+        x = torch.from_numpy(batch.transpose((0, 1, 4, 2, 3))).float().div(255.)
+        x.sub_(mean).div_(std)
+        with torch.inference_mode():
+            logits = model(x.to(device), lengths=torch.tensor(lengths, dtype=torch.int64))
+            p = F.softmax(logits, dim=1).cpu().numpy().reshape(len(pending), seq_length, -1)
+        for b, (k, _) in enumerate(pending):
+            probs_parts[k].append(p[b, :lengths[b]])
+        pending.clear()
+
+    for k, video_path in enumerate(videos):
+        prep = SwingNetPreprocessor(target_h=height, target_w=width)
+        try:
+            for window in _iter_windows(video_path, prep, seq_length):
+                pending.append((k, window))
+                if len(pending) >= batch_windows:
+                    run_batch()
+        except FileNotFoundError as e:
+            print(f"[批量关键帧] 跳过无法打开的视频: {video_path} ({e})")
+    if pending:
+        run_batch()
+
+    from datetime import datetime
+
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    results = []
+    for k, video_path in enumerate(videos):
+        if not probs_parts[k]:
+            results.append(None)
+            continue
+        probs = np.concatenate(probs_parts[k], axis=0)
+        probs_parts[k] = None
+        events, confidence = _decode_events(probs, effective_num_events, decode)
+        out_dir = str(Path(output_root) / ts / f"{k:03d}_{Path(video_path).stem}")
+        _save_event_frames(video_path, events, confidence, out_dir)
+        results.append({
+            "video_path": video_path,
+            "out_dir": out_dir,
+            "events": events,
+            "confidence": confidence,
+            "device": str(device),
+            "num_events": int(effective_num_events),
+        })
+    return results
 
 
 if __name__ == '__main__':
@@ -278,16 +674,36 @@ if __name__ == '__main__':
     import config
 
     parser = argparse.ArgumentParser()
-    parser.add_argument('-p', '--path', help='Path to video that you want to test', required=True)
+    parser.add_argument('-p', '--path', nargs='+', help='Path(s) to video that you want to test; several paths run batched inference', required=True)
     parser.add_argument('-s', '--seq-length', type=int, help='Number of frames to use per forward pass', default=config.KEYFRAME_CONFIG['SEQ_LENGTH'])
     parser.add_argument('-e', '--num-events', type=int, help='Number of swing events (excluding no-event). If omitted, infer from checkpoint.', default=config.KEYFRAME_CONFIG['NUM_EVENTS'])
     parser.add_argument('-w', '--weights', type=str, help='Path to model checkpoint (.pth.tar)', default=config.KEYFRAME_CONFIG['WEIGHTS_PATH'])
     parser.add_argument('--decode', choices=['ordered', 'independent'], default=config.KEYFRAME_CONFIG['DECODE_METHOD'], help='How to pick event frames from per-frame probabilities')
     parser.add_argument('--height', type=int, default=config.KEYFRAME_CONFIG['INPUT_SIZE'][0], help='Model input height (after resize/pad)')
     parser.add_argument('--width', type=int, default=config.KEYFRAME_CONFIG['INPUT_SIZE'][1], help='Model input width (after resize/pad)')
+    parser.add_argument('--batch-windows', type=int, default=16, help='Max windows per forward pass when several videos are given')
     args = parser.parse_args()
+    if len(args.path) > 1:
+        results = extract_key_frames_batch(
+            videos=args.path,
+            weights=args.weights,
+            seq_length=args.seq_length,
+            num_events=args.num_events,
+            decode=args.decode,
+            height=args.height,
+            width=args.width,
+            output_root=None,
+            batch_windows=args.batch_windows,
+        )
+        for path, result in zip(args.path, results):
+            if result is None:
+                print(f"{path}: no frames decoded")
+                continue
+            print(f"{path}: events={result['events']} -> {result['out_dir']}")
+        sys.exit(0)
+
     result = extract_key_frames(
-        video_path=args.path,
+        video_path=args.path[0],
         weights=args.weights,
         seq_length=args.seq_length,
         num_events=args.num_events,
@@ -69,7 +69,15 @@ class EventDetector(nn.Module):
 
         # LSTM forward
         r_in = c_out.view(batch_size, timesteps, -1)
-        r_out, states = self.rnn(r_in, self.hidden)
+        if lengths is None:
+            r_out, states = self.rnn(r_in, self.hidden)
+        else:
+            # 批内各序列长度不同：打包后再过 LSTM，反向方向不会读到补零帧
+            packed = nn.utils.rnn.pack_padded_sequence(
+                r_in, torch.as_tensor(lengths, dtype=torch.int64).cpu(), batch_first=True, enforce_sorted=False
+            )
+            r_out, states = self.rnn(packed, self.hidden)
+            r_out, _ = nn.utils.rnn.pad_packed_sequence(r_out, batch_first=True, total_length=timesteps)
         out = self.lin(r_out)
         out = out.view(batch_size * timesteps, self.num_classes)
 
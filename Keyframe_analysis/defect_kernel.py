@@ -0,0 +1,131 @@
+"""
+关键帧缺陷判定的 NumPy 内核（侧面 / 正面共用）
+标准范围读成按 (event_index, 指标) 下标的阈值数组，指标表 (N,M) 与阈值表广播比较，
+一次得到每个指标的标签、严重等级、缺陷数与最严重标签，不再逐行 iterrows + 逐格 classify_value。
+"""
+import numpy as np
+import pandas as pd
+
+# 标签与严重等级：nan / normal 不计入缺陷
+LABEL_NAN = "nan"
+LABEL_NORMAL = "normal"
+LABEL_SLIGHT = "slight_exceed"
+LABEL_SEVERE = "severe_insufficient"
+
+# 严重等级 -> 最严重标签
+WORST_LABELS = np.array([LABEL_NORMAL, LABEL_SLIGHT, LABEL_SEVERE], dtype=object)
+
+REQUIRED_RANGE_COLS = {"event_index", "metric", "low_th_q20", "high_th_q80", "n_samples"}
+
+
+def load_range_table(path, metrics):
+    """
+    读取标准范围 CSV
+    返回: (low, high)，形状 (最大event_index+1, M) 的 float 数组，low[ei, j] 为事件 ei、指标 metrics[j] 的 q20 阈值
+    CSV 中没有的 (事件, 指标) 组合为 NaN；同一组合出现多次时以最后一行为准
+    """
+    df = pd.read_csv(path)
+    if not REQUIRED_RANGE_COLS.issubset(set(df.columns)):
+        raise ValueError(f"标准范围CSV缺少列：{REQUIRED_RANGE_COLS - set(df.columns)}")
+
+    df = df.assign(event_index=df["event_index"].astype(int), metric=df["metric"].astype(str))
+    df = df.drop_duplicates(["event_index", "metric"], keep="last")
+    col = pd.Index(metrics).get_indexer(df["metric"])
+    df = df[col >= 0]
+    col = col[col >= 0]
+
+    n_events = int(df["event_index"].max()) + 1 if len(df) else 1
+    low = np.full((n_events, len(metrics)), np.nan, dtype=float)
+    high = np.full((n_events, len(metrics)), np.nan, dtype=float)
+    ei = df["event_index"].to_numpy()
+    low[ei, col] = pd.to_numeric(df["low_th_q20"], errors="coerce").to_numpy(dtype=float)
+    high[ei, col] = pd.to_numeric(df["high_th_q80"], errors="coerce").to_numpy(dtype=float)
+    return low, high
+
+
+def lookup_thresholds(table, event_index):
+    """按每行的 event_index 取阈值行，超出范围的事件为 NaN。"""
+    ei = np.asarray(event_index, dtype=np.int64)
+    inside = (ei >= 0) & (ei < table.shape[0])
+    out = np.full((len(ei), table.shape[1]), np.nan, dtype=float)
+    out[inside] = table[ei[inside]]
+    return out
+
+
+def classify_matrix(X, low, high, low_is_bad=True, high_is_bad=True):
+    """
+    三分类（与逐格规则一致）：
+      值或阈值为 NaN -> "nan"；低于 q20 -> 严重不足；高于 q80 -> 略超；其余 -> 正常
+    low_is_bad / high_is_bad 可为标量或 (M,) 布尔数组
+    返回: (labels (N,M) object, rank (N,M) int：2严重不足 / 1略超 / 0其他)
+    """
+    X = np.asarray(X, dtype=float)
+    low_is_bad = np.asarray(low_is_bad, dtype=bool)
+    high_is_bad = np.asarray(high_is_bad, dtype=bool)
+
+    missing = np.isnan(X) | np.isnan(low) | np.isnan(high)
+    with np.errstate(invalid="ignore"):
+        severe = ~missing & low_is_bad & (X < low)
+        slight = ~missing & ~severe & high_is_bad & (X > high)
+
+    rank = np.where(severe, 2, np.where(slight, 1, 0))
+    labels = WORST_LABELS[rank]
+    labels[missing] = LABEL_NAN
+    return labels, rank
+
+
+def judge_table(df, metrics, low_table, high_table, rules=None):
+    """
+    对指标表整体判定
+    df: 含 event_index 与各指标列
+    rules: {指标: {"low_is_bad": bool, "high_is_bad": bool}}，缺省两端都判缺陷
+    返回 dict: values / low / high / labels 为 (N,M)，defect_count / has_defect / worst_label 为 (N,)
+    """
+    rules = rules or {}
+    X = df[list(metrics)].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+    ei = df["event_index"].to_numpy(dtype=np.int64)
+    low = lookup_thresholds(low_table, ei)
+    high = lookup_thresholds(high_table, ei)
+    low_is_bad = [rules.get(m, {}).get("low_is_bad", True) for m in metrics]
+    high_is_bad = [rules.get(m, {}).get("high_is_bad", True) for m in metrics]
+
+    labels, rank = classify_matrix(X, low, high, low_is_bad, high_is_bad)
+    defect_count = (rank > 0).sum(axis=1)
+    worst = rank.max(axis=1) if rank.shape[1] else np.zeros(len(X), dtype=int)
+    return {
+        "values": X,
+        "low": low,
+        "high": high,
+        "labels": labels,
+        "defect_count": defect_count.astype(np.int64),
+        "has_defect": (defect_count > 0).astype(np.int64),
+        "worst_label": WORST_LABELS[worst],
+    }
+
+
+def to_long(keys, metrics, res):
+    """
+    宽表结果展开为长表（每行一个 事件×指标），等价于对 值/阈值/标签 四组列做一次 melt
+    keys: 含 video_id / event_index 的 DataFrame（行序与 res 一致）
+    """
+    n, m = res["values"].shape
+    return pd.DataFrame({
+        "video_id": np.repeat(keys["video_id"].to_numpy(), m),
+        "event_index": np.repeat(keys["event_index"].to_numpy(dtype=np.int64), m),
+        "metric": np.tile(np.asarray(metrics, dtype=object), n),
+        "value": res["values"].ravel(),
+        "low_th_q20": res["low"].ravel(),
+        "high_th_q80": res["high"].ravel(),
+        "label": res["labels"].ravel(),
+    })
+
+
+def metric_columns(metrics, res):
+    """每个指标的 值 / 阈值 / 判定 四列（按指标顺序）。"""
+    cols = {}
+    for j, m in enumerate(metrics):
+        cols[m] = res["values"][:, j]
+        cols[f"{m}__low_q20"] = res["low"][:, j]
+        cols[f"{m}__high_q80"] = res["high"][:, j]
+        cols[f"{m}__label"] = res["labels"][:, j]
+    return cols
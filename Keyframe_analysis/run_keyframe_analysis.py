@@ -9,6 +9,10 @@ import json
 current_dir = Path(__file__).resolve().parent
 if str(current_dir) not in sys.path:
     sys.path.insert(0, str(current_dir))
+if str(current_dir.parent) not in sys.path:
+    sys.path.append(str(current_dir.parent))
+
+import keypoint_store
 
 try:
     import 正面提取指标 as front_metrics
@@ -20,37 +24,33 @@ except ImportError as e:
     # Fallback or re-raise depending on needs
     raise
 
-def run_keyframe_analysis(view, input_csv, out_dir, events, num_events, std_csv=None):
+def run_keyframe_analysis(view, input_csv, out_dir, events, num_events, std_csv=None, return_frames=False):
     """
     Run keyframe analysis pipeline.
     
     Args:
         view (str): 'side' or 'front'
-        input_csv (str): Path to keypoints CSV
+        input_csv (str): Path to keypoints (keypoints.npy / its directory / legacy CSV)
         out_dir (str): Output directory
         events (list or np.array): List of event frame indices
         num_events (int): Number of events (8 or 9)
         std_csv (str): Path to standard ranges CSV
+        return_frames (bool): Also return the per-keyframe detail DataFrame (for in-memory DB ingestion)
         
     Returns:
-        tuple: (frame_out_path, video_out_path, summary_df)
+        tuple: (frame_out_path, video_out_path, summary_df), plus detail_df when return_frames is True
     """
+    failed = (None,) * (4 if return_frames else 3)
     print(f"[Keyframe Analysis] View: {view}, Events: {events}")
     
     # 1. Load Keypoints
-    if not os.path.exists(input_csv):
-        raise FileNotFoundError(f"Keypoints CSV not found: {input_csv}")
-    
-    df_pts = pd.read_csv(input_csv)
+    if keypoint_store.find_keypoints(input_csv) is None:
+        raise FileNotFoundError(f"Keypoints not found: {input_csv}")
     
-    # Extract video_id from input_csv or assume single video
-    # Usually input_csv contains one video's data
-    if 'video_id' in df_pts.columns:
-        video_ids = df_pts['video_id'].unique()
-        video_id = video_ids[0] if len(video_ids) > 0 else "unknown"
-    else:
-        video_id = "unknown"
-        df_pts['video_id'] = video_id # Add dummy video_id if missing
+    # Usually the keypoints contain one video's data; legacy CSVs are narrowed to their first video_id
+    df_pts = keypoint_store.load_keypoints(input_csv)
+    video_id = df_pts.video_id
+    df_pts = df_pts.select_video(video_id)
         
     # Ensure events is numpy array
     if isinstance(events, list):
@@ -66,7 +66,7 @@ def run_keyframe_analysis(view, input_csv, out_dir, events, num_events, std_csv=
         
     if not metrics_list:
         print("[Keyframe Analysis] No metrics calculated.")
-        return None, None, None
+        return failed
         
     df_metrics = pd.DataFrame(metrics_list)
     
@@ -82,7 +82,7 @@ def run_keyframe_analysis(view, input_csv, out_dir, events, num_events, std_csv=
         print(f"[Keyframe Analysis] Standard ranges file not found: {std_csv}")
         # Return metrics without judgment? Or fail?
         # Let's try to proceed if possible, but judge_defects needs it.
-        return None, None, None
+        return failed
 
     print(f"[Keyframe Analysis] Using standards: {std_csv}")
     
@@ -106,6 +106,8 @@ def run_keyframe_analysis(view, input_csv, out_dir, events, num_events, std_csv=
     print(f"  - {out_wide_path}")
     print(f"  - {out_long_path}")
     
+    if return_frames:
+        return out_long_path, out_wide_path, df_wide, df_long
     return out_long_path, out_wide_path, df_wide
 
 if __name__ == "__main__":
@@ -1,10 +1,13 @@
 import re
 import ast
-import math
+import sys
 import numpy as np
 import pandas as pd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import keypoint_store
+
 # ======================= 路径配置 =======================
 POINTS_CSV = r"D:\桌面\工作\高尔夫挥杆动作缺陷检测与分析\教学\缺陷分析\02\侧面\用于分析缺陷的点数据_down_the_line.csv"
 EVENTS_CSV = r"D:\桌面\工作\高尔夫挥杆动作缺陷检测与分析\教学\缺陷分析\02\侧面\关键帧数据_down_the_line.csv"
@@ -20,15 +23,6 @@ L_WRIST    = 15
 # ------------------------------------------------------
 
 # ======================= 解析函数 =======================
-def parse_xyz(s):
-    if pd.isna(s):
-        return np.array([np.nan, np.nan, np.nan], dtype=np.float32)
-    try:
-        x, y, z = ast.literal_eval(str(s))
-        return np.array([float(x), float(y), float(z)], dtype=np.float32)
-    except Exception:
-        return np.array([np.nan, np.nan, np.nan], dtype=np.float32)
-
 def parse_events(val):
     if pd.isna(val):
         return np.array([], dtype=int)
@@ -43,9 +37,19 @@ def parse_events(val):
     return np.array([int(x) for x in nums], dtype=int)
 
 # ======================= 几何计算 =======================
+# 以下函数均对 (..., 3) 的 float32 点数组逐行计算，可一次处理所有视频的所有关键帧
+def _dot(a, b):
+    """逐行点积（与对单个 float32 向量调用 np.dot 的结果逐位一致）"""
+    return (a[..., None, :] @ b[..., :, None])[..., 0, 0]
+
+def _norm(a):
+    return np.sqrt(_dot(a, a))
+
 def proj_xz(p):
     """点/向量投影到 XZ 平面（保留 x,z，令 y=0）"""
-    return np.array([float(p[0]), 0.0, float(p[2])], dtype=np.float32)
+    q = np.array(p, dtype=np.float32)
+    q[..., 1] = 0.0
+    return q
 
 def signed_angle_between_lines_xz(pL0, pR0, pL1, pR1, eps=1e-8):
     """
@@ -60,169 +64,157 @@ def signed_angle_between_lines_xz(pL0, pR0, pL1, pR1, eps=1e-8):
     a0 = proj_xz(pR0) - proj_xz(pL0)  # 起点线向量
     a1 = proj_xz(pR1) - proj_xz(pL1)  # 当前线向量
 
-    n0 = float(np.linalg.norm(a0))
-    n1 = float(np.linalg.norm(a1))
-    if n0 < eps or n1 < eps:
-        return np.nan
+    n0 = _norm(a0)
+    n1 = _norm(a1)
 
-    u0 = a0 / n0
-    u1 = a1 / n1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        u0 = a0 / n0[..., None]
+        u1 = a1 / n1[..., None]
 
-    dot = float(np.clip(np.dot(u0, u1), -1.0, 1.0))
-    ang = math.degrees(math.acos(dot))  # 0..180
+        dot = np.clip(_dot(u0, u1), -1.0, 1.0).astype(np.float64)
+        ang = np.degrees(np.arccos(dot))  # 0..180
 
-    cross_y = float(np.cross(u0, u1)[1])  # 在XZ平面中，y分量决定左右旋
-    if abs(cross_y) < 1e-10:
-        return 0.0
-
-    sign = 1.0 if cross_y > 0 else -1.0
-    return sign * ang
+        cross_y = u0[..., 2] * u1[..., 0] - u0[..., 0] * u1[..., 2]  # 在XZ平面中，y分量决定左右旋
+        out = np.where(cross_y > 0, 1.0, -1.0) * ang
+        out = np.where(np.abs(cross_y).astype(np.float64) < 1e-10, 0.0, out)
+        out = np.where((n0.astype(np.float64) < eps) | (n1.astype(np.float64) < eps), np.nan, out)
+    return out
 
 def angle_with_yz_plane(p_top, p_bottom):
     """
     身体倾斜角：身体轴线 与 YZ 面的倾斜（0 表示在 YZ 面内）
     """
-    body_vec = p_top - p_bottom
+    body_vec = np.asarray(p_top, dtype=np.float32) - np.asarray(p_bottom, dtype=np.float32)
     nx = np.array([1.0, 0.0, 0.0], dtype=np.float32)  # YZ面法向=X轴
-    n1 = float(np.linalg.norm(body_vec))
-    if n1 < 1e-8:
-        return np.nan
-    u = body_vec / n1
-    dot = float(np.clip(np.dot(u, nx), -1.0, 1.0))
-    ang_to_normal = math.degrees(math.acos(abs(dot)))  # 0..90
-    return 90.0 - ang_to_normal
+    n1 = _norm(body_vec)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        u = body_vec / n1[..., None]
+        dot = np.clip(_dot(u, nx), -1.0, 1.0).astype(np.float64)
+        ang_to_normal = np.degrees(np.arccos(np.abs(dot)))  # 0..90
+    return np.where(n1.astype(np.float64) < 1e-8, np.nan, 90.0 - ang_to_normal)
 
 # ======================= 主流程 =======================
-# ======================= 主流程 =======================
-def calculate_metrics(df_pts, events_abs, video_id):
+LANDMARKS = [L_SHOULDER, R_SHOULDER, L_HIP, R_HIP, L_WRIST]
+
+def split_events(events_abs):
     """
-    计算单个视频的指标 (侧面)
-    :param df_pts: 关键点DataFrame (包含 landmark_x 列)
-    :param events_abs: 关键帧绝对帧号数组
-    :param video_id: 视频ID
-    :return: list of dicts (metrics)
+    关键帧 -> (基准帧, 输出的关键帧)
+    兼容逻辑：长度 >= 9 时 events[0] 为基准、输出 events[1:9]；只有 8 帧时 events[0] 既是基准也是第一个输出帧
     """
-    results = []
-    
-    # 兼容逻辑：如果 events_abs 长度为 8，则取 0-7
+    events_abs = np.asarray(events_abs, dtype=np.int64)
     if events_abs.size >= 9:
-        base_abs = int(events_abs[0])
-        target_events = events_abs[1:9]
-        start_event_idx = 1
-    else:
-        # 只有8帧的情况
-        base_abs = int(events_abs[0])
-        target_events = events_abs[0:8]
-        start_event_idx = 1
-
-    # 确保 df_pts 包含该视频数据
-    df_v = df_pts[df_pts["video_id"] == str(video_id)].copy()
-    if df_v.empty:
-        df_v = df_pts[df_pts["video_id"] == int(video_id)].copy()
-        
-    if df_v.empty:
-        print(f"[WARN] video_id={video_id} 在点数据CSV中不存在，跳过。")
-        return []
-
-    df_v = df_v.set_index("frame_index")
-
-    def get_pt_abs(fr, idx):
-        if fr not in df_v.index:
-            return np.array([np.nan, np.nan, np.nan], dtype=np.float32)
-        return parse_xyz(df_v.loc[fr, f"landmark_{idx}"])
+        return int(events_abs[0]), events_abs[1:9]
+    return int(events_abs[0]), events_abs[0:8]
+
+def build_index(df_pts, video_id=None):
+    """
+    关键点 -> keypoint_store.LandmarkIndex（每个视频只建一次，按绝对帧号取点）
+    KeypointSet 视为单个视频（video_id 非空时以其为键）；旧版 DataFrame 只解析用到的关键点列
+    """
+    if isinstance(df_pts, keypoint_store.LandmarkIndex):
+        return df_pts
+    if isinstance(df_pts, keypoint_store.KeypointSet):
+        vids = df_pts.video_ids if video_id is None else np.full(len(df_pts), str(video_id), dtype=object)
+        return keypoint_store.LandmarkIndex(vids, df_pts.frame_index, df_pts.points)
+    return keypoint_store.LandmarkIndex.from_dataframe(df_pts, landmarks=LANDMARKS)
+
+def calculate_metrics_batch(df_pts, videos):
+    """
+    批量计算多个视频的关键帧指标 (侧面)，所有视频的所有关键帧一次性向量化计算
+    :param df_pts: 关键点（keypoint_store.KeypointSet / LandmarkIndex / 旧版 DataFrame）
+    :param videos: [(video_id, events_abs), ...]
+    :return: DataFrame，每行一个 (视频, 关键帧)
+    """
+    index = build_index(df_pts)
 
     # ===== 起点 (Base Frame) =====
-    ls0, rs0 = get_pt_abs(base_abs, L_SHOULDER), get_pt_abs(base_abs, R_SHOULDER)
-    lh0, rh0 = get_pt_abs(base_abs, L_HIP), get_pt_abs(base_abs, R_HIP)
-    
-    if np.isnan(ls0).all():
-         print(f"[WARN] video_id={video_id} 缺少基准帧 frame={base_abs}，跳过。")
-         return []
+    vids, bases, targets = [], [], []
+    for video_id, events_abs in videos:
+        if str(video_id) not in index:
+            print(f"[WARN] video_id={video_id} 在点数据中不存在，跳过。")
+            continue
+        if np.asarray(events_abs).size == 0:
+            print(f"[WARN] video_id={video_id} 没有关键帧，跳过。")
+            continue
+        base_abs, target_events = split_events(events_abs)
+        vids.append(video_id)
+        bases.append(base_abs)
+        targets.append(target_events)
+
+    base_pts, _ = index.gather(np.array(vids, dtype=object).astype(str), bases, LANDMARKS)
+    has_base = ~np.isnan(base_pts[:, 0]).all(axis=1)
+    for video_id, base_abs, ok in zip(vids, bases, has_base):
+        if not ok:
+            print(f"[WARN] video_id={video_id} 缺少基准帧 frame={base_abs}，跳过。")
+
+    # ===== 关键帧：展开为 (视频, 关键帧) 行 =====
+    keep = np.flatnonzero(has_base)
+    counts = np.array([len(targets[k]) for k in keep], dtype=np.int64)
+    row_video = np.repeat(keep, counts)
+    abs_frame = np.concatenate([targets[k] for k in keep]) if len(keep) else np.empty(0, dtype=np.int64)
+    event_index = np.concatenate([np.arange(1, c + 1) for c in counts]) if len(keep) else np.empty(0, dtype=np.int64)
+    base_abs = np.asarray(bases, dtype=np.int64)[row_video]
+
+    p0 = base_pts[row_video]
+    p, found = index.gather(np.array(vids, dtype=object)[row_video].astype(str), abs_frame, LANDMARKS)
+    p[~found] = np.nan
+    ls0, rs0, lh0, rh0, lhand0 = (p0[:, j] for j in range(5))
+    ls, rs, lh, rh, lhand = (p[:, j] for j in range(5))
 
     shoulder_center_0 = (ls0 + rs0) / 2.0
     hip_center_0 = (lh0 + rh0) / 2.0
-    trunk_mid_0 = (shoulder_center_0 + hip_center_0) / 2.0
-    left_hand_0 = get_pt_abs(base_abs, L_WRIST)
-
-    # ===== 关键帧 =====
-    for i, abs_frame in enumerate(target_events):
-        ei = start_event_idx + i
-        abs_frame = int(abs_frame)
-        real_frame = abs_frame - base_abs
-
-        if abs_frame not in df_v.index:
-            results.append({
-                "video_id": video_id,
-                "event_index": ei,
-                "abs_frame": abs_frame,
-                "real_frame": real_frame,
-                "shoulder_rot_rel_deg": np.nan,
-                "hip_rot_rel_deg": np.nan,
-                "body_tilt_yz_deg": np.nan,
-                "hip_dx": np.nan,
-                "shoulder_center_dx": np.nan,
-                "left_hand_dx": np.nan,
-                "energy_index": np.nan,
-            })
-            continue
+    shoulder_center = (ls + rs) / 2.0
+    hip_center = (lh + rh) / 2.0
+    trunk_mid = (shoulder_center + hip_center) / 2.0
+
+    # 1. 旋转（相对 Address）
+    shoulder_rot = signed_angle_between_lines_xz(ls0, rs0, ls, rs)
+    hip_rot = signed_angle_between_lines_xz(lh0, rh0, lh, rh)
+
+    # 2. 身体前倾（YZ平面）
+    body_tilt = angle_with_yz_plane(trunk_mid, hip_center)
+
+    # 3. 位移（相对 Address）
+    hip_dx = (hip_center[:, 0] - hip_center_0[:, 0]).astype(np.float64)
+    shoulder_center_dx = (shoulder_center[:, 0] - shoulder_center_0[:, 0]).astype(np.float64)
+    left_hand_dx = (lhand[:, 0] - lhand0[:, 0]).astype(np.float64)
+
+    # 4. 能量指数 (shoulder_rot - hip_rot)，任一为 NaN 时为 NaN
+    energy = shoulder_rot - hip_rot
+
+    return pd.DataFrame({
+        "video_id": pd.Series(np.array(vids, dtype=object)[row_video], dtype=object),
+        "event_index": event_index,
+        "abs_frame": abs_frame,
+        "real_frame": abs_frame - base_abs,
+
+        "shoulder_rot_rel_deg": shoulder_rot,
+        "hip_rot_rel_deg": hip_rot,
+        "body_tilt_yz_deg": body_tilt,
+        "hip_dx": hip_dx,
+        "shoulder_center_dx": shoulder_center_dx,
+        "left_hand_dx": left_hand_dx,
+        "energy_index": energy,
+    })
 
-        ls, rs = get_pt_abs(abs_frame, L_SHOULDER), get_pt_abs(abs_frame, R_SHOULDER)
-        lh, rh = get_pt_abs(abs_frame, L_HIP), get_pt_abs(abs_frame, R_HIP)
-        lhand = get_pt_abs(abs_frame, L_WRIST)
-
-        shoulder_center = (ls + rs) / 2.0
-        hip_center = (lh + rh) / 2.0
-        trunk_mid = (shoulder_center + hip_center) / 2.0
-
-        # 1. 旋转（相对 Address）
-        shoulder_rot = signed_angle_between_lines_xz(ls0, rs0, ls, rs)
-        hip_rot = signed_angle_between_lines_xz(lh0, rh0, lh, rh)
-
-        # 2. 身体前倾（YZ平面）
-        body_tilt = angle_with_yz_plane(trunk_mid, hip_center)
-
-        # 3. 位移（相对 Address）
-        hip_dx = float(hip_center[0] - hip_center_0[0])
-        shoulder_center_dx = float(shoulder_center[0] - shoulder_center_0[0])
-        left_hand_dx = float(lhand[0] - left_hand_0[0])
-
-        # 4. 能量指数 (shoulder_rot - hip_rot)
-        if not pd.isna(shoulder_rot) and not pd.isna(hip_rot):
-            energy = shoulder_rot - hip_rot
-        else:
-            energy = np.nan
-
-        results.append({
-            "video_id": video_id,
-            "event_index": ei,
-            "abs_frame": abs_frame,
-            "real_frame": real_frame,
-
-            "shoulder_rot_rel_deg": shoulder_rot,
-            "hip_rot_rel_deg": hip_rot,
-            "body_tilt_yz_deg": body_tilt,
-            "hip_dx": hip_dx,
-            "shoulder_center_dx": shoulder_center_dx,
-            "left_hand_dx": left_hand_dx,
-            "energy_index": energy,
-        })
-        
-    return results
+def calculate_metrics(df_pts, events_abs, video_id):
+    """
+    计算单个视频的指标 (侧面)
+    :param df_pts: 关键点DataFrame (包含 landmark_x 列)、keypoint_store.KeypointSet 或 LandmarkIndex
+    :param events_abs: 关键帧绝对帧号数组
+    :param video_id: 视频ID
+    :return: list of dicts (metrics)
+    """
+    index = build_index(df_pts, video_id=video_id)
+    return calculate_metrics_batch(index, [(video_id, events_abs)]).to_dict("records")
 
 def main():
     df_pts = pd.read_csv(POINTS_CSV)
     df_evt = pd.read_csv(EVENTS_CSV)
 
-    all_results = []
-
-    for _, evt_row in df_evt.iterrows():
-        vid = evt_row["id"]
-        events_abs = parse_events(evt_row["events"])
-        
-        res = calculate_metrics(df_pts, events_abs, vid)
-        all_results.extend(res)
-
-    df_out = pd.DataFrame(all_results)
+    # 点数据整表只解析一次，所有视频一起计算
+    videos = [(vid, parse_events(ev)) for vid, ev in zip(df_evt["id"], df_evt["events"])]
+    df_out = calculate_metrics_batch(df_pts, videos)
 
     out_path = Path(OUT_CSV)
     out_path.parent.mkdir(parents=True, exist_ok=True)
@@ -3,6 +3,8 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+import defect_kernel
+
 # ====================== 配置区 ======================
 METRICS_CSV = r"D:\桌面\工作\高尔夫挥杆动作缺陷检测与分析\教学\缺陷分析\02\侧面\缺陷指标结果_down_the_line.csv"
 
@@ -40,50 +42,10 @@ METRIC_RULES = {m: {"low_is_bad": True, "high_is_bad": True} for m in METRIC_COL
 
 
 def load_ranges_csv(path: Path):
-    df = pd.read_csv(path)
-    required = {"event_index", "metric", "low_th_q20", "high_th_q80", "n_samples"}
-    if not required.issubset(set(df.columns)):
-        raise ValueError(f"标准范围CSV缺少列：{required - set(df.columns)}")
-    # 构建字典：ranges[(event_index, metric)] = (low, high)
-    ranges = {}
-    for _, r in df.iterrows():
-        ei = int(r["event_index"])
-        m = str(r["metric"])
-        low = r["low_th_q20"]
-        high = r["high_th_q80"]
-        ranges[(ei, m)] = (low, high)
-    return ranges
-
-
-def classify_value(x, low_th, high_th, low_is_bad=True, high_is_bad=True):
-    """
-    三分类：
-      - normal
-      - slight_exceed
-      - severe_insufficient
-    若 x/阈值为 NaN -> "nan"
-    """
-    if pd.isna(x) or pd.isna(low_th) or pd.isna(high_th):
-        return "nan"
-
-    # 默认规则：低于 q20 -> 严重不足；高于 q80 -> 略超；中间 -> 正常
-    if low_is_bad and x < low_th:
-        return "severe_insufficient"
-    if high_is_bad and x > high_th:
-        return "slight_exceed"
-    return "normal"
-
-
-def severity_rank(label: str) -> int:
     """
-    用于聚合“最严重等级”
-    nan 不计入缺陷
+    读取标准范围，返回 (low, high) 阈值数组：low[event_index, j] 对应 METRIC_COLS[j] 的 q20 阈值
     """
-    if label == "severe_insufficient":
-        return 2
-    if label == "slight_exceed":
-        return 1
-    return 0
+    return defect_kernel.load_range_table(path, METRIC_COLS)
 
 
 def judge_defects(df, ranges_path):
@@ -101,92 +63,33 @@ def judge_defects(df, ranges_path):
 
     df = df[df["event_index"].isin(EVENT_INDEXES)].copy()
 
-    ranges = load_ranges_csv(Path(ranges_path))
-
-    long_rows = []
-    wide_rows = []
+    low_table, high_table = load_ranges_csv(Path(ranges_path))
 
     key_cols = ["video_id", "event_index", "abs_frame", "real_frame"]
     for k in key_cols:
         if k not in df.columns:
             df[k] = np.nan
+    df["event_index"] = df["event_index"].astype(int)
+
+    # 指标表 (N,M) 与阈值表广播比较，一次得到全部标签
+    res = defect_kernel.judge_table(df, METRIC_COLS, low_table, high_table, METRIC_RULES)
 
-    for _, row in df.iterrows():
-        vid = row["video_id"]
-        ei = int(row["event_index"])
-
-        per_metric_labels = {}
-        per_metric_values = {}
-        per_metric_low = {}
-        per_metric_high = {}
-
-        worst = 0
-        defect_cnt = 0
-
-        for m in METRIC_COLS:
-            low_th, high_th = ranges.get((ei, m), (np.nan, np.nan))
-            rule = METRIC_RULES.get(m, {"low_is_bad": True, "high_is_bad": True})
-
-            x = row[m]
-            label = classify_value(
-                x, low_th, high_th,
-                low_is_bad=rule["low_is_bad"],
-                high_is_bad=rule["high_is_bad"]
-            )
-
-            per_metric_labels[m] = label
-            per_metric_values[m] = x
-            per_metric_low[m] = low_th
-            per_metric_high[m] = high_th
-
-            rnk = severity_rank(label)
-            if rnk > 0:
-                defect_cnt += 1
-            worst = max(worst, rnk)
-
-            long_rows.append({
-                "video_id": vid,
-                "event_index": ei,
-                "metric": m,
-                "value": x,
-                "low_th_q20": low_th,
-                "high_th_q80": high_th,
-                "label": label
-            })
-
-        worst_label = "normal"
-        if worst == 2:
-            worst_label = "severe_insufficient"
-        elif worst == 1:
-            worst_label = "slight_exceed"
-
-        wide = {
-            "video_id": vid,
-            "event_index": ei,
-            "abs_frame": row["abs_frame"],
-            "real_frame": row["real_frame"],
-            "defect_count": defect_cnt,
-            "has_defect": int(defect_cnt > 0),
-            "worst_label": worst_label,
-        }
-
-        # 输出每个指标：值 / 阈值 / 判定
-        for m in METRIC_COLS:
-            wide[f"{m}"] = per_metric_values[m]
-            wide[f"{m}__low_q20"] = per_metric_low[m]
-            wide[f"{m}__high_q80"] = per_metric_high[m]
-            wide[f"{m}__label"] = per_metric_labels[m]
-
-        wide_rows.append(wide)
-
-    df_long = pd.DataFrame(long_rows)
+    df_long = defect_kernel.to_long(df, METRIC_COLS, res)
     if not df_long.empty:
         df_long = df_long.sort_values(["video_id", "event_index", "metric"])
-        
-    df_wide = pd.DataFrame(wide_rows)
+
+    # 输出每个指标：值 / 阈值 / 判定
+    wide = {k: df[k].to_numpy() for k in key_cols}
+    wide.update({
+        "defect_count": res["defect_count"],
+        "has_defect": res["has_defect"],
+        "worst_label": res["worst_label"],
+    })
+    wide.update(defect_kernel.metric_columns(METRIC_COLS, res))
+    df_wide = pd.DataFrame(wide) if len(df) else pd.DataFrame()
     if not df_wide.empty:
         df_wide = df_wide.sort_values(["video_id", "event_index"])
-        
+
     return df_wide, df_long
 
 def main():
@@ -2,6 +2,8 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
+import defect_kernel
+
 # ====================== 配置区 ======================
 METRICS_CSV = r"D:\桌面\工作\高尔夫挥杆动作缺陷检测与分析\教学\缺陷分析\02\正面\缺陷指标结果_face_on.csv"
 
@@ -27,32 +29,8 @@ METRIC_RULES = {m: {"low_is_bad": True, "high_is_bad": True} for m in METRIC_COL
 # ===================================================
 
 def load_ranges_csv(path: Path):
-    df = pd.read_csv(path)
-    required = {"event_index", "metric", "low_th_q20", "high_th_q80", "n_samples"}
-    if not required.issubset(set(df.columns)):
-        raise ValueError(f"标准范围CSV缺少列：{required - set(df.columns)}")
-    ranges = {}
-    for _, r in df.iterrows():
-        ei = int(r["event_index"])
-        m = str(r["metric"])
-        ranges[(ei, m)] = (r["low_th_q20"], r["high_th_q80"])
-    return ranges
-
-def classify_value(x, low_th, high_th, low_is_bad=True, high_is_bad=True):
-    if pd.isna(x) or pd.isna(low_th) or pd.isna(high_th):
-        return "nan"
-    if low_is_bad and x < low_th:
-        return "severe_insufficient"
-    if high_is_bad and x > high_th:
-        return "slight_exceed"
-    return "normal"
-
-def severity_rank(label: str) -> int:
-    if label == "severe_insufficient":
-        return 2
-    if label == "slight_exceed":
-        return 1
-    return 0
+    # (low, high) 阈值数组，按 [event_index, 指标序号] 取值
+    return defect_kernel.load_range_table(path, METRIC_COLS)
 
 def judge_defects(df, ranges_path):
     """
@@ -75,72 +53,26 @@ def judge_defects(df, ranges_path):
         if k not in df.columns:
             df[k] = np.nan
 
-    ranges = load_ranges_csv(Path(ranges_path))
-
-    long_rows = []
-    wide_rows = []
-
-    for _, row in df.iterrows():
-        vid = row["video_id"] # int or str
-        ei = int(row["event_index"])
-
-        worst = 0
-        defect_cnt = 0
-
-        wide = {
-            "video_id": vid,
-            "event_index": ei,
-            "abs_frame": row["abs_frame"],
-            "real_frame": row["real_frame"],
-        }
-
-        for m in METRIC_COLS:
-            low_th, high_th = ranges.get((ei, m), (np.nan, np.nan))
-            rule = METRIC_RULES[m]
-
-            x = row[m]
-            label = classify_value(x, low_th, high_th, rule["low_is_bad"], rule["high_is_bad"])
-
-            rnk = severity_rank(label)
-            if rnk > 0:
-                defect_cnt += 1
-            worst = max(worst, rnk)
-
-            long_rows.append({
-                "video_id": vid,
-                "event_index": ei,
-                "metric": m,
-                "value": x,
-                "low_th_q20": low_th,
-                "high_th_q80": high_th,
-                "label": label,
-            })
-
-            wide[m] = x
-            wide[f"{m}__low_q20"] = low_th
-            wide[f"{m}__high_q80"] = high_th
-            wide[f"{m}__label"] = label
-
-        worst_label = "normal"
-        if worst == 2:
-            worst_label = "severe_insufficient"
-        elif worst == 1:
-            worst_label = "slight_exceed"
-
-        wide["defect_count"] = defect_cnt
-        wide["has_defect"] = int(defect_cnt > 0)
-        wide["worst_label"] = worst_label
-
-        wide_rows.append(wide)
-
-    df_long = pd.DataFrame(long_rows)
+    low_table, high_table = load_ranges_csv(Path(ranges_path))
+    df["event_index"] = df["event_index"].astype(int)
+
+    res = defect_kernel.judge_table(df, METRIC_COLS, low_table, high_table, METRIC_RULES)
+
+    df_long = defect_kernel.to_long(df, METRIC_COLS, res)
     if not df_long.empty:
         df_long = df_long.sort_values(["video_id", "event_index", "metric"])
-        
-    df_wide = pd.DataFrame(wide_rows)
+
+    wide = {k: df[k].to_numpy() for k in ["video_id", "event_index", "abs_frame", "real_frame"]}
+    wide.update(defect_kernel.metric_columns(METRIC_COLS, res))
+    wide.update({
+        "defect_count": res["defect_count"],
+        "has_defect": res["has_defect"],
+        "worst_label": res["worst_label"],
+    })
+    df_wide = pd.DataFrame(wide) if len(df) else pd.DataFrame()
     if not df_wide.empty:
         df_wide = df_wide.sort_values(["video_id", "event_index"])
-        
+
     return df_wide, df_long
 
 def main():
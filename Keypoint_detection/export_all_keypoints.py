@@ -1,12 +1,20 @@
 import os
+import sys
 import argparse
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import cv2
 import numpy as np
-import pandas as pd
 import mediapipe as mp
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import config
+import keypoint_store
+from frame_source import FrameSource
+
 def landmarks_to_np(landmarks):
     """
     将 pose_landmarks.landmark 转为 shape=(33,4) 的数组:
@@ -22,140 +30,502 @@ def landmarks_to_np(landmarks):
         arr[i, 3] = lm.visibility
     return arr
 
-def process_video(video_path, output_dir, scale=1, model_complexity=1, video_id=None):
+# 常驻进程内复用的 Pose 实例：{model_complexity: Pose}
+_POSE_CACHE = {}
+
+
+def get_pose(model_complexity=1):
+    """
+    获取（并缓存）MediaPipe Pose 实例。
+    同一进程内多次调用复用同一个计算图，每个新视频开始前需调用 reset() 清除跟踪状态。
+    """
+    model_complexity = int(model_complexity)
+    pose = _POSE_CACHE.get(model_complexity)
+    if pose is None:
+        mp_pose = mp.solutions.pose
+        pose = mp_pose.Pose(
+            static_image_mode=False,
+            model_complexity=model_complexity,  # 2=最精准但最慢，1=中等，0=最快
+            enable_segmentation=False,
+            min_detection_confidence=0.5,
+            min_tracking_confidence=0.5
+        )
+        _POSE_CACHE[model_complexity] = pose
+    return pose
+
+
+class RoiTracker:
+    """
+    人体裁剪框跟踪：由上一帧关键点的外接框向外扩 pad（相对框长边）得到裁剪框（原图像素坐标）
+    关键点仍在框内（留 margin 余量）时框保持不动，只在人体接近边缘时移动，
+    这样 MediaPipe 的跟踪坐标系大部分时间不变
+    """
+
+    def __init__(self, pad=0.35, margin=0.05, min_size=0.25):
+        self.pad = float(pad)
+        self.margin = float(margin)
+        self.min_size = float(min_size)
+        self.box = None
+
+    def reset(self):
+        self.box = None
+
+    def update(self, arr, width, height):
+        """用本帧关键点（全图归一化坐标）更新裁剪框，返回框是否移动。"""
+        xy = arr[:, :2] * np.array([width, height], dtype=np.float32)
+        xy = xy[np.isfinite(xy).all(axis=1)]
+        if len(xy) == 0:
+            changed = self.box is not None
+            self.box = None
+            return changed
+        (x0, y0), (x1, y1) = xy.min(axis=0), xy.max(axis=0)
+
+        if self.box is not None:
+            bx0, by0, bx1, by1 = self.box
+            mx, my = self.margin * (bx1 - bx0), self.margin * (by1 - by0)
+            inside_x = (x0 >= bx0 + mx or bx0 <= 0) and (x1 <= bx1 - mx or bx1 >= width)
+            inside_y = (y0 >= by0 + my or by0 <= 0) and (y1 <= by1 - my or by1 >= height)
+            if inside_x and inside_y:
+                return False
+
+        side = max(x1 - x0, y1 - y0)
+        pad = self.pad * side
+        # 框至少占画面短边的 min_size，避免人体很小时裁得过紧
+        half = max(side / 2 + pad, self.min_size * min(width, height) / 2)
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        box = (
+            int(max(0, np.floor(min(cx - half, x0 - pad)))),
+            int(max(0, np.floor(min(cy - half, y0 - pad)))),
+            int(min(width, np.ceil(max(cx + half, x1 + pad)))),
+            int(min(height, np.ceil(max(cy + half, y1 + pad)))),
+        )
+        if box[2] - box[0] < 2 or box[3] - box[1] < 2:
+            box = None
+        changed = box != self.box
+        self.box = box
+        return changed
+
+
+class PoseFrameConsumer:
+    """
+    MediaPipe 订阅者：挂到 FrameSource 上逐帧做姿态估计，
+    frame_indices / points 中按帧保存帧序号与 (33,4) 的 [x,y,z,visibility]（未检测到人体为 NaN）
+    roi: 用上一帧关键点裁出人体区域再推理（RoiTracker），丢失人体时退回整帧
+    max_side: 送入 MediaPipe 的图像长边上限（0 表示不限制），缩小发生在裁剪之后、颜色转换之前
+    输出坐标始终是相对整帧的归一化坐标，与不裁剪时一致
+    """
+
+    def __init__(self, pose, video_id, scale=1, roi=False, max_side=0):
+        self.pose = pose
+        self.video_id = video_id
+        self.scale = scale
+        self.roi = RoiTracker() if roi else None
+        self.max_side = int(max_side or 0)
+        self.frame_indices = []
+        self.points = []
+        self.frame_count = 0
+
+    def on_start(self, meta):
+        orig_w, orig_h = meta["width"], meta["height"]
+        self.width, self.height = orig_w, orig_h
+        self.up_w, self.up_h = int(orig_w * self.scale), int(orig_h * self.scale)
+        self.frame_indices = []
+        self.points = []
+        self.frame_count = 0
+        if self.roi is not None:
+            self.roi.reset()
+        # 清除上一个视频遗留的跟踪状态
+        self._reset_tracking()
+        print(f"[INFO] 开始处理视频: {self.video_id}")
+        print(f"       原始尺寸=({orig_w},{orig_h}) -> 处理尺寸=({self.up_w},{self.up_h})"
+              + (f"，长边上限 {self.max_side}" if self.max_side else "")
+              + ("，人体区域裁剪" if self.roi is not None else ""))
+
+    def _reset_tracking(self):
+        if hasattr(self.pose, "reset"):
+            self.pose.reset()
+
+    def on_frame(self, idx, frame):
+        self.frame_count += 1
+        arr = self._detect(frame)
+        # 4. 记录本帧关键点
+        # 注意：这里的 x,y 是归一化坐标(0~1)，对应的是 up_w, up_h 的比例
+        if arr is None:
+            # 没检测到人体，整帧记为 NaN
+            arr = np.full((33, 4), np.nan, dtype=np.float32)
+        self.frame_indices.append(idx)
+        self.points.append(arr)
+
+        # 可选：显示进度，每100帧打印一次
+        if self.frame_count % 100 == 0:
+            print(f"       已处理 {self.frame_count} 帧...")
+
+    def _detect(self, frame):
+        """对一帧做姿态估计，返回 (33,4) 数组（整帧归一化坐标），未检测到人体返回 None。"""
+        if self.roi is None:
+            return self._infer(frame)
+
+        if self.roi.box is not None:
+            arr = self._infer(frame, self.roi.box)
+            if arr is not None:
+                if self.roi.update(arr, self.width, self.height):
+                    # 裁剪框移动后 MediaPipe 内部的跟踪坐标失效
+                    self._reset_tracking()
+                return arr
+            # 框内丢失人体，本帧退回整帧重新检测
+            self.roi.reset()
+            self._reset_tracking()
+
+        arr = self._infer(frame)
+        if arr is not None and self.roi.update(arr, self.width, self.height):
+            self._reset_tracking()
+        return arr
+
+    def _infer(self, frame, box=None):
+        """在整帧或裁剪框 box=(x0,y0,x1,y1) 上推理，关键点换算回整帧归一化坐标。"""
+        if box is not None:
+            x0, y0, x1, y1 = box
+            frame = frame[y0:y1, x0:x1]
+        h, w = frame.shape[:2]
+
+        # 1. 放大/调整尺寸（裁剪框内不再放大，只在超过长边上限时缩小）
+        factor = self.scale if box is None else 1.0
+        interpolation = cv2.INTER_CUBIC
+        if self.max_side and max(w, h) * factor > self.max_side:
+            factor = self.max_side / max(w, h)
+            interpolation = cv2.INTER_AREA
+        if factor != 1:
+            if box is None and factor == self.scale:
+                size = (self.up_w, self.up_h)
+            else:
+                size = (max(1, int(round(w * factor))), max(1, int(round(h * factor))))
+            frame_proc = cv2.resize(frame, size, interpolation=interpolation)
+        else:
+            frame_proc = frame
+
+        # 2. 转为 RGB 供 MediaPipe 使用
+        rgb = cv2.cvtColor(frame_proc, cv2.COLOR_BGR2RGB)
+
+        # 3. 推理
+        result = self.pose.process(rgb)
+        if not result.pose_landmarks:
+            return None
+        arr = landmarks_to_np(result.pose_landmarks.landmark)
+        if box is not None:
+            # 裁剪框内的归一化坐标 -> 整帧归一化坐标（z 与 x 同尺度）
+            sx, sy = w / self.width, h / self.height
+            arr[:, 0] = arr[:, 0] * sx + x0 / self.width
+            arr[:, 1] = arr[:, 1] * sy + y0 / self.height
+            arr[:, 2] = arr[:, 2] * sx
+        return arr
+
+    def on_end(self):
+        print(f"[INFO] 视频处理完毕，共 {self.frame_count} 帧。")
+
+
+class AdaptivePoseConsumer(PoseFrameConsumer):
+    """
+    自适应采样的 MediaPipe 订阅者（window / stride / motion_threshold 未指定时取 KEYPOINT_CONFIG）：
+    关键帧事件前后 window 帧内逐帧检测，其余帧每 stride 帧检测一次；
+    按前两次检测结果匀速外推本次位置，任一关键点偏差超过 motion_threshold（归一化坐标，即线性插值误差的估计）、
+    或人体出现/消失时，说明这段运动不能线性插值，回补中间跳过的帧；
+    仍跳过的帧在 on_end 中按前后检测结果线性插值，interpolated 标记这些帧
+    """
+
+    def __init__(self, pose, video_id, scale=1, events=None, window=None, stride=None, motion_threshold=None,
+                 **kwargs):
+        super().__init__(pose, video_id, scale=scale, **kwargs)
+        cfg = config.KEYPOINT_CONFIG
+        self.events = np.asarray([] if events is None else events, dtype=np.int64).reshape(-1)
+        self.window = int(cfg['DENSE_WINDOW'] if window is None else window)
+        self.stride = max(1, int(cfg['SPARSE_STRIDE'] if stride is None else stride))
+        self.motion_threshold = float(cfg['MOTION_THRESHOLD'] if motion_threshold is None else motion_threshold)
+        self.interpolated = None
+
+    def on_start(self, meta):
+        super().on_start(meta)
+        self._detected = {}     # 帧序号 -> (33,4) 数组或 None（已检测）
+        self._skipped = []      # 插值帧的帧序号
+        self._pending = []      # 上次检测之后跳过的 (帧序号, 帧)
+        self._last = None       # 上次检测的 (帧序号, 结果)
+        self._prev = None       # 再上一次检测的 (帧序号, 结果)
+        self.interpolated = None
+
+    def _is_dense(self, idx):
+        return len(self.events) > 0 and int(np.abs(self.events - idx).min()) <= self.window
+
+    def _nonlinear(self, idx, arr):
+        """上次检测到本次之间的运动是否偏离匀速（不能直接线性插值）。"""
+        last_idx, last = self._last
+        if last is None or arr is None:
+            return (last is None) != (arr is None)
+        if self._prev is not None and self._prev[1] is not None:
+            prev_idx, prev = self._prev
+            expected = last + (last - prev) * ((idx - last_idx) / max(1, last_idx - prev_idx))
+        else:
+            expected = last
+        delta = np.abs(arr[:, :2] - expected[:, :2])
+        return bool(np.isnan(delta).all() or np.nanmax(delta) > self.motion_threshold)
+
+    def _sample(self, idx, frame):
+        arr = self._detect(frame)
+        self._detected[idx] = arr
+        if self._pending:
+            if self._last is not None and self._nonlinear(idx, arr):
+                # 运动较大，跳过的帧补做检测
+                for j, f in self._pending:
+                    self._detected[j] = self._detect(f)
+            else:
+                self._skipped.extend(j for j, _ in self._pending)
+            self._pending = []
+        self._prev, self._last = self._last, (idx, arr)
+
+    def on_frame(self, idx, frame):
+        self.frame_count += 1
+        if self._last is None or self._is_dense(idx) or idx - self._last[0] >= self.stride:
+            self._sample(idx, frame)
+        else:
+            self._pending.append((idx, frame))
+
+        if self.frame_count % 100 == 0:
+            print(f"       已处理 {self.frame_count} 帧（检测 {len(self._detected)} 帧）...")
+
+    def on_end(self):
+        # 结尾跳过的帧：检测最后一帧作为插值的右端点
+        if self._pending:
+            idx, frame = self._pending.pop()
+            self._sample(idx, frame)
+
+        frames = np.array(sorted([*self._detected, *self._skipped]), dtype=np.int64)
+        sampled = np.array([int(f) in self._detected for f in frames], dtype=bool)
+        # 未检测到人体 / 跳过的帧先记为 NaN
+        points = np.full((len(frames), 33, 4), np.nan, dtype=np.float32)
+        for row, f in enumerate(frames):
+            arr = self._detected.get(int(f))
+            if arr is not None:
+                points[row] = arr
+        points, self.interpolated = keypoint_store.interpolate_skipped(frames, points, sampled)
+        self.frame_indices = frames.tolist()
+        self.points = list(points)
+
+        calls = int(sampled.sum())
+        ratio = self.frame_count / calls if calls else 0
+        print(f"[INFO] 视频处理完毕，共 {self.frame_count} 帧，MediaPipe 检测 {calls} 帧（减少 {ratio:.1f} 倍），"
+              f"插值 {int(self.interpolated.sum())} 帧。")
+
+
+def make_pose_consumer(video_path, scale=1, model_complexity=1, video_id=None, sampling="dense", events=None):
+    """
+    创建 MediaPipe 订阅者（video_id 为 None 时取视频文件名，去掉扩展名，避免后续分析强转 int 失败）
+    sampling: "dense" 逐帧检测；"adaptive" 按关键帧事件 events 与运动幅度自适应采样（参数见 KEYPOINT_CONFIG）
+    """
     # Reduce chances of native crashes / thread conflicts on Windows
     try:
         cv2.setNumThreads(0)
     except Exception:
         pass
 
-    # ================== MediaPipe Pose 初始化 ==================
-    mp_pose = mp.solutions.pose
-    pose = mp_pose.Pose(
-        static_image_mode=False,
-        model_complexity=int(model_complexity),  # 2=最精准但最慢，1=中等，0=最快
-        enable_segmentation=False,
-        min_detection_confidence=0.5,
-        min_tracking_confidence=0.5
-    )
+    if video_id is None:
+        video_id = Path(video_path).stem
+    cfg = config.KEYPOINT_CONFIG
+    roi_kwargs = {"roi": cfg['ROI_CROP'], "max_side": cfg['MAX_INPUT_SIDE']}
+    if sampling == "adaptive":
+        return AdaptivePoseConsumer(
+            get_pose(model_complexity), video_id, scale=scale, events=events,
+            window=cfg['DENSE_WINDOW'], stride=cfg['SPARSE_STRIDE'], motion_threshold=cfg['MOTION_THRESHOLD'],
+            **roi_kwargs,
+        )
+    return PoseFrameConsumer(get_pose(model_complexity), video_id, scale=scale, **roi_kwargs)
 
-    # 检查文件是否存在
-    if not os.path.exists(video_path):
-        print(f"[ERROR] 找不到视频文件: {video_path}")
-        return None
 
-    # 输出设置
-    out_dir_path = Path(output_dir)
-    out_dir_path.mkdir(parents=True, exist_ok=True)
-    # 输出的 CSV 文件名
-    csv_output = out_dir_path / "单视频_缺陷分析数据.csv"
+def save_keypoints(consumer, output_dir, export_csv=None):
+    """
+    把订阅者收集的关键点写入二进制关键点目录（keypoint_store），返回 keypoints.npy 路径（无记录时返回 None）
+    export_csv: 是否同时导出旧版 单视频_缺陷分析数据.csv，None 时读取配置
+    """
+    if export_csv is None:
+        export_csv = config.KEYPOINT_CONFIG.get('EXPORT_CSV', False)
 
-    # 获取视频名作为 ID (用于记录)：去掉扩展名，避免后续分析强转 int 失败
-    if video_id is None:
-        video_filename = Path(video_path).stem
+    if consumer.points:
+        keypoints_path = keypoint_store.save_keypoints(
+            output_dir,
+            consumer.video_id,
+            consumer.frame_indices,
+            np.stack(consumer.points, axis=0),
+            export_csv=export_csv,
+            interpolated=getattr(consumer, "interpolated", None),
+        )
+        print(f"\n[SUCCESS] 结果已保存至: {keypoints_path}")
+        return keypoints_path
     else:
-        video_filename = video_id
+        print("\n[WARNING] 未生成任何记录。")
+        return None
+
+
+def plan_shards(frame_count, workers, overlap):
+    """
+    把 [0, frame_count) 切成至多 workers 段，返回 [(warm_start, start, end)]
+    每段先从 warm_start 开始跑 overlap 帧预热（让跟踪重新锁定人体，结果丢弃），再保留 [start, end)
+    最后一段 end 为 None，读到视频结尾（帧数属性不准时也不丢帧）
+    """
+    overlap = max(0, int(overlap))
+    # 每段至少是预热帧数的 4 倍，太短的视频不切分
+    min_len = max(4 * overlap, 30)
+    n = max(1, min(int(workers), int(frame_count) // min_len))
+    bounds = np.linspace(0, frame_count, n + 1).astype(int)
+    shards = []
+    for k in range(n):
+        start = int(bounds[k])
+        end = None if k == n - 1 else int(bounds[k + 1])
+        shards.append((max(0, start - overlap), start, end))
+    return shards
+
+
+def _pose_shard(job):
+    """在子进程中检测一段帧（各进程有自己的 Pose 实例），返回 (帧序号, 关键点)，不含预热帧。"""
+    warm_start, start, end = job["shard"]
+    source = FrameSource(job["video_path"], start_frame=warm_start, end_frame=end)
+    consumer = source.subscribe(make_pose_consumer(
+        job["video_path"], job["scale"], job["model_complexity"], job["video_id"]
+    ))
+    source.run()
+    frames = np.asarray(consumer.frame_indices, dtype=np.int64)
+    if len(frames) == 0:
+        return frames, np.zeros((0, 33, 4), dtype=np.float32)
+    points = np.stack(consumer.points, axis=0)
+    keep = frames >= start
+    return frames[keep], points[keep]
+
+
+# 常驻的分段检测进程池：(进程数, ProcessPoolExecutor)，子进程内的 Pose 计算图跨视频复用
+_SHARD_POOL = None
+_SHARD_POOL_LOCK = threading.Lock()
+
+
+def _get_shard_pool(workers):
+    global _SHARD_POOL
+    with _SHARD_POOL_LOCK:
+        if _SHARD_POOL is not None and _SHARD_POOL[0] != workers:
+            _SHARD_POOL[1].shutdown(wait=True)
+            _SHARD_POOL = None
+        if _SHARD_POOL is None:
+            _SHARD_POOL = (workers, ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ))
+        return _SHARD_POOL[1]
+
+
+def _reset_shard_pool():
+    global _SHARD_POOL
+    with _SHARD_POOL_LOCK:
+        if _SHARD_POOL is not None:
+            _SHARD_POOL[1].shutdown(wait=False, cancel_futures=True)
+            _SHARD_POOL = None
+
+
+def process_video_sharded(video_path, output_dir, scale=1, model_complexity=1, video_id=None,
+                          export_csv=None, workers=None, overlap=None):
+    """
+    分段并行检测：视频切成带预热重叠的若干段，分给多个进程（各自一个 Pose 实例）检测，
+    再按帧序号拼接成一个关键点张量保存，返回 keypoints.npy 路径（失败返回 None）
+    跟踪模式下每段开头的 overlap 帧用于重新锁定人体，预热之后的结果与单进程逐帧跟踪一致（在跟踪误差范围内）
+    """
+    workers = int(workers or config.KEYPOINT_CONFIG['SHARD_WORKERS'])
+    overlap = config.KEYPOINT_CONFIG['SHARD_OVERLAP'] if overlap is None else overlap
+    if not os.path.exists(video_path):
+        print(f"[ERROR] 找不到视频文件: {video_path}")
+        return None
 
     cap = cv2.VideoCapture(video_path)
     if not cap.isOpened():
         print(f"[ERROR] 无法打开视频: {video_path}")
         return None
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
 
-    # 读取首帧，获取原始尺寸
-    ret, first_frame = cap.read()
-    if not ret or first_frame is None:
-        print(f"[ERROR] 视频为空: {video_path}")
-        cap.release()
-        return None
+    shards = plan_shards(frame_count, workers, overlap)
+    if len(shards) <= 1:
+        return process_video(video_path, output_dir, scale, model_complexity, video_id, export_csv, workers=1)
 
-    orig_h, orig_w = first_frame.shape[:2]
-    up_w, up_h = int(orig_w * scale), int(orig_h * scale)
-
-    # 回到第一帧
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-
-    frame_idx = 0
-    print(f"[INFO] 开始处理视频: {video_filename}")
-    print(f"       原始尺寸=({orig_w},{orig_h}) -> 处理尺寸=({up_w},{up_h})")
-
-    records = []
-    while True:
-        ret, frame = cap.read()
-        if not ret or frame is None:
-            break
-        
-        # 当前帧索引（从 0 开始）
-        frame_idx_local = frame_idx
-        frame_idx += 1
-
-        # 1. 放大/调整尺寸
-        if scale != 1:
-            frame_proc = cv2.resize(frame, (up_w, up_h), interpolation=cv2.INTER_CUBIC)
-        else:
-            frame_proc = frame
+    if video_id is None:
+        video_id = Path(video_path).stem
+    jobs = [{
+        "video_path": str(video_path),
+        "shard": shard,
+        "scale": scale,
+        "model_complexity": model_complexity,
+        "video_id": video_id,
+    } for shard in shards]
+    print(f"[INFO] 分段并行检测: {len(jobs)} 段，{workers} 个进程，每段预热 {overlap} 帧")
+    try:
+        results = list(_get_shard_pool(workers).map(_pose_shard, jobs))
+    except Exception:
+        # 进程池损坏（子进程崩溃）时下次重新创建
+        _reset_shard_pool()
+        raise
 
-        # 2. 转为 RGB 供 MediaPipe 使用
-        rgb = cv2.cvtColor(frame_proc, cv2.COLOR_BGR2RGB)
+    frames = np.concatenate([r[0] for r in results])
+    if len(frames) == 0:
+        print("\n[WARNING] 未生成任何记录。")
+        return None
+    # 段与段首尾相接（FrameSource 保证每段从准确的起始帧开始），按顺序拼接即可
+    points = np.concatenate([r[1] for r in results], axis=0)
 
-        # 3. 推理
-        result = pose.process(rgb)
+    if export_csv is None:
+        export_csv = config.KEYPOINT_CONFIG.get('EXPORT_CSV', False)
+    keypoints_path = keypoint_store.save_keypoints(output_dir, video_id, frames, points, export_csv=export_csv)
+    print(f"\n[SUCCESS] 结果已保存至: {keypoints_path}")
+    return keypoints_path
 
-        if result.pose_landmarks:
-            arr = landmarks_to_np(result.pose_landmarks.landmark)
-        else:
-            arr = None
-
-        # 4. 构建数据行
-        # 为了兼容之前的格式，保留 video_id 字段，值为文件名
-        row_dict = {
-            "video_id": video_filename,
-            "frame_index": frame_idx_local,
-        }
-
-        # 33 个关键点，每个点写一个 "(x,y,z)" 字符串
-        if arr is not None:
-            for lid in range(33):
-                x = float(arr[lid, 0])
-                y = float(arr[lid, 1])
-                z = float(arr[lid, 2])
-                # 注意：这里的 x,y 是归一化坐标(0~1)，对应的是 up_w, up_h 的比例
-                coord_str = f"({x},{y},{z})"
-                row_dict[f"landmark_{lid}"] = coord_str
-        else:
-            # 没检测到人体，全部写空字符串
-            for lid in range(33):
-                row_dict[f"landmark_{lid}"] = ""
 
-        records.append(row_dict)
+def process_video(video_path, output_dir, scale=1, model_complexity=1, video_id=None, export_csv=None, workers=None,
+                  sampling=None, events=None):
+    """
+    检测视频关键点并保存，返回 keypoints.npy 路径
+    workers > 1（默认读取 KEYPOINT_CONFIG['SHARD_WORKERS']）时改用 process_video_sharded 多进程分段检测
+    sampling: "dense" 逐帧 / "adaptive" 围绕关键帧事件 events 自适应采样（默认读取 KEYPOINT_CONFIG['SAMPLING']，
+              自适应采样依赖前后帧跟踪状态，在单进程中执行）
+    """
+    if workers is None:
+        workers = config.KEYPOINT_CONFIG['SHARD_WORKERS']
+    if sampling is None:
+        sampling = config.KEYPOINT_CONFIG['SAMPLING']
+    if int(workers) > 1 and sampling != "adaptive":
+        return process_video_sharded(video_path, output_dir, scale, model_complexity, video_id, export_csv, workers=workers)
 
-        # 可选：显示进度，每100帧打印一次
-        if frame_idx % 100 == 0:
-            print(f"       已处理 {frame_idx} 帧...")
+    # 检查文件是否存在
+    if not os.path.exists(video_path):
+        print(f"[ERROR] 找不到视频文件: {video_path}")
+        return None
 
-    cap.release()
-    print(f"[INFO] 视频处理完毕，共 {frame_idx} 帧。")
-
-    # ================== 写入 CSV ==================
-    if records:
-        keypoints_df = pd.DataFrame.from_records(records)
-        keypoints_df.to_csv(csv_output, index=False, encoding="utf-8-sig")
-        print(f"\n[SUCCESS] 结果已保存至: {csv_output}")
-        return str(csv_output)
-    else:
-        print("\n[WARNING] 未生成任何记录。")
+    # ================== MediaPipe Pose 初始化 ==================
+    source = FrameSource(video_path)
+    consumer = source.subscribe(make_pose_consumer(video_path, scale, model_complexity, video_id,
+                                                   sampling=sampling, events=events))
+    try:
+        meta = source.run()
+    except FileNotFoundError:
+        print(f"[ERROR] 无法打开视频: {video_path}")
+        return None
+    if meta["frames_decoded"] == 0:
+        print(f"[ERROR] 视频为空: {video_path}")
         return None
 
-if __name__ == "__main__":
-    import sys
-    sys.path.append(str(Path(__file__).resolve().parent.parent))
-    import config
+    return save_keypoints(consumer, output_dir, export_csv=export_csv)
 
+if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Export Keypoints from Video")
     parser.add_argument("--video_path", type=str, required=True, help="Path to the input video")
-    parser.add_argument("--output_dir", type=str, default=config.KEYPOINT_CONFIG['OUTPUT_DIR'], help="Directory to save the output CSV")
+    parser.add_argument("--output_dir", type=str, default=config.KEYPOINT_CONFIG['OUTPUT_DIR'], help="Directory to save the keypoints")
     parser.add_argument("--scale", type=float, default=config.KEYPOINT_CONFIG['SCALE_FACTOR'], help="Scale factor for resizing frames")
     parser.add_argument("--model_complexity", type=int, default=config.KEYPOINT_CONFIG['MODEL_COMPLEXITY'], choices=[0, 1, 2], help="MediaPipe Pose model complexity")
+    parser.add_argument("--export_csv", action="store_true", default=config.KEYPOINT_CONFIG['EXPORT_CSV'], help="Also export the legacy landmark CSV")
+    parser.add_argument("--sampling", type=str, default=config.KEYPOINT_CONFIG['SAMPLING'], choices=["dense", "adaptive"], help="dense: every frame; adaptive: dense around --events, sparse + interpolated elsewhere")
+    parser.add_argument("--events", type=int, nargs="*", default=None, help="Keyframe event frame indices for adaptive sampling")
+    parser.add_argument("--workers", type=int, default=config.KEYPOINT_CONFIG['SHARD_WORKERS'], help="Number of processes for sharded pose detection (1 = single-process tracking)")
     
     args = parser.parse_args()
     
-    process_video(args.video_path, args.output_dir, args.scale, model_complexity=args.model_complexity)
+    process_video(args.video_path, args.output_dir, args.scale, model_complexity=args.model_complexity, export_csv=args.export_csv, workers=args.workers,
+                  sampling=args.sampling, events=args.events)
@@ -0,0 +1,87 @@
+"""
+常驻分析工作进程池
+每个工作进程只导入一次 torch / mediapipe / pandas / cv2，并保持 SwingNet 与 MediaPipe Pose 预热，
+以函数调用方式执行 run_full_analysis.main()，避免每次上传都重新启动解释器、重新加载模型。
+"""
+import multiprocessing
+import threading
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+
+
+def _init_worker(warmup):
+    """工作进程初始化：导入分析依赖并预热模型。"""
+    try:
+        import run_full_analysis
+        if warmup:
+            run_full_analysis.warmup()
+            print("[工作进程] 模型预热完成")
+    except Exception as e:
+        # 预热失败不影响进程存活，首个任务会按正常流程重新加载
+        print(f"[工作进程] 预热失败: {e}")
+        traceback.print_exc()
+
+
+def _run_job(argv):
+    """在工作进程内执行一次完整分析流程。"""
+    import run_full_analysis
+    return run_full_analysis.main(argv)
+
+
+class AnalysisWorkerPool:
+    """对 ProcessPoolExecutor 的简单封装，工作进程异常退出后自动重建。"""
+
+    def __init__(self, num_workers=None, warmup=None):
+        self.num_workers = int(num_workers or config.WORKER_CONFIG['NUM_WORKERS'])
+        self.warmup = config.WORKER_CONFIG['WARMUP'] if warmup is None else bool(warmup)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn：避免 fork 带入 Flask 线程与 torch 线程池状态
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.warmup,),
+                )
+            return self._executor
+
+    def submit(self, argv):
+        """提交分析任务，返回 Future（结果为 run_full_analysis.main 的返回值）。"""
+        return self._get_executor().submit(_run_job, list(argv))
+
+    def run(self, argv):
+        """提交分析任务并阻塞等待结果。"""
+        try:
+            return self.submit(argv).result()
+        except BrokenProcessPool:
+            # 工作进程崩溃（如原生库段错误），丢弃旧进程池，下次提交时重建
+            print("[工作进程] 进程池已损坏，将重新创建")
+            with self._lock:
+                self._executor = None
+            raise
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """获取全局工作进程池（首次调用时创建）。"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AnalysisWorkerPool()
+        return _pool
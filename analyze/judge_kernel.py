@@ -0,0 +1,169 @@
+"""
+逐帧审判的 NumPy 内核（侧面 / 正面审判共用）
+把 (T,M) 指标矩阵与每指标的下限/上限/权重一次性广播计算：
+合规、超下限/超上限、归一化偏差、三档审判、帧级加权偏差与评分、异常/轻微指标数、帧级结论，
+不再逐指标 mask 链 + 逐格 apply。
+"""
+import numpy as np
+
+# 偏差分档：<=0 标准(0)；(0,0.5] 轻微(1)；>0.5 异常(2)
+GRADE_EDGES = np.array([0.0, 0.5])
+
+# 帧级结论（按优先级）
+VERDICT_LABELS = np.array(["优秀", "标准", "基本标准", "不标准", np.nan], dtype=object)
+
+
+def grade_deviation(dev):
+    """偏差 -> 三档审判（float，NaN 偏差为 NaN）。"""
+    dev = np.asarray(dev, dtype=float)
+    grade = np.digitize(np.nan_to_num(dev, nan=0.0), GRADE_EDGES, right=True).astype(float)
+    grade[np.isnan(dev)] = np.nan
+    return grade
+
+
+def weighted_deviation(dev, weights):
+    """
+    帧级加权偏差（忽略 NaN 偏差）与评分：100 - 加权偏差*100（截断到0-100）
+    返回: (wdev, score)，某帧全部偏差为 NaN 时二者为 NaN
+    """
+    dev = np.asarray(dev, dtype=float)
+    w = np.asarray(weights, dtype=float).reshape(1, -1)
+    mask = np.isfinite(dev)
+    w_eff = np.where(mask, w, 0.0)
+    denom = w_eff.sum(axis=1)
+    numer = np.where(mask, dev, 0.0) * w_eff
+    with np.errstate(invalid="ignore", divide="ignore"):
+        wdev = np.where(denom > 0, numer.sum(axis=1) / denom, np.nan)
+    score = 100.0 * (1.0 - np.clip(wdev, 0.0, 1.0))
+    return wdev, score
+
+
+def frame_verdicts(abnormal_cnt, score):
+    """
+    帧级判定：基于“异常指标数 + 评分”双条件
+      异常0 且 评分>=90 -> 优秀；异常0 -> 标准；异常<=2 且 评分>=75 -> 基本标准；否则 不标准
+    返回 object 数组（评分为 NaN 时为 NaN）
+    """
+    a = np.asarray(abnormal_cnt)
+    s = np.asarray(score, dtype=float)
+    code = np.select(
+        [np.isnan(s), (a == 0) & (s >= 90), a == 0, (a <= 2) & (s >= 75)],
+        [4, 0, 1, 2],
+        default=3,
+    )
+    return VERDICT_LABELS[code]
+
+
+def judge_matrix(X, lo, hi, weights, modes=None):
+    """
+    X: (T,M) 指标矩阵（NaN 为缺失）
+    lo / hi / weights: (M,) 每指标下限、上限、权重
+    modes: 每指标判定方式 "between" / "abs_le"（abs_le 以上限为绝对值阈值），None 表示全部 between
+    返回 dict:
+      ok / low_bad / high_bad: (T,M) bool
+      dev: (T,M) 归一化偏差；grade: (T,M) 0标准/1轻微/2异常（float，NaN 为缺失）
+      wdev / score / abnormal_cnt / mild_cnt / verdict: (T,) 帧级结果
+    """
+    X = np.asarray(X, dtype=float)
+    lo = np.asarray(lo, dtype=float).reshape(1, -1)
+    hi = np.asarray(hi, dtype=float).reshape(1, -1)
+    if modes is None:
+        abs_le = np.zeros(X.shape[1], dtype=bool)
+    else:
+        abs_le = np.array([m == "abs_le" for m in modes], dtype=bool)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # between：区间内合规，偏差为超出多少个区间宽度（NaN 值视为无偏差）
+        width = hi - lo
+        width = np.where(width != 0, width, 1e-9)
+        low_bad = X < lo
+        high_bad = X > hi
+        ok = (X >= lo) & (X <= hi)
+        dev = np.select([low_bad, high_bad], [(lo - X) / width, (X - hi) / width], 0.0)
+
+        # abs_le：绝对值不超过阈值（hi），偏差为超出阈值的比例（NaN 值偏差为 NaN）
+        if abs_le.any():
+            ax = np.abs(X)
+            over = ax > hi
+            ok = np.where(abs_le, ax <= hi, ok)
+            low_bad = np.where(abs_le, over, low_bad)
+            high_bad = np.where(abs_le, over, high_bad)
+            dev = np.where(abs_le, (ax - hi) / (hi + 1e-9), dev)
+
+    dev = np.maximum(dev, 0.0)
+    grade = grade_deviation(dev)
+    wdev, score = weighted_deviation(dev, weights)
+    abnormal_cnt = (grade == 2).sum(axis=1)
+    mild_cnt = (grade == 1).sum(axis=1)
+
+    return {
+        "ok": ok,
+        "low_bad": low_bad,
+        "high_bad": high_bad,
+        "dev": dev,
+        "grade": grade,
+        "wdev": wdev,
+        "score": score,
+        "abnormal_cnt": abnormal_cnt,
+        "mild_cnt": mild_cnt,
+        "verdict": frame_verdicts(abnormal_cnt, score),
+    }
+
+
+# ----------------------------------------------------------------------
+# 连续段（run-length）工具：多个视频拼接在一起时用分组偏移量切分，整批一次计算
+# offsets: (G+1,) 各组起始下标，offsets[0]=0，offsets[-1]=N；None 表示只有一组
+# ----------------------------------------------------------------------
+def group_offsets(keys):
+    """已按组排好序的组键 -> (offsets, 各组键)。"""
+    keys = np.asarray(keys)
+    n = len(keys)
+    if n == 0:
+        return np.array([0], dtype=np.int64), keys[:0]
+    cuts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    offsets = np.concatenate([[0], cuts, [n]]).astype(np.int64)
+    return offsets, keys[offsets[:-1]]
+
+
+def run_lengths(mask, offsets=None):
+    """
+    布尔序列中连续 True 段的 [start, end)，段不会跨越组边界
+    返回: (starts, ends)，按位置排序
+    """
+    m = np.asarray(mask, dtype=bool)
+    d = np.diff(m.astype(np.int8), prepend=0, append=0)
+    is_start = d[:-1] == 1
+    is_end = d[1:] == -1
+    if offsets is not None and len(offsets) > 2:
+        inner = np.asarray(offsets[1:-1], dtype=np.int64)
+        is_start[inner] |= m[inner]
+        is_end[inner - 1] |= m[inner - 1]
+    return np.flatnonzero(is_start), np.flatnonzero(is_end) + 1
+
+
+def streak_mask(mask, min_streak, offsets=None):
+    """只保留长度 >= min_streak 的连续 True 段。"""
+    m = np.asarray(mask, dtype=bool)
+    starts, ends = run_lengths(m, offsets)
+    keep = (ends - starts) >= min_streak
+    delta = np.zeros(len(m) + 1, dtype=np.int64)
+    delta[starts[keep]] += 1
+    delta[ends[keep]] -= 1
+    return np.cumsum(delta[:-1]) > 0
+
+
+def streak_stats(mask, offsets=None):
+    """
+    每组的最长连续 True 段长度与连续段个数
+    返回: (longest, segments)，均为 (G,) int64
+    """
+    m = np.asarray(mask, dtype=bool)
+    if offsets is None:
+        offsets = np.array([0, len(m)], dtype=np.int64)
+    n_groups = len(offsets) - 1
+    starts, ends = run_lengths(m, offsets)
+    gid = np.searchsorted(offsets, starts, side="right") - 1
+    longest = np.zeros(n_groups, dtype=np.int64)
+    np.maximum.at(longest, gid, ends - starts)
+    segments = np.bincount(gid, minlength=n_groups).astype(np.int64)
+    return longest, segments
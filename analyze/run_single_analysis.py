@@ -1,33 +1,33 @@
 import pandas as pd
 import numpy as np
 import os
-import ast
 import sys
 import argparse
 
 # Add current directory to path to import the judgment scripts
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import keypoint_store
 
 import 侧向标准判断 as side_judge
 import 正面标准判断 as front_judge
 
-def parse_landmark(s):
-    try:
-        # The string is like "(0.1, 0.2, 0.3)"
-        return np.array(ast.literal_eval(s))
-    except:
-        return np.array([np.nan, np.nan, np.nan])
-
-def calculate_metrics(df):
-    lms = {}
-    # We need landmarks 0-32
-    for i in range(33):
-        col = f'landmark_{i}'
-        if col in df.columns:
-            lms[i] = df[col].apply(parse_landmark)
-            lms[i] = np.vstack(lms[i].values)
-        else:
-            lms[i] = np.zeros((len(df), 3))
+def calculate_metrics(df, points=None):
+    """
+    df: 至少包含 video_id / frame_index 列
+    points: 可选，(T,33,3) 关键点坐标数组（来自 keypoint_store）；为 None 时一次性解析 df 中的 landmark_i 字符串列
+    """
+    if points is None:
+        points = keypoint_store.parse_landmark_columns(df)
+        # 缺失的 landmark 列按 0 处理
+        for i in range(33):
+            if f'landmark_{i}' not in df.columns:
+                points[:, i, :] = 0.0
+    points = np.asarray(points, dtype=np.float64)[:, :, :3]
+
+    # lms[i] -> (T,3)，直接是关键点数组的视图
+    lms = np.moveaxis(points, 1, 0)
 
     def vec(i, j):
         return lms[i] - lms[j]
@@ -113,8 +113,12 @@ def calculate_metrics(df):
     return metrics_df
 
 
-def run_analysis(view: str, input_csv: str, std_csv: str | None = None, out_dir: str | None = None):
-    """Run side/front analysis and return (frame_out, video_out, summary_df)."""
+def run_analysis(view: str, input_csv: str, std_csv: str | None = None, out_dir: str | None = None,
+                 return_frames: bool = False):
+    """
+    Run side/front analysis and return (frame_out, video_out, summary_df).
+    return_frames=True additionally returns the per-frame judged DataFrame (for in-memory DB ingestion).
+    """
     base_dir = os.path.dirname(os.path.abspath(__file__))
     if std_csv is None:
         std_csv = os.path.join(base_dir, "侧面标准范围.csv" if view == "side" else "正面标准范围.csv")
@@ -123,18 +127,20 @@ def run_analysis(view: str, input_csv: str, std_csv: str | None = None, out_dir:
 
     os.makedirs(out_dir, exist_ok=True)
 
-    if not os.path.exists(input_csv):
+    if keypoint_store.find_keypoints(input_csv) is None:
         raise FileNotFoundError(f"Input file not found: {input_csv}")
     if not os.path.exists(std_csv):
         raise FileNotFoundError(f"Standard file not found: {std_csv}")
 
-    df = pd.read_csv(input_csv)
+    # input_csv: 关键点目录 / keypoints.npy / 旧版 CSV
+    kps = keypoint_store.load_keypoints(input_csv)
+    df = pd.DataFrame({'video_id': kps.video_ids, 'frame_index': kps.frame_index})
 
     # Clean video_id: keep as video name (string). If it still contains an extension, strip it.
     df['video_id'] = df.get('video_id', '').astype(str).str.replace('.mp4', '', regex=False)
 
 
-    metrics_df = calculate_metrics(df)
+    metrics_df = calculate_metrics(df, points=kps.xyz)
     rule_table = pd.read_csv(std_csv)
     rule_table["权重"] = pd.to_numeric(rule_table["权重"], errors='coerce').fillna(1.0)
 
@@ -161,6 +167,8 @@ def run_analysis(view: str, input_csv: str, std_csv: str | None = None, out_dir:
 
     judged.to_csv(frame_out, index=False, encoding="utf-8-sig")
     summary.to_csv(video_out, index=False, encoding="utf-8-sig")
+    if return_frames:
+        return frame_out, video_out, summary, judged
     return frame_out, video_out, summary
 
 if __name__ == "__main__":
@@ -171,7 +179,7 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(description="Golf Swing Analysis")
     parser.add_argument("--view", type=str, required=True, choices=['side', 'front'], help="View to analyze: 'side' or 'front'")
-    parser.add_argument("--input_csv", type=str, required=True, help="Input landmark CSV path")
+    parser.add_argument("--input_csv", type=str, required=True, help="Input keypoints (keypoints.npy / its directory / legacy landmark CSV)")
     parser.add_argument("--std_csv", type=str, default=None, help="Standard range CSV path. Defaults to preset files if None.")
     parser.add_argument("--out_dir", type=str, default=config.ANALYSIS_CONFIG['OUTPUT_DIR'], help="Output directory")
 
@@ -3,6 +3,8 @@ import argparse
 import numpy as np
 import pandas as pd
 
+import judge_kernel
+
 # =========================
 # 输入逐帧指标列名（中文）
 # =========================
@@ -142,103 +144,33 @@ def apply_rules_per_metric(df: pd.DataFrame, rule_table: pd.DataFrame) -> pd.Dat
     rt = rule_table.set_index("指标")
     out = df[[COL_VIDEO, COL_FRAME] + METRICS].copy()
 
-    # 逐指标审判
-    for m in METRICS:
-        x = pd.to_numeric(out[m], errors="coerce")
-        mode = rt.loc[m, "判定方式"]
-        lo = float(rt.loc[m, "下限"])
-        hi = float(rt.loc[m, "上限"])
-
-        if mode == "abs_le":
-            # 绝对值不超过阈值：这里用 hi 作为阈值（lo 忽略）
-            thr = hi
-            ok = x.abs() <= thr
-            low_bad = (x.abs() > thr)
-            high_bad = (x.abs() > thr)
-            # 距离阈值的归一化偏差
-            dev = (x.abs() - thr) / (thr + 1e-9)
-            dev = dev.clip(lower=0)
-        else:
-            # between：区间内合规
-            ok = (x >= lo) & (x <= hi)
-            low_bad = (x < lo)
-            high_bad = (x > hi)
-            # 到区间的“相对偏差”：超出多少个区间宽度
-            width = (hi - lo) if (hi - lo) != 0 else 1e-9
-            dev = np.zeros(len(out), dtype=float)
-            dev = pd.Series(dev, index=out.index, dtype=float)
-            dev = dev.mask(low_bad, (lo - x) / width)
-            dev = dev.mask(high_bad, (x - hi) / width)
-            dev = dev.fillna(np.nan).clip(lower=0)
-
-        out[f"{m}__合规"] = ok.astype("Int64")
-        out[f"{m}__超下限"] = low_bad.astype("Int64")
-        out[f"{m}__超上限"] = high_bad.astype("Int64")
-        out[f"{m}__偏差"] = dev
-
-        # 三档审判：标准/轻微/异常
-        # 这里将“偏差”分层：<=0 标准；(0,0.5] 轻微；>0.5 异常（可按经验调整）
-        def grade_from_dev(v):
-            if pd.isna(v):
-                return np.nan
-            if v <= 0:
-                return 0
-            elif v <= 0.5:
-                return 1
-            else:
-                return 2
-
-        out[f"{m}__审判_0标准1轻微2异常"] = out[f"{m}__偏差"].apply(grade_from_dev).astype("Int64")
-
-    # 帧级聚合：每个指标都审判后，给出综合评分与结论
-    # 评分：100 - 加权偏差*100（截断到0-100）
-    weights = {row["指标"]: float(row["权重"]) for _, row in rule_table.iterrows()}
-    wsum = float(sum(weights.values()))
-
-    # 计算加权偏差（忽略 NaN）
-    dev_cols = [f"{m}__偏差" for m in METRICS]
-    dev_mat = out[dev_cols].to_numpy(dtype=float)
-
-    w = np.array([weights[m] for m in METRICS], dtype=float)
-    # mask nan
-    mask = np.isfinite(dev_mat)
-    w_mat = np.tile(w.reshape(1, -1), (dev_mat.shape[0], 1))
-    w_eff = np.where(mask, w_mat, 0.0)
-    denom = w_eff.sum(axis=1)
-    numer = np.where(mask, dev_mat, 0.0) * w_eff
-    wdev = np.where(denom > 0, numer.sum(axis=1) / denom, np.nan)
-
-    score = 100.0 * (1.0 - np.clip(wdev, 0.0, 1.0))
-    out["帧级加权偏差"] = wdev
-    out["帧级评分_0到100"] = score
-
-    # 帧级判定：基于“异常指标数 + 评分”双条件，更可解释
-    judge_cols = [f"{m}__审判_0标准1轻微2异常" for m in METRICS]
-    judge_mat = out[judge_cols].to_numpy(dtype=float)
-    abnormal_cnt = np.nansum(judge_mat == 2, axis=1)
-    mild_cnt = np.nansum(judge_mat == 1, axis=1)
-
-    out["异常指标数_帧级"] = abnormal_cnt.astype(int)
-    out["轻微偏差指标数_帧级"] = mild_cnt.astype(int)
-
-    def frame_verdict(a_cnt, s):
-        # a_cnt: 异常指标数
-        # s: 评分
-        if pd.isna(a_cnt) or pd.isna(s):
-            return np.nan
-        a_cnt = int(a_cnt)
-        s = float(s)
-        if a_cnt == 0 and s >= 90:
-            return "优秀"
-        if a_cnt == 0:
-            return "标准"
-        if a_cnt <= 2 and s >= 75:
-            return "基本标准"
-        return "不标准"
-
-    out["帧级结论"] = [frame_verdict(a, s) for a, s in zip(out["异常指标数_帧级"], out["帧级评分_0到100"])]
-
-    return out
+    # (T,M) 指标矩阵 + 每指标规则，一次性审判
+    X = np.column_stack([pd.to_numeric(out[m], errors="coerce").to_numpy(dtype=float) for m in METRICS])
+    res = judge_kernel.judge_matrix(
+        X,
+        lo=rt.loc[METRICS, "下限"].astype(float).to_numpy(),
+        hi=rt.loc[METRICS, "上限"].astype(float).to_numpy(),
+        weights=rt.loc[METRICS, "权重"].astype(float).to_numpy(),
+        modes=rt.loc[METRICS, "判定方式"].tolist(),
+    )
+
+    # 逐指标输出列：合规 / 超下限 / 超上限 / 偏差 / 三档审判（0标准1轻微2异常）
+    cols = {}
+    for j, m in enumerate(METRICS):
+        cols[f"{m}__合规"] = pd.array(res["ok"][:, j].astype(np.int64), dtype="Int64")
+        cols[f"{m}__超下限"] = pd.array(res["low_bad"][:, j].astype(np.int64), dtype="Int64")
+        cols[f"{m}__超上限"] = pd.array(res["high_bad"][:, j].astype(np.int64), dtype="Int64")
+        cols[f"{m}__偏差"] = res["dev"][:, j]
+        cols[f"{m}__审判_0标准1轻微2异常"] = pd.Series(res["grade"][:, j]).astype("Int64").array
+
+    # 帧级聚合：评分 = 100 - 加权偏差*100；结论基于“异常指标数 + 评分”双条件
+    cols["帧级加权偏差"] = res["wdev"]
+    cols["帧级评分_0到100"] = res["score"]
+    cols["异常指标数_帧级"] = res["abnormal_cnt"].astype(int)
+    cols["轻微偏差指标数_帧级"] = res["mild_cnt"].astype(int)
+    cols["帧级结论"] = res["verdict"]
+
+    return pd.concat([out, pd.DataFrame(cols, index=out.index)], axis=1)
 
 
 def add_streak_filter(df_flagged: pd.DataFrame, min_streak: int) -> pd.DataFrame:
@@ -248,32 +180,15 @@ def add_streak_filter(df_flagged: pd.DataFrame, min_streak: int) -> pd.DataFrame
     df_flagged = df_flagged.sort_values([COL_VIDEO, COL_FRAME]).reset_index(drop=True)
     raw_bad = (df_flagged["帧级结论"] == "不标准").fillna(False).to_numpy()
 
-    effective = np.zeros(len(df_flagged), dtype=bool)
-
-    for vid, idx in df_flagged.groupby(COL_VIDEO).groups.items():
-        inds = np.array(list(idx), dtype=int)
-        seq = raw_bad[inds]
-
-        start = None
-        for i, v in enumerate(seq):
-            if v and start is None:
-                start = i
-            if ((not v) or i == len(seq) - 1) and start is not None:
-                end = i if (not v) else i + 1
-                length = end - start
-                if length >= min_streak:
-                    effective[inds[start:end]] = True
-                start = None
+    # 排序后各视频连续存放，按组偏移量一次性计算所有视频的连续异常段
+    offsets, _ = judge_kernel.group_offsets(df_flagged[COL_VIDEO].to_numpy())
+    effective = judge_kernel.streak_mask(raw_bad, min_streak, offsets)
 
     df_flagged["帧级异常_连续过滤后"] = pd.Series(effective).astype("Int64")
 
     # 过滤后帧级结论调整：未通过连续过滤的“不标准”降级为“基本标准”
-    def adjust(row):
-        if row["帧级结论"] == "不标准" and int(row["帧级异常_连续过滤后"]) == 0:
-            return "基本标准"
-        return row["帧级结论"]
-
-    df_flagged["帧级结论_连续过滤后"] = df_flagged.apply(adjust, axis=1)
+    verdict = df_flagged["帧级结论"].to_numpy(dtype=object)
+    df_flagged["帧级结论_连续过滤后"] = np.where((verdict == "不标准") & ~effective, "基本标准", verdict)
     return df_flagged
 
 
@@ -282,38 +197,46 @@ def video_level_summary(df_flagged: pd.DataFrame, rule_table: pd.DataFrame) -> p
     视频级汇总：每个指标都给出“异常帧占比/轻微占比/标准占比”，并输出Top问题指标。
     """
     rows = []
-    judge_cols = [f"{m}__审判_0标准1轻微2异常" for m in METRICS]
 
-    for vid, g in df_flagged.groupby(COL_VIDEO, sort=True):
-        g = g.sort_values(COL_FRAME)
-        n = len(g)
+    # 按视频、帧序号排序后各视频连续存放：
+    # 最长有效异常段由组偏移量一次性计算，各类占比由一次分组均值得到
+    ordered = df_flagged.sort_values([COL_VIDEO, COL_FRAME])
+    offsets, vids = judge_kernel.group_offsets(ordered[COL_VIDEO].to_numpy())
+    eff = ordered["帧级异常_连续过滤后"].fillna(0).astype(int).to_numpy() == 1
+    longest, _segments = judge_kernel.streak_stats(eff, offsets)
+
+    verdict = ordered["帧级结论_连续过滤后"]
+    flags = {
+        "优秀": verdict == "优秀",
+        "标准": verdict == "标准",
+        "基本标准": verdict == "基本标准",
+        "不标准": verdict == "不标准",
+    }
+    # 每指标审判统计（核心：每个指标都审判）；审判为空的帧不计入分母
+    for m in METRICS:
+        vv = pd.to_numeric(ordered[f"{m}__审判_0标准1轻微2异常"], errors="coerce")
+        flags[f"{m}__标准占比"] = vv == 0
+        flags[f"{m}__轻微占比"] = vv == 1
+        flags[f"{m}__异常占比"] = vv == 2
+    rates = pd.DataFrame(flags).groupby(np.repeat(np.arange(len(vids)), np.diff(offsets))).mean()
+
+    for k, vid in enumerate(vids):
+        n = int(offsets[k + 1] - offsets[k])
+        r = rates.iloc[k]
 
         # 视频级总体
-        verdict = g["帧级结论_连续过滤后"]
-        p_bad = float((verdict == "不标准").mean()) if n else np.nan
-        p_basic = float((verdict == "基本标准").mean()) if n else np.nan
-        p_std = float((verdict == "标准").mean()) if n else np.nan
-        p_exc = float((verdict == "优秀").mean()) if n else np.nan
+        p_bad = float(r["不标准"])
+        p_basic = float(r["基本标准"])
+        p_std = float(r["标准"])
+        p_exc = float(r["优秀"])
 
         # 最长有效异常段
-        eff = g["帧级异常_连续过滤后"].fillna(0).astype(int).values
-        max_streak = 0
-        cur = 0
-        for v in eff:
-            if v == 1:
-                cur += 1
-                max_streak = max(max_streak, cur)
-            else:
-                cur = 0
-
-        # 每指标审判统计（核心：每个指标都审判）
+        max_streak = int(longest[k])
+
         metric_stats = {}
         for m in METRICS:
-            col = f"{m}__审判_0标准1轻微2异常"
-            vv = pd.to_numeric(g[col], errors="coerce")
-            metric_stats[f"{m}__标准占比"] = float((vv == 0).mean())
-            metric_stats[f"{m}__轻微占比"] = float((vv == 1).mean())
-            metric_stats[f"{m}__异常占比"] = float((vv == 2).mean())
+            for key in (f"{m}__标准占比", f"{m}__轻微占比", f"{m}__异常占比"):
+                metric_stats[key] = float(r[key])
 
         # Top问题指标（按异常占比）
         abn_rates = {m: metric_stats[f"{m}__异常占比"] for m in METRICS}
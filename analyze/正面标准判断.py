@@ -3,6 +3,8 @@ import argparse
 import numpy as np
 import pandas as pd
 
+import judge_kernel
+
 COL_VIDEO = "视频ID"
 COL_FRAME = "帧序号"
 
@@ -106,152 +108,85 @@ def apply_rules_per_metric(df: pd.DataFrame, rule_table: pd.DataFrame) -> pd.Dat
     cols_to_select = [COL_VIDEO, COL_FRAME] + [m for m in available_metrics if m in df.columns]
     out = df[cols_to_select].copy()
 
-    for m in available_metrics:
-        if m not in df.columns:
-            continue
-            
-        x = pd.to_numeric(out[m], errors="coerce")
-        lo = float(rt.loc[m, "下限"])
-        hi = float(rt.loc[m, "上限"])
-
-        ok = (x >= lo) & (x <= hi)
-        low_bad = (x < lo)
-        high_bad = (x > hi)
-
-        width = (hi - lo) if (hi - lo) != 0 else 1e-9
-        dev = pd.Series(0.0, index=out.index, dtype=float)
-        dev = dev.mask(low_bad, (lo - x) / width)
-        dev = dev.mask(high_bad, (x - hi) / width)
-        dev = dev.fillna(np.nan).clip(lower=0)
-
-        out[f"{m}__合规"] = ok.astype("Int64")
-        out[f"{m}__超下限"] = low_bad.astype("Int64")
-        out[f"{m}__超上限"] = high_bad.astype("Int64")
-        out[f"{m}__偏差"] = dev
-
-        def grade_from_dev(v):
-            if pd.isna(v):
-                return np.nan
-            if v <= 0:
-                return 0
-            elif v <= 0.5:
-                return 1
-            else:
-                return 2
-
-        out[f"{m}__审判_0标准1轻微2异常"] = out[f"{m}__偏差"].apply(grade_from_dev).astype("Int64")
-
-    weights = {row["指标"]: float(row["权重"]) for _, row in rule_table.iterrows()}
-
-    dev_cols = [f"{m}__偏差" for m in available_metrics if f"{m}__偏差" in out.columns]
-    
-    if not dev_cols:
-        out["帧级加权偏差"] = 0.0
-        out["帧级评分_0到100"] = 100.0
+    # 只审判 df 中存在的指标，(T,M) 矩阵一次性计算（正面统一为区间 between 判定）
+    judged = [m for m in available_metrics if m in df.columns]
+    if judged:
+        X = np.column_stack([pd.to_numeric(out[m], errors="coerce").to_numpy(dtype=float) for m in judged])
     else:
-        dev_mat = out[dev_cols].to_numpy(dtype=float)
-        
-        # Use weights only for available metrics
-        w = np.array([weights.get(m, 1.0) for m in available_metrics if f"{m}__偏差" in out.columns], dtype=float)
-        
-        mask = np.isfinite(dev_mat)
-        w_mat = np.tile(w.reshape(1, -1), (dev_mat.shape[0], 1))
-        w_eff = np.where(mask, w_mat, 0.0)
-        denom = w_eff.sum(axis=1)
-        numer = np.where(mask, dev_mat, 0.0) * w_eff
-        wdev = np.where(denom > 0, numer.sum(axis=1) / denom, np.nan)
-
-        score = 100.0 * (1.0 - np.clip(wdev, 0.0, 1.0))
-        out["帧级加权偏差"] = wdev
-        out["帧级评分_0到100"] = score
-
-    judge_cols = [f"{m}__审判_0标准1轻微2异常" for m in available_metrics if f"{m}__审判_0标准1轻微2异常" in out.columns]
-    if judge_cols:
-        judge_mat = out[judge_cols].to_numpy(dtype=float)
-        abnormal_cnt = np.nansum(judge_mat == 2, axis=1)
+        X = np.empty((len(out), 0), dtype=float)
+    weights = {row["指标"]: float(row["权重"]) for _, row in rule_table.iterrows()}
+    res = judge_kernel.judge_matrix(
+        X,
+        lo=rt.loc[judged, "下限"].astype(float).to_numpy(),
+        hi=rt.loc[judged, "上限"].astype(float).to_numpy(),
+        weights=[weights.get(m, 1.0) for m in judged],
+    )
+
+    cols = {}
+    for j, m in enumerate(judged):
+        cols[f"{m}__合规"] = pd.array(res["ok"][:, j].astype(np.int64), dtype="Int64")
+        cols[f"{m}__超下限"] = pd.array(res["low_bad"][:, j].astype(np.int64), dtype="Int64")
+        cols[f"{m}__超上限"] = pd.array(res["high_bad"][:, j].astype(np.int64), dtype="Int64")
+        cols[f"{m}__偏差"] = res["dev"][:, j]
+        cols[f"{m}__审判_0标准1轻微2异常"] = pd.Series(res["grade"][:, j]).astype("Int64").array
+
+    if not judged:
+        cols["帧级加权偏差"] = 0.0
+        cols["帧级评分_0到100"] = 100.0
+        res["verdict"] = judge_kernel.frame_verdicts(res["abnormal_cnt"], np.full(len(out), 100.0))
     else:
-        abnormal_cnt = np.zeros(len(out))
-
-    out["异常指标数_帧级"] = abnormal_cnt.astype(int)
+        cols["帧级加权偏差"] = res["wdev"]
+        cols["帧级评分_0到100"] = res["score"]
+    cols["异常指标数_帧级"] = res["abnormal_cnt"].astype(int)
+    cols["帧级结论"] = res["verdict"]
 
-    def frame_verdict(a_cnt, s):
-        if pd.isna(a_cnt) or pd.isna(s):
-            return np.nan
-        a_cnt = int(a_cnt)
-        s = float(s)
-        if a_cnt == 0 and s >= 90:
-            return "优秀"
-        if a_cnt == 0:
-            return "标准"
-        if a_cnt <= 2 and s >= 75:
-            return "基本标准"
-        return "不标准"
-
-    out["帧级结论"] = [frame_verdict(a, s) for a, s in zip(out["异常指标数_帧级"], out["帧级评分_0到100"])]
-    return out
+    return pd.concat([out, pd.DataFrame(cols, index=out.index)], axis=1)
 
 
 def add_streak_filter(df_flagged: pd.DataFrame, min_streak: int) -> pd.DataFrame:
     df_flagged = df_flagged.sort_values([COL_VIDEO, COL_FRAME]).reset_index(drop=True)
     raw_bad = (df_flagged["帧级结论"] == "不标准").fillna(False).to_numpy()
 
-    effective = np.zeros(len(df_flagged), dtype=bool)
-
-    for vid, idx in df_flagged.groupby(COL_VIDEO).groups.items():
-        inds = np.array(list(idx), dtype=int)
-        seq = raw_bad[inds]
-
-        start = None
-        for i, v in enumerate(seq):
-            if v and start is None:
-                start = i
-            if ((not v) or i == len(seq) - 1) and start is not None:
-                end = i if (not v) else i + 1
-                length = end - start
-                if length >= min_streak:
-                    effective[inds[start:end]] = True
-                start = None
+    # 排序后各视频连续存放，按组偏移量一次性计算所有视频的连续异常段
+    offsets, _ = judge_kernel.group_offsets(df_flagged[COL_VIDEO].to_numpy())
+    effective = judge_kernel.streak_mask(raw_bad, min_streak, offsets)
 
     df_flagged["帧级异常_连续过滤后"] = pd.Series(effective).astype("Int64")
 
-    def adjust(row):
-        if row["帧级结论"] == "不标准" and int(row["帧级异常_连续过滤后"]) == 0:
-            return "基本标准"
-        return row["帧级结论"]
-
-    df_flagged["帧级结论_连续过滤后"] = df_flagged.apply(adjust, axis=1)
+    verdict = df_flagged["帧级结论"].to_numpy(dtype=object)
+    df_flagged["帧级结论_连续过滤后"] = np.where((verdict == "不标准") & ~effective, "基本标准", verdict)
     return df_flagged
 
 
 def video_level_summary(df_flagged: pd.DataFrame) -> pd.DataFrame:
     rows = []
-    for vid, g in df_flagged.groupby(COL_VIDEO, sort=True):
-        g = g.sort_values(COL_FRAME)
-        n = len(g)
-
-        verdict = g["帧级结论_连续过滤后"]
-        p_bad = float((verdict == "不标准").mean()) if n else np.nan
-        p_std = float((verdict == "标准").mean()) if n else np.nan
-        p_basic = float((verdict == "基本标准").mean()) if n else np.nan
-        p_exc = float((verdict == "优秀").mean()) if n else np.nan
-
-        eff = g["帧级异常_连续过滤后"].fillna(0).astype(int).values
-        max_streak = 0
-        cur = 0
-        for v in eff:
-            if v == 1:
-                cur += 1
-                max_streak = max(max_streak, cur)
-            else:
-                cur = 0
-
-        metric_stats = {}
-        # Only check metrics that have judgment columns in the dataframe
-        available_metrics = [m for m in METRICS if f"{m}__审判_0标准1轻微2异常" in g.columns]
-        
-        for m in available_metrics:
-            vv = pd.to_numeric(g[f"{m}__审判_0标准1轻微2异常"], errors="coerce")
-            metric_stats[f"{m}__异常占比"] = float((vv == 2).mean())
+    # 按视频、帧序号排序后各视频连续存放：最长有效异常段由组偏移量一次性计算，各类占比由一次分组均值得到
+    ordered = df_flagged.sort_values([COL_VIDEO, COL_FRAME])
+    offsets, vids = judge_kernel.group_offsets(ordered[COL_VIDEO].to_numpy())
+    eff = ordered["帧级异常_连续过滤后"].fillna(0).astype(int).to_numpy() == 1
+    longest, _segments = judge_kernel.streak_stats(eff, offsets)
+
+    verdict = ordered["帧级结论_连续过滤后"]
+    flags = {label: verdict == label for label in ("不标准", "标准", "基本标准", "优秀")}
+    # Only check metrics that have judgment columns in the dataframe
+    available_metrics = [m for m in METRICS if f"{m}__审判_0标准1轻微2异常" in ordered.columns]
+    for m in available_metrics:
+        vv = pd.to_numeric(ordered[f"{m}__审判_0标准1轻微2异常"], errors="coerce")
+        flags[f"{m}__异常占比"] = vv == 2
+    rates = pd.DataFrame(flags).groupby(np.repeat(np.arange(len(vids)), np.diff(offsets))).mean()
+
+    for k, vid in enumerate(vids):
+        n = int(offsets[k + 1] - offsets[k])
+        r = rates.iloc[k]
+
+        p_bad = float(r["不标准"])
+        p_std = float(r["标准"])
+        p_basic = float(r["基本标准"])
+        p_exc = float(r["优秀"])
+
+        max_streak = int(longest[k])
+
+        metric_stats = {f"{m}__异常占比": float(r[f"{m}__异常占比"]) for m in available_metrics}
 
         top = sorted(metric_stats.items(), key=lambda x: -x[1])[:3]
         top_str = "; ".join([f"{k.replace('__异常占比','')}: {v:.3f}" for k, v in top])
@@ -3,6 +3,7 @@
 提供视频上传、分析处理、结果可视化展示功能
 """
 import os
+import gzip
 import json
 import sqlite3
 from datetime import datetime, timedelta
@@ -10,9 +11,12 @@ from pathlib import Path
 from flask import Flask, render_template, request, jsonify, send_file, send_from_directory
 from werkzeug.utils import secure_filename
 import pandas as pd
-import subprocess
 import threading
-from video_utils import convert_video_to_compatible_format
+from analysis_worker import get_worker_pool
+from job_queue import AnalysisJobQueue
+import db_pool
+import http_cache
+import keypoint_store
 import config
 import importlib.util
 import importlib.machinery
@@ -79,6 +83,28 @@ def record_ip_upload(ip_address):
         ip_upload_records[ip_address].append(datetime.now())
 
 
+# ================== 分析任务队列 ==================
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """获取分析任务队列（首次调用时建表、恢复中断任务并启动调度线程）"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = AnalysisJobQueue(app.config['DATABASE'], handler=run_analysis)
+            _job_queue.start()
+        return _job_queue
+
+
+@app.before_request
+def ensure_job_queue_started():
+    # 在实际处理请求的进程中启动调度线程（debug 模式下 reloader 的监控进程不会处理请求）
+    if _job_queue is None:
+        get_job_queue()
+
+
 # 添加CORS支持
 @app.after_request
 def after_request(response):
@@ -95,7 +121,7 @@ def allowed_file(filename):
 
 def init_db():
     """初始化SQLite数据库"""
-    conn = sqlite3.connect(app.config['DATABASE'])
+    conn = get_db()
     cursor = conn.cursor()
     
     # 创建视频表
@@ -207,6 +233,35 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_frame_analysis_front_video_id ON frame_analysis_details_front(video_id)
     ''')
 
+    # 逐帧指标的规范化存储（与上面的 JSON 列并存）：指标字典 + 每帧每指标一行
+    # 单视频单指标的时间序列走主键范围扫描，跨视频按指标 + 判定等级查询走 idx_frame_metric_grade
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metric_dictionary (
+            metric_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            view_angle TEXT NOT NULL,
+            metric_name TEXT NOT NULL,
+            UNIQUE (view_angle, metric_name)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_metric_dictionary_name ON metric_dictionary(metric_name)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS frame_metric_values (
+            video_id TEXT NOT NULL,
+            metric_id INTEGER NOT NULL,
+            frame_index INTEGER NOT NULL,
+            value REAL,
+            grade INTEGER,
+            deviation REAL,
+            PRIMARY KEY (video_id, metric_id, frame_index),
+            FOREIGN KEY (metric_id) REFERENCES metric_dictionary(metric_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_frame_metric_grade ON frame_metric_values(metric_id, grade, video_id, frame_index)
+    ''')
+
     # 创建视频级汇总表 - 侧面
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS video_analysis_summary (
@@ -273,16 +328,28 @@ def init_db():
     cursor.execute('''
         CREATE INDEX IF NOT EXISTS idx_keypoints_video_id ON keypoints_data(video_id)
     ''')
+
+    # 预计算的 /analysis/<video_id> 响应体（gzip 压缩的 JSON），version 与 ANALYSIS_PAYLOAD_VERSION 不一致时作废
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_payloads (
+            video_id TEXT NOT NULL,
+            analysis_type TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            encoding TEXT NOT NULL,
+            body BLOB NOT NULL,
+            raw_size INTEGER,
+            created_time TEXT,
+            PRIMARY KEY (video_id, analysis_type)
+        )
+    ''')
     
     conn.commit()
     conn.close()
 
 
 def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect(app.config['DATABASE'])
-    conn.row_factory = sqlite3.Row
-    return conn
+    """获取数据库连接（从连接池取出，close() 时归还）"""
+    return db_pool.connect(app.config['DATABASE'])
 
 
 def cleanup_old_data():
@@ -402,13 +469,16 @@ def cleanup_old_data():
                     # 定义需要清理的表和对应的条件
                     tables_to_clean = {
                         'analysis_results': 'video_id',
+                        'analysis_payloads': 'video_id',
                         'frame_analysis_details': 'video_id',
                         'frame_analysis_details_front': 'video_id',
+                        'frame_metric_values': 'video_id',
                         'video_analysis_summary': 'video_id',
                         'video_analysis_summary_front': 'video_id',
                         'keyframe_analysis_details': 'video_id',
                         'keyframe_analysis_details_front': 'video_id',
-                        'keypoints_data': 'video_id'
+                        'keypoints_data': 'video_id',
+                        'analysis_jobs': 'video_id'
                     }
                     
                     # 只删除存在的表
@@ -1019,6 +1089,7 @@ def upload_video():
     
     file = request.files['video']
     view_angle = request.form.get('view_angle', '侧面')
+    priority = request.form.get('priority', 0, type=int)
     
     if file.filename == '':
         return jsonify({'error': '未选择文件'}), 400
@@ -1044,23 +1115,42 @@ def upload_video():
     renamed_filename = f"{video_id}{ext}"
     video_path = os.path.join(app.config['UPLOAD_FOLDER'], renamed_filename)
     
-    # 保存文件
-    file.save(video_path)
-    print(f"[上传] 原始文件名: {original_filename}")
-    print(f"[上传] 重命名为: {renamed_filename}")
-    print(f"[上传] 视频ID: {video_id}")
-    print(f"[上传] 客户端IP: {client_ip}, 剩余上传次数: {remaining}")
-    
-    # 生成缩略图
-    thumbnail_path = generate_thumbnail(video_path, video_id)
+    # 先占住队列位置再写文件：队列已满时拒绝新任务（背压），提示客户端稍后重试
+    job_queue = get_job_queue()
+    job_id, retry_after = job_queue.try_enqueue(video_id, video_path, view_angle, priority=priority, hold=True)
+    if job_id is None:
+        conn.close()
+        response = jsonify({
+            'error': f'分析队列已满，请约 {retry_after} 秒后重试',
+            'retry_after': retry_after
+        })
+        response.status_code = 503
+        response.headers['Retry-After'] = str(retry_after)
+        return response
     
-    # 保存到数据库
-    cursor.execute('''
-        INSERT INTO videos (video_id, original_filename, renamed_filename, video_path, view_angle, upload_time, status, thumbnail_path)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (video_id, original_filename, renamed_filename, video_path, view_angle, datetime.now().isoformat(), 'processing', thumbnail_path))
-    conn.commit()
-    conn.close()
+    try:
+        # 保存文件
+        file.save(video_path)
+        print(f"[上传] 原始文件名: {original_filename}")
+        print(f"[上传] 重命名为: {renamed_filename}")
+        print(f"[上传] 视频ID: {video_id}")
+        print(f"[上传] 客户端IP: {client_ip}, 剩余上传次数: {remaining}")
+        
+        # 生成缩略图
+        thumbnail_path = generate_thumbnail(video_path, video_id)
+        
+        # 保存到数据库
+        cursor.execute('''
+            INSERT INTO videos (video_id, original_filename, renamed_filename, video_path, view_angle, upload_time, status, thumbnail_path)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (video_id, original_filename, renamed_filename, video_path, view_angle, datetime.now().isoformat(), 'processing', thumbnail_path))
+        conn.commit()
+    except Exception:
+        # 上传失败时释放占住的队列位置
+        job_queue.release(job_id)
+        raise
+    finally:
+        conn.close()
     
     # 记录本次上传
     record_ip_upload(client_ip)
@@ -1068,21 +1158,20 @@ def upload_video():
     # 清理旧数据（保留最新10条，并清理孤儿文件）
     cleanup_old_data()
     
-    # 启动后台分析任务
-    thread = threading.Thread(target=run_analysis, args=(video_id, video_path, view_angle))
-    thread.daemon = True
-    thread.start()
+    # 开始排队分析
+    job_queue.activate(job_id)
     
     return jsonify({
         'video_id': video_id,
         'message': '视频上传成功，正在后台分析...',
         'status': 'processing',
+        'queue': get_job_queue().get_status(video_id),
         'remaining_uploads': remaining - 1  # 减去本次上传
     })
 
 
 def run_analysis(video_id, video_path, view_angle):
-    """运行完整分析流程（后台任务）"""
+    """运行完整分析流程（后台任务），返回是否成功"""
     try:
         # Define unique output directories
         analysis_out_dir = os.path.join(config.ANALYSIS_CONFIG['OUTPUT_DIR'], video_id)
@@ -1094,156 +1183,232 @@ def run_analysis(video_id, video_path, view_angle):
         os.makedirs(kf_analysis_out_dir, exist_ok=True)
         os.makedirs(kp_out_dir, exist_ok=True)
 
-        # 1. 尝试转码原视频，确保浏览器可播放
-        print(f"[分析] 正在检查视频兼容性: {video_path}")
-        compatible_path = convert_video_to_compatible_format(video_path)
+        # 交给常驻工作进程执行 run_full_analysis.main()
+        # 转码（确保浏览器可播放）与各分析阶段共用同一次视频解码
+        argv = [
+            '--video_path', video_path,
+            '--view_angle', view_angle,
+            '--video_id', video_id,
+            '--analysis_out_dir', analysis_out_dir,
+            '--keyframe_analysis_out_dir', kf_analysis_out_dir,
+            '--kp_output_dir', kp_out_dir,
+            '--transcode'
+        ]
         
-        final_video_path = video_path
+        try:
+            result = get_worker_pool().run(argv)
+        except Exception as e:
+            print(f"分析失败: {e}")
+            update_video_status(video_id, 'failed')
+            return False
+        
+        compatible_path = (result or {}).get('transcoded')
         if compatible_path and compatible_path != video_path:
             print(f"[分析] 视频已转码为兼容格式: {compatible_path}")
-            final_video_path = compatible_path
             
             # 更新数据库中的视频路径
             try:
                 conn = get_db()
                 cursor = conn.cursor()
-                cursor.execute('UPDATE videos SET video_path = ? WHERE video_id = ?', (final_video_path, video_id))
+                cursor.execute('UPDATE videos SET video_path = ? WHERE video_id = ?', (compatible_path, video_id))
                 conn.commit()
                 conn.close()
             except Exception as db_e:
                 print(f"[警告] 更新数据库视频路径失败: {db_e}")
         
-        # 2. 调用run_full_analysis.py
-        cmd = [
-            'python', 'run_full_analysis.py',
-            '--video_path', final_video_path,
-            '--view_angle', view_angle,
-            '--video_id', video_id,
-            '--analysis_out_dir', analysis_out_dir,
-            '--keyframe_analysis_out_dir', kf_analysis_out_dir,
-            '--kp_output_dir', kp_out_dir
-        ]
-        
-        # Windows系统需要使用gbk编码或忽略编码错误
-        import sys
-        encoding = 'gbk' if sys.platform == 'win32' else 'utf-8'
-        
-        result = subprocess.run(
-            cmd, 
-            capture_output=True, 
-            text=True, 
-            encoding=encoding,
-            errors='replace'  # 替换无法解码的字符
-        )
-        
-        if result.returncode == 0:
-            # 分析成功，收集结果文件
-            collect_analysis_results(video_id, view_angle, analysis_out_dir, kf_analysis_out_dir, kp_out_dir)
-            update_video_status(video_id, 'completed')
-        else:
-            print(f"分析失败: {result.stderr}")
-            update_video_status(video_id, 'failed')
+        # 分析成功，收集结果文件
+        collect_analysis_results(video_id, view_angle, analysis_out_dir, kf_analysis_out_dir, kp_out_dir,
+                                 tables=(result or {}).get('tables'))
+        update_video_status(video_id, 'completed')
+        return True
     
     except Exception as e:
         print(f"分析过程出错: {str(e)}")
         update_video_status(video_id, 'failed')
+        return False
+
+
+# 逐帧表中不进入 metrics_json / judgments_json 的列
+FRAME_META_COLUMNS = ('视频ID', '帧序号', '帧级加权偏差', '帧级评分_0到100', '帧级结论', '帧级异常_连续过滤后', '帧级结论_连续过滤后')
+KEYFRAME_META_COLUMNS = ('视频ID', '帧序号', '关键帧名称', '关键帧索引')
+# 逐帧判定列的后缀（"<指标>__<后缀>"）
+GRADE_SUFFIX = '审判_0标准1轻微2异常'
+DEVIATION_SUFFIX = '偏差'
+
+
+def _analysis_table(tables, name, csv_path, video_id):
+    """优先使用流水线返回的内存表，没有时读取 CSV；只保留该视频的行，都没有时返回 None。"""
+    df = (tables or {}).get(name)
+    if df is None:
+        if not os.path.exists(csv_path):
+            return None
+        df = pd.read_csv(csv_path, encoding='utf-8-sig')
+    if '视频ID' in df.columns:
+        df = df[df['视频ID'] == video_id]
+    return df
+
+
+def _column_values(df, values, col, default):
+    """整列取值（values 为 df.to_numpy().tolist() 的结果），列不存在时每行取 default。"""
+    if col not in df.columns:
+        return [default] * len(values)
+    j = df.columns.get_loc(col)
+    return [row[j] for row in values]
+
+
+def _metric_json_rows(df, values, skip):
+    """
+    逐行生成 (metrics_json, judgments_json)
+    列名含 "__" 的是判定结果，按 指标名 -> {后缀: 值} 分组，其余列为指标数值；列的拆分只做一次
+    """
+    metric_cols = []
+    judge_cols = []
+    for j, col in enumerate(df.columns):
+        if col in skip:
+            continue
+        if '__' in col:
+            metric_name, suffix = col.split('__', 1)
+            judge_cols.append((j, metric_name, suffix))
+        else:
+            metric_cols.append((j, col))
+
+    rows = []
+    for row in values:
+        metrics = {col: row[j] for j, col in metric_cols}
+        judgments = {}
+        for j, metric_name, suffix in judge_cols:
+            judgments.setdefault(metric_name, {})[suffix] = row[j]
+        rows.append((json.dumps(metrics, ensure_ascii=False), json.dumps(judgments, ensure_ascii=False)))
+    return rows
 
 
-def ingest_analysis_data(conn, video_id, view_angle_cn, kp_dir=None, analysis_dir=None, kf_analysis_dir=None):
-    """将CSV数据导入数据库表"""
+def _metric_ids(cursor, view_angle_cn, metric_names):
+    """指标名 -> metric_id（字典表中还没有的指标先登记）。"""
+    cursor.executemany('INSERT OR IGNORE INTO metric_dictionary (view_angle, metric_name) VALUES (?, ?)',
+                       [(view_angle_cn, name) for name in metric_names])
+    cursor.execute('SELECT metric_id, metric_name FROM metric_dictionary WHERE view_angle = ?', (view_angle_cn,))
+    return {row[1]: row[0] for row in cursor.fetchall()}
+
+
+def _ingest_frame_metrics(cursor, video_id, view_angle_cn, df):
+    """
+    逐帧指标写入规范化的 frame_metric_values：每帧每指标一行 (数值, 判定等级, 偏差)
+    判定等级取 "<指标>__审判_0标准1轻微2异常" 列，偏差取 "<指标>__偏差" 列，按整列取值后批量插入
+    """
+    metric_names = [c for c in df.columns if c not in FRAME_META_COLUMNS and '__' not in c]
+    metric_ids = _metric_ids(cursor, view_angle_cn, metric_names)
+    cursor.execute('''
+        DELETE FROM frame_metric_values WHERE video_id = ?
+        AND metric_id IN (SELECT metric_id FROM metric_dictionary WHERE view_angle = ?)
+    ''', (video_id, view_angle_cn))
+
+    frames = [int(v) for v in df['帧序号'].tolist()] if '帧序号' in df.columns else list(range(len(df)))
+    missing = [None] * len(df)
+    rows = []
+    for name in metric_names:
+        grade_col, deviation_col = f'{name}__{GRADE_SUFFIX}', f'{name}__{DEVIATION_SUFFIX}'
+        values = pd.to_numeric(df[name], errors='coerce').tolist()
+        grades = df[grade_col].tolist() if grade_col in df.columns else missing
+        deviations = df[deviation_col].tolist() if deviation_col in df.columns else missing
+        metric_id = metric_ids[name]
+        rows.extend((video_id, metric_id, frame, value, grade, deviation)
+                    for frame, value, grade, deviation in zip(frames, values, grades, deviations))
+
+    cursor.executemany('''
+        INSERT OR REPLACE INTO frame_metric_values (video_id, metric_id, frame_index, value, grade, deviation)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    return len(rows)
+
+
+def ingest_analysis_data(conn, video_id, view_angle_cn, kp_dir=None, analysis_dir=None, kf_analysis_dir=None,
+                         include_keypoints=True, commit=True, tables=None, strict=None):
+    """
+    将分析结果导入数据库表（每张表先删除该视频的旧行，再用 executemany 批量插入）
+    include_keypoints: 是否重新导入关键点（批量重分析时关键点未变，可跳过）
+    commit: 是否在函数末尾提交（为 False 时由调用方在同一事务中提交或回滚）
+    strict: 某张表导入失败时是否抛出异常（默认 commit=False 时抛出，由调用方回滚、保留旧数据；
+            否则只打印错误，继续导入其余表）
+    tables: 流水线返回的内存表 {"frame": 逐帧审判, "summary": 视频级汇总, "kf_frame": 关键帧逐帧详情}，
+            提供时直接使用，缺少的表才读取输出目录中的 CSV
+    """
+    if strict is None:
+        strict = not commit
     cursor = conn.cursor()
-    
+
     # Use provided directories or fall back to config
     kp_base = kp_dir if kp_dir else config.KEYPOINT_CONFIG['OUTPUT_DIR']
     analysis_base = analysis_dir if analysis_dir else config.ANALYSIS_CONFIG['OUTPUT_DIR']
     kf_analysis_base = kf_analysis_dir if kf_analysis_dir else config.KEYFRAME_ANALYSIS_CONFIG['OUTPUT_DIR']
 
-    # 1. 导入关键点数据
-    kp_csv = os.path.join(kp_base, "单视频_缺陷分析数据.csv")
-    if os.path.exists(kp_csv):
+    # 明细变化后预计算的 /analysis 响应作废（collect_analysis_results 会重新生成，其余情况在首次请求时重建）
+    cursor.execute("DELETE FROM analysis_payloads WHERE video_id = ?", (video_id,))
+
+    # 1. 导入关键点数据（keypoints.npy，兼容旧版 CSV）
+    kp_path = keypoint_store.find_keypoints(kp_base) if include_keypoints else None
+    if kp_path:
         try:
-            df = pd.read_csv(kp_csv)
-            if 'video_id' in df.columns:
-                df = df[df['video_id'] == video_id]
-            
+            kps = keypoint_store.load_keypoints(kp_path).select_video(video_id)
+            rows = [
+                (video_id, frame_idx, json.dumps(landmarks))
+                for frame_idx, landmarks in zip(kps.frame_index.tolist(), kps.landmark_rows())
+            ]
+
             cursor.execute("DELETE FROM keypoints_data WHERE video_id = ?", (video_id,))
-            
-            for _, row in df.iterrows():
-                frame_idx = int(row.get('frame_index', row.get('frame_序号', 0)))
-                landmarks = []
-                for i in range(33):
-                    lm_str = row.get(f'landmark_{i}', '')
-                    landmarks.append(lm_str)
-                
-                cursor.execute('''
-                    INSERT INTO keypoints_data (video_id, frame_index, landmarks_json)
-                    VALUES (?, ?, ?)
-                ''', (video_id, frame_idx, json.dumps(landmarks)))
-            print(f"[入库] 关键点数据: {len(df)} 条")
+            cursor.executemany('''
+                INSERT INTO keypoints_data (video_id, frame_index, landmarks_json)
+                VALUES (?, ?, ?)
+            ''', rows)
+            print(f"[入库] 关键点数据: {len(rows)} 条")
         except Exception as e:
             print(f"[错误] 导入关键点数据失败: {e}")
+            if strict:
+                raise
 
     # 2. 导入逐帧分析详情
-    frame_csv = os.path.join(analysis_base, f"{view_angle_cn}_逐帧审判结果.csv")
-    if os.path.exists(frame_csv):
-        try:
-            df = pd.read_csv(frame_csv, encoding='utf-8-sig')
-            if '视频ID' in df.columns:
-                df = df[df['视频ID'] == video_id]
-            
+    try:
+        df = _analysis_table(tables, 'frame', os.path.join(analysis_base, f"{view_angle_cn}_逐帧审判结果.csv"), video_id)
+        if df is not None:
             # 根据视角选择表名
             table_name = "frame_analysis_details_front" if view_angle_cn == "正面" else "frame_analysis_details"
-            
+
+            values = df.to_numpy().tolist()
+            verdict_col = '帧级结论_连续过滤后' if '帧级结论_连续过滤后' in df.columns else '帧级结论'
+            rows = [
+                (video_id, int(frame_idx), metrics_json, judgments_json, score, verdict)
+                for frame_idx, (metrics_json, judgments_json), score, verdict in zip(
+                    _column_values(df, values, '帧序号', 0),
+                    _metric_json_rows(df, values, FRAME_META_COLUMNS),
+                    _column_values(df, values, '帧级评分_0到100', 0),
+                    _column_values(df, values, verdict_col, ''),
+                )
+            ]
+
             cursor.execute(f"DELETE FROM {table_name} WHERE video_id = ?", (video_id,))
-            
-            for _, row in df.iterrows():
-                frame_idx = int(row.get('帧序号', 0))
-                metrics = {}
-                judgments = {}
-                
-                for col in df.columns:
-                    if col in ['视频ID', '帧序号', '帧级加权偏差', '帧级评分_0到100', '帧级结论', '帧级异常_连续过滤后', '帧级结论_连续过滤后']:
-                        continue
-                    
-                    if '__' in col:
-                        # 判定结果
-                        metric_name, suffix = col.split('__', 1)
-                        if metric_name not in judgments:
-                            judgments[metric_name] = {}
-                        judgments[metric_name][suffix] = row[col]
-                    else:
-                        # 指标数值
-                        metrics[col] = row[col]
-                
-                cursor.execute(f'''
-                    INSERT INTO {table_name} 
-                    (video_id, frame_index, metrics_json, judgments_json, frame_score, frame_verdict)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    video_id, 
-                    frame_idx, 
-                    json.dumps(metrics, ensure_ascii=False), 
-                    json.dumps(judgments, ensure_ascii=False),
-                    row.get('帧级评分_0到100', 0),
-                    row.get('帧级结论_连续过滤后', row.get('帧级结论', ''))
-                ))
-            print(f"[入库] 逐帧分析数据: {len(df)} 条")
-        except Exception as e:
-            print(f"[错误] 导入逐帧分析数据失败: {e}")
+            cursor.executemany(f'''
+                INSERT INTO {table_name}
+                (video_id, frame_index, metrics_json, judgments_json, frame_score, frame_verdict)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            print(f"[入库] 逐帧分析数据: {len(rows)} 条")
+
+            if config.DB_CONFIG['FRAME_METRIC_TABLE']:
+                count = _ingest_frame_metrics(cursor, video_id, view_angle_cn, df)
+                print(f"[入库] 逐帧指标（规范化）: {count} 条")
+    except Exception as e:
+        print(f"[错误] 导入逐帧分析数据失败: {e}")
+        if strict:
+            raise
 
     # 3. 导入视频级汇总
-    summary_csv = os.path.join(analysis_base, f"{view_angle_cn}_视频级审判汇总.csv")
-    if os.path.exists(summary_csv):
-        try:
-            df = pd.read_csv(summary_csv, encoding='utf-8-sig')
-            if '视频ID' in df.columns:
-                df = df[df['视频ID'] == video_id]
-            
+    try:
+        df = _analysis_table(tables, 'summary', os.path.join(analysis_base, f"{view_angle_cn}_视频级审判汇总.csv"), video_id)
+        if df is not None:
             # 根据视角选择表名
             table_name = "video_analysis_summary_front" if view_angle_cn == "正面" else "video_analysis_summary"
-            
+
             cursor.execute(f"DELETE FROM {table_name} WHERE video_id = ?", (video_id,))
-            
+
             if not df.empty:
                 row = df.iloc[0]
                 # 提取Top问题
@@ -1256,82 +1421,67 @@ def ingest_analysis_data(conn, video_id, view_angle_cn, kp_dir=None, analysis_di
                         if metric_name not in metrics_summary:
                             metrics_summary[metric_name] = {}
                         metrics_summary[metric_name][suffix] = row[col]
-                
+
                 cursor.execute(f'''
-                    INSERT INTO {table_name} 
+                    INSERT INTO {table_name}
                     (video_id, total_score, verdict, top_issues_json, metrics_summary_json)
                     VALUES (?, ?, ?, ?, ?)
                 ''', (
                     video_id,
-                    row.get('优秀帧占比', 0) * 100, 
+                    row.get('优秀帧占比', 0) * 100,
                     row.get('视频判定', ''),
                     json.dumps(top_issues, ensure_ascii=False),
                     json.dumps(metrics_summary, ensure_ascii=False)
                 ))
             print(f"[入库] 视频汇总数据")
-        except Exception as e:
-            print(f"[错误] 导入视频汇总数据失败: {e}")
+    except Exception as e:
+        print(f"[错误] 导入视频汇总数据失败: {e}")
+        if strict:
+            raise
 
     # 4. 导入关键帧分析详情
-    kf_csv = os.path.join(kf_analysis_base, f"{view_angle_cn}_关键帧分析_逐帧详情.csv")
-    if os.path.exists(kf_csv):
-        try:
-            df = pd.read_csv(kf_csv, encoding='utf-8-sig')
-            if '视频ID' in df.columns:
-                df = df[df['视频ID'] == video_id]
-            
+    try:
+        df = _analysis_table(tables, 'kf_frame',
+                             os.path.join(kf_analysis_base, f"{view_angle_cn}_关键帧分析_逐帧详情.csv"), video_id)
+        if df is not None:
             # 根据视角选择表名
             table_name = "keyframe_analysis_details_front" if view_angle_cn == "正面" else "keyframe_analysis_details"
-            
+
+            values = df.to_numpy().tolist()
+            rows = [
+                (video_id, int(frame_idx), event_name, metrics_json, judgments_json)
+                for frame_idx, event_name, (metrics_json, judgments_json) in zip(
+                    _column_values(df, values, '帧序号', 0),
+                    _column_values(df, values, '关键帧名称', ''),
+                    _metric_json_rows(df, values, KEYFRAME_META_COLUMNS),
+                )
+            ]
+
             cursor.execute(f"DELETE FROM {table_name} WHERE video_id = ?", (video_id,))
-            
-            for _, row in df.iterrows():
-                frame_idx = int(row.get('帧序号', 0))
-                event_name = row.get('关键帧名称', '')
-                metrics = {}
-                judgments = {}
-                
-                for col in df.columns:
-                    if col in ['视频ID', '帧序号', '关键帧名称', '关键帧索引']:
-                        continue
-                    if '__' in col:
-                        metric_name, suffix = col.split('__', 1)
-                        if metric_name not in judgments:
-                            judgments[metric_name] = {}
-                        judgments[metric_name][suffix] = row[col]
-                    else:
-                        metrics[col] = row[col]
-                
-                cursor.execute(f'''
-                    INSERT INTO {table_name} 
-                    (video_id, frame_index, event_name, metrics_json, judgments_json)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    video_id,
-                    frame_idx,
-                    event_name,
-                    json.dumps(metrics, ensure_ascii=False),
-                    json.dumps(judgments, ensure_ascii=False)
-                ))
-            print(f"[入库] 关键帧分析数据: {len(df)} 条")
-        except Exception as e:
-            print(f"[错误] 导入关键帧分析数据失败: {e}")
-            
-    conn.commit()
+            cursor.executemany(f'''
+                INSERT INTO {table_name}
+                (video_id, frame_index, event_name, metrics_json, judgments_json)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            print(f"[入库] 关键帧分析数据: {len(rows)} 条")
+    except Exception as e:
+        print(f"[错误] 导入关键帧分析数据失败: {e}")
+        if strict:
+            raise
 
+    if commit:
+        conn.commit()
 
-def collect_analysis_results(video_id, view_angle, analysis_dir=None, kf_analysis_dir=None, kp_dir=None):
-    """收集并存储分析结果到数据库"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
+
+def collect_analysis_results(video_id, view_angle, analysis_dir=None, kf_analysis_dir=None, kp_dir=None, tables=None):
+    """
+    收集并存储分析结果到数据库
+    tables: 流水线返回的内存表（见 ingest_analysis_data），明细入库与结果记录在同一事务中提交
+    """
     # 确保view_angle是中文（侧面/正面）
     view_mapping = {"side": "侧面", "front": "正面", "侧面": "侧面", "正面": "正面"}
     view_angle_cn = view_mapping.get(view_angle, view_angle)
     
-    # 调用数据入库函数
-    ingest_analysis_data(conn, video_id, view_angle_cn, kp_dir, analysis_dir, kf_analysis_dir)
-    
     # Use provided directories or fall back to config
     analysis_base = analysis_dir if analysis_dir else config.ANALYSIS_CONFIG['OUTPUT_DIR']
     kf_analysis_base = kf_analysis_dir if kf_analysis_dir else config.KEYFRAME_ANALYSIS_CONFIG['OUTPUT_DIR']
@@ -1385,11 +1535,9 @@ def collect_analysis_results(video_id, view_angle, analysis_dir=None, kf_analysi
     
     # 读取视频级汇总
     video_summary_json = None
-    if os.path.exists(video_summary_csv):
-        df = pd.read_csv(video_summary_csv, encoding='utf-8-sig')
-        video_row = df[df['视频ID'] == video_id]
-        if not video_row.empty:
-            video_summary_json = video_row.iloc[0].to_json(force_ascii=False)
+    video_row = _analysis_table(tables, 'summary', video_summary_csv, video_id)
+    if video_row is not None and not video_row.empty:
+        video_summary_json = video_row.iloc[0].to_json(force_ascii=False)
     
     # 生成并保存 AI 反馈（双语版本）
     ai_feedback = {'zh': None, 'en': None}
@@ -1403,34 +1551,54 @@ def collect_analysis_results(video_id, view_angle, analysis_dir=None, kf_analysi
     except Exception as e:
         print(f"[AI] 生成反馈时出错: {e}")
 
-    # 插入逐帧分析结果
-    cursor.execute('''
-        INSERT INTO analysis_results 
-        (video_id, view_angle, analysis_type, csv_path, visualization_path, 
-         skeleton_video_path, keyframes_json, video_summary_json, ai_feedback_html_zh, ai_feedback_html_en, created_time)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        video_id, view_angle_cn, 'frame_by_frame',
-        frame_csv if os.path.exists(frame_csv) else None,
-        vis_video if os.path.exists(vis_video) else None,
-        skeleton_video if os.path.exists(skeleton_video) else None,
-        keyframes_json,
-        video_summary_json,
-        ai_feedback['zh'],
-        ai_feedback['en'],
-        datetime.now().isoformat()
-    ))
-    
-    # 插入关键帧分析结果
-    if os.path.exists(keyframe_csv):
+    # AI 反馈生成较慢，放在写库之前；明细入库与结果记录在同一事务中提交，失败时整体回滚
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        ingest_analysis_data(conn, video_id, view_angle_cn, kp_dir, analysis_dir, kf_analysis_dir,
+                             commit=False, tables=tables)
+
+        # 插入逐帧分析结果
         cursor.execute('''
             INSERT INTO analysis_results 
-            (video_id, view_angle, analysis_type, csv_path, keyframes_json, ai_feedback_html_zh, ai_feedback_html_en, created_time)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (video_id, view_angle_cn, 'keyframe', keyframe_csv, keyframes_json, ai_feedback['zh'], ai_feedback['en'], datetime.now().isoformat()))
-    
-    conn.commit()
-    conn.close()
+            (video_id, view_angle, analysis_type, csv_path, visualization_path, 
+             skeleton_video_path, keyframes_json, video_summary_json, ai_feedback_html_zh, ai_feedback_html_en, created_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            video_id, view_angle_cn, 'frame_by_frame',
+            frame_csv if os.path.exists(frame_csv) else None,
+            vis_video if vis_video and os.path.exists(vis_video) else None,
+            skeleton_video if skeleton_video and os.path.exists(skeleton_video) else None,
+            keyframes_json,
+            video_summary_json,
+            ai_feedback['zh'],
+            ai_feedback['en'],
+            datetime.now().isoformat()
+        ))
+
+        # 插入关键帧分析结果
+        if os.path.exists(keyframe_csv):
+            cursor.execute('''
+                INSERT INTO analysis_results 
+                (video_id, view_angle, analysis_type, csv_path, keyframes_json, ai_feedback_html_zh, ai_feedback_html_en, created_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (video_id, view_angle_cn, 'keyframe', keyframe_csv, keyframes_json, ai_feedback['zh'], ai_feedback['en'], datetime.now().isoformat()))
+
+        # 预计算 /analysis 的响应体，请求时直接返回
+        for analysis_type, table in (('frame_by_frame', 'frame'), ('keyframe', 'kf_frame')):
+            try:
+                payload = build_analysis_payload(cursor, video_id, analysis_type, df=(tables or {}).get(table))
+            except AnalysisPayloadError as e:
+                print(f"[收集结果] 跳过预计算 {analysis_type} 响应: {e}")
+                continue
+            store_analysis_payload(cursor, video_id, analysis_type, payload)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
 
 def update_video_status(video_id, status):
@@ -1454,12 +1622,8 @@ def list_videos():
     videos = [dict(row) for row in cursor.fetchall()]
     conn.close()
     
-    # 创建响应并禁用缓存
-    response = jsonify(videos)
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+    # 列表随上传 / 分析进度变化：每次都向服务器验证，内容未变时返回 304
+    return http_cache.json_response(videos)
 
 
 @app.route('/videos/delete', methods=['POST'])
@@ -1515,12 +1679,15 @@ def delete_videos():
             tables_to_clean = [
                 'frame_analysis_details',
                 'frame_analysis_details_front',
+                'frame_metric_values',
                 'video_analysis_summary',
                 'video_analysis_summary_front',
                 'keyframe_analysis_details',
                 'keyframe_analysis_details_front',
                 'keypoints_data',
                 'analysis_results',
+                'analysis_payloads',
+                'analysis_jobs',
                 'videos'
             ]
             
@@ -1562,37 +1729,49 @@ def get_video_info(video_id):
     cursor.execute('SELECT * FROM analysis_results WHERE video_id = ?', (video_id,))
     results = [dict(row) for row in cursor.fetchall()]
     conn.close()
-    
-    return jsonify({
+
+    # 处理中的视频排队信息会变化，只有已完成的才按 COMPLETED_MAX_AGE 缓存
+    cache_control = http_cache.completed_cache_control() if video['status'] == 'completed' else 'no-cache'
+    return http_cache.json_response({
         'video': dict(video),
-        'analysis_results': results
-    })
+        'analysis_results': results,
+        # 排队位置与预计开始时间（无任务记录时为 None）
+        'queue': get_job_queue().get_status(video_id)
+    }, cache_control=cache_control)
 
 
-@app.route('/analysis/<video_id>')
-def get_analysis_data(video_id):
-    """获取分析数据（逐帧和关键帧）"""
-    analysis_type = request.args.get('type', 'frame_by_frame')
-    
-    conn = get_db()
-    cursor = conn.cursor()
-    
+# /analysis 响应体的格式版本：响应结构或透视逻辑变化时加 1，旧版本的预计算结果自动作废、按需重建
+ANALYSIS_PAYLOAD_VERSION = 1
+
+
+class AnalysisPayloadError(Exception):
+    """无法生成 /analysis 响应（没有分析记录或 CSV），status 为返回的 HTTP 状态码。"""
+
+    def __init__(self, message, status=404):
+        super().__init__(message)
+        self.status = status
+
+
+def build_analysis_payload(cursor, video_id, analysis_type, df=None):
+    """
+    生成 /analysis/<video_id> 的响应内容
+    df: 入库时传入流水线返回的内存表；为 None 时读取 analysis_results.csv_path
+    """
     # 获取视频视角
     cursor.execute('SELECT view_angle FROM videos WHERE video_id = ?', (video_id,))
     video_row = cursor.fetchone()
     view_angle = video_row['view_angle'] if video_row else '侧面'
     view_mapping = {"side": "侧面", "front": "正面", "侧面": "侧面", "正面": "正面"}
     view_angle_cn = view_mapping.get(view_angle, view_angle)
-    
+
     cursor.execute('''
-        SELECT * FROM analysis_results 
+        SELECT * FROM analysis_results
         WHERE video_id = ? AND analysis_type = ?
     ''', (video_id, analysis_type))
     result = cursor.fetchone()
-    conn.close()
-    
+
     if not result:
-        return jsonify({'error': '未找到分析记录'}), 404
+        raise AnalysisPayloadError('未找到分析记录')
 
     # 获取中英文 AI 反馈
     try:
@@ -1602,47 +1781,42 @@ def get_analysis_data(video_id):
         }
     except (KeyError, TypeError):
         ai_feedback = {'zh': None, 'en': None}
-    
-    if not result['csv_path']:
-        return jsonify({'error': 'CSV路径未设置'}), 404
-        
-    if not os.path.exists(result['csv_path']):
-        return jsonify({'error': f'CSV文件不存在: {result["csv_path"]}'}), 404
-    
-    # 读取CSV数据
-    try:
-        df = pd.read_csv(result['csv_path'], encoding='utf-8-sig')
-        # print(f"[调试] 加载CSV成功: {result['csv_path']}, 行数: {len(df)}, 列: {list(df.columns)}")
-    except Exception as e:
-        return jsonify({'error': f'读取CSV失败: {str(e)}'}), 500
-    
+
+    if df is None:
+        if not result['csv_path']:
+            raise AnalysisPayloadError('CSV路径未设置')
+
+        if not os.path.exists(result['csv_path']):
+            raise AnalysisPayloadError(f'CSV文件不存在: {result["csv_path"]}')
+
+        # 读取CSV数据
+        try:
+            df = pd.read_csv(result['csv_path'], encoding='utf-8-sig')
+        except Exception as e:
+            raise AnalysisPayloadError(f'读取CSV失败: {str(e)}', 500)
+
     # 筛选该视频的数据（如果有视频ID列）
     if '视频ID' in df.columns:
-        original_len = len(df)
         df = df[df['视频ID'] == video_id]
-        # print(f"[调试] 筛选后行数: {len(df)} (原始: {original_len})")
         if len(df) == 0:
             print(f"[警告] 筛选后数据为空，视频ID不匹配: {video_id}")
-    
+
     # 如果是关键帧分析，需要进行透视转换 (Long -> Wide) 并补充帧号
     if analysis_type == 'keyframe':
         # 1. 获取关键帧帧号
         # 优先从当前记录获取，如果没有则尝试从 frame_by_frame 记录获取
         keyframes = []
         kf_json_str = result['keyframes_json']
-        
+
         if not kf_json_str:
-            conn = get_db()
-            cursor = conn.cursor()
             cursor.execute('''
-                SELECT keyframes_json FROM analysis_results 
+                SELECT keyframes_json FROM analysis_results
                 WHERE video_id = ? AND analysis_type = 'frame_by_frame'
             ''', (video_id,))
             fbf_row = cursor.fetchone()
-            conn.close()
             if fbf_row:
                 kf_json_str = fbf_row['keyframes_json']
-        
+
         if kf_json_str:
             try:
                 kf_data = json.loads(kf_json_str)
@@ -1653,7 +1827,7 @@ def get_analysis_data(video_id):
                     keyframes = kf_data
             except:
                 pass
-        
+
         # 2. 透视数据
         # 假设列: video_id, event_index, metric, value, low_th_q20, high_th_q80, label
         wide_data = []
@@ -1665,24 +1839,24 @@ def get_analysis_data(video_id):
                     'event_index': int(event_idx),
                     'abs_frame': keyframes[int(event_idx)-1] if (0 <= int(event_idx)-1 < len(keyframes)) else None
                 }
-                
+
                 defect_count = 0
                 worst_label_rank = 0 # 0:normal, 1:slight, 2:severe
                 worst_label = 'normal'
-                
+
                 for _, item in group.iterrows():
                     metric = item['metric']
                     row[metric] = item['value']
-                    
+
                     # 处理 label，确保不是 NaN
                     label = item.get('label')
                     if pd.isna(label) or str(label).lower() == 'nan':
                         label = 'normal'
                     row[f"{metric}__label"] = label
-                    
+
                     row[f"{metric}__low_q20"] = item.get('low_th_q20')
                     row[f"{metric}__high_q80"] = item.get('high_th_q80')
-                    
+
                     # 统计缺陷
                     if label != 'normal':
                         defect_count += 1
@@ -1690,26 +1864,23 @@ def get_analysis_data(video_id):
                         if rank > worst_label_rank:
                             worst_label_rank = rank
                             worst_label = label
-                
+
                 row['defect_count'] = defect_count
                 row['worst_label'] = worst_label
                 wide_data.append(row)
-        
+
         data = wide_data
     else:
         # 逐帧分析保持原样
         data = df.to_dict(orient='records')
-    
+
     # 尝试从数据库获取更详细的汇总信息（如果CSV中没有）
     video_summary = json.loads(result['video_summary_json']) if result['video_summary_json'] else None
-    
+
     # 如果是正面视角，尝试从正面汇总表获取
     if not video_summary and view_angle_cn == '正面':
-        conn = get_db()
-        cursor = conn.cursor()
         cursor.execute('SELECT * FROM video_analysis_summary_front WHERE video_id = ?', (video_id,))
         summary_row = cursor.fetchone()
-        conn.close()
         if summary_row:
             video_summary = {
                 'total_score': summary_row['total_score'],
@@ -1718,7 +1889,7 @@ def get_analysis_data(video_id):
                 'metrics_summary': json.loads(summary_row['metrics_summary_json']) if summary_row['metrics_summary_json'] else {}
             }
 
-    return jsonify({
+    return {
         'video_id': video_id,
         'analysis_type': analysis_type,
         'data': data,
@@ -1727,7 +1898,74 @@ def get_analysis_data(video_id):
         'keyframes': json.loads(result['keyframes_json']) if result['keyframes_json'] else None,
         'video_summary': video_summary
         , 'ai_feedback': ai_feedback
-    })
+    }
+
+
+def store_analysis_payload(cursor, video_id, analysis_type, payload):
+    """
+    序列化（与 jsonify 相同的 JSON 设置）并 gzip 压缩后存入 analysis_payloads
+    返回 (gzip 压缩的响应体, 生成时间)，与 load_analysis_payload 一致
+    """
+    body = app.json.dumps(payload).encode('utf-8')
+    gzipped = gzip.compress(body, mtime=0)
+    created = datetime.now()
+    cursor.execute('''
+        INSERT OR REPLACE INTO analysis_payloads
+        (video_id, analysis_type, version, encoding, body, raw_size, created_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (video_id, analysis_type, ANALYSIS_PAYLOAD_VERSION, 'gzip', gzipped, len(body), created.isoformat()))
+    return gzipped, created
+
+
+def load_analysis_payload(cursor, video_id, analysis_type):
+    """读取预计算的响应体：(gzip 压缩的 JSON, 生成时间)；没有或版本过期时返回 None。"""
+    cursor.execute('''
+        SELECT version, encoding, body, created_time FROM analysis_payloads WHERE video_id = ? AND analysis_type = ?
+    ''', (video_id, analysis_type))
+    row = cursor.fetchone()
+    if row is None or row['version'] != ANALYSIS_PAYLOAD_VERSION or row['encoding'] != 'gzip':
+        return None
+    return bytes(row['body']), datetime.fromisoformat(row['created_time'])
+
+
+def _video_cache_control(cursor, video_id):
+    """已完成分析的视频按 COMPLETED_MAX_AGE 缓存（默认同样每次重新验证）；处理中的每次都要重新验证。"""
+    cursor.execute('SELECT status FROM videos WHERE video_id = ?', (video_id,))
+    row = cursor.fetchone()
+    if row is not None and row['status'] == 'completed':
+        return http_cache.completed_cache_control()
+    return 'no-cache'
+
+
+@app.route('/analysis/<video_id>')
+def get_analysis_data(video_id):
+    """
+    获取分析数据（逐帧和关键帧）
+    直接返回入库时预计算的响应体（带 ETag，客户端接受 gzip 时不解压直接发送）；
+    旧数据没有预计算结果时读取 CSV 生成一次并保存
+    """
+    analysis_type = request.args.get('type', 'frame_by_frame')
+
+    conn = get_db()
+    cursor = conn.cursor()
+    try:
+        cached = load_analysis_payload(cursor, video_id, analysis_type)
+        if cached is None:
+            try:
+                payload = build_analysis_payload(cursor, video_id, analysis_type)
+            except AnalysisPayloadError as e:
+                return jsonify({'error': str(e)}), e.status
+            cached = store_analysis_payload(cursor, video_id, analysis_type, payload)
+            try:
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"[警告] 保存分析响应缓存失败: {e}")
+        cache_control = _video_cache_control(cursor, video_id)
+    finally:
+        conn.close()
+
+    gzipped, created = cached
+    return http_cache.json_response(gzipped=gzipped, cache_control=cache_control, last_modified=created)
 
 
 @app.route('/keyframe_csv/<video_id>')
@@ -1737,9 +1975,20 @@ def get_keyframe_csv(video_id):
     view_mapping = {"side": "侧面", "front": "正面", "侧面": "侧面", "正面": "正面"}
     view_cn = view_mapping.get(view, None)
 
-    # 如果未指定 view，尝试从 videos 表中查
     conn = get_db()
     cursor = conn.cursor()
+
+    # 已有预计算的关键帧响应时直接复用其宽格式数据
+    cached = load_analysis_payload(cursor, video_id, 'keyframe')
+    if cached is not None:
+        cache_control = _video_cache_control(cursor, video_id)
+        conn.close()
+        wide_data = json.loads(gzip.decompress(cached[0]))['data']
+        events = [r.get('abs_frame') for r in sorted(wide_data, key=lambda x: x.get('event_index', 0))]
+        return http_cache.json_response({'video_id': video_id, 'data': wide_data, 'events': events},
+                                        cache_control=cache_control, last_modified=cached[1])
+
+    # 如果未指定 view，尝试从 videos 表中查
     if not view_cn:
         cursor.execute('SELECT view_angle FROM videos WHERE video_id = ?', (video_id,))
         row = cursor.fetchone()
@@ -1808,7 +2057,8 @@ def get_keyframe_csv(video_id):
     # 生成 events 列表（abs_frame 列）
     events = [r.get('abs_frame') for r in sorted(wide_data, key=lambda x: x.get('event_index', 0))]
     conn.close()
-    return jsonify({'video_id': video_id, 'data': wide_data, 'events': events})
+    # 全局 CSV 随每次分析覆盖，只做重新验证
+    return http_cache.json_response({'video_id': video_id, 'data': wide_data, 'events': events})
 
 
 @app.route('/metrics')
@@ -1831,7 +2081,88 @@ def get_metrics():
     conn.close()
     
     print(f"[调试] 获取指标标准: 视角={view_angle_cn}, 类型={analysis_type}, 数量={len(metrics)}")
-    return jsonify(metrics)
+    # 标准范围在服务启动时载入，内容不变时靠 ETag 返回 304
+    return http_cache.json_response(metrics)
+
+
+def _lookup_metric_ids(cursor, args):
+    """
+    ?metric=指标名&view_angle=side|front → {metric_id: 视角}
+    先查字典表得到 metric_id，再用 metric_id 直接走 frame_metric_values 的索引
+    """
+    view_mapping = {"side": "侧面", "front": "正面", "侧面": "侧面", "正面": "正面"}
+    view_angle = args.get('view_angle')
+    if view_angle:
+        cursor.execute('SELECT metric_id, view_angle FROM metric_dictionary WHERE view_angle = ? AND metric_name = ?',
+                       (view_mapping.get(view_angle, view_angle), args.get('metric')))
+    else:
+        cursor.execute('SELECT metric_id, view_angle FROM metric_dictionary WHERE metric_name = ?', (args.get('metric'),))
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+@app.route('/metric_series/<video_id>')
+def get_metric_series(video_id):
+    """单个视频某指标的逐帧时间序列（frame_metric_values 主键范围扫描）"""
+    if not request.args.get('metric'):
+        return jsonify({'error': '缺少 metric 参数'}), 400
+
+    conn = get_db()
+    cursor = conn.cursor()
+    metric_ids = _lookup_metric_ids(cursor, request.args)
+    series = []
+    for metric_id in metric_ids:
+        cursor.execute('''
+            SELECT frame_index, value, grade, deviation FROM frame_metric_values
+            WHERE video_id = ? AND metric_id = ?
+            ORDER BY frame_index
+        ''', (video_id, metric_id))
+        series = [dict(row) for row in cursor.fetchall()]
+        if series:
+            break
+    conn.close()
+    return jsonify({'video_id': video_id, 'metric': request.args.get('metric'), 'series': series})
+
+
+@app.route('/metric_stats')
+def get_metric_stats():
+    """
+    某指标的跨视频统计：每个视频的帧数、轻微 / 异常帧数与数值范围
+    带 grade 参数（0 标准 / 1 轻微 / 2 异常）时只统计该等级的帧
+    """
+    if not request.args.get('metric'):
+        return jsonify({'error': '缺少 metric 参数'}), 400
+    grade = request.args.get('grade', type=int)
+
+    conn = get_db()
+    cursor = conn.cursor()
+    metric_ids = _lookup_metric_ids(cursor, request.args)
+    videos = []
+    for metric_id, view_angle in metric_ids.items():
+        where, params = 'metric_id = ?', [metric_id]
+        if grade is not None:
+            where += ' AND grade = ?'
+            params.append(grade)
+        cursor.execute(f'''
+            SELECT video_id,
+                   COUNT(*) AS frames,
+                   SUM(grade = 1) AS slight_frames,
+                   SUM(grade = 2) AS abnormal_frames,
+                   AVG(value) AS mean_value, MIN(value) AS min_value, MAX(value) AS max_value,
+                   AVG(deviation) AS mean_deviation
+            FROM frame_metric_values
+            WHERE {where}
+            GROUP BY video_id
+        ''', params)
+        videos.extend({**dict(row), 'view_angle': view_angle} for row in cursor.fetchall())
+    conn.close()
+    videos.sort(key=lambda v: (-(v['abnormal_frames'] or 0), v['video_id']))
+    return jsonify({'metric': request.args.get('metric'), 'grade': grade, 'videos': videos})
+
+
+@app.route('/db_stats')
+def db_stats():
+    """数据库连接池统计：连接复用次数、锁等待次数与时长"""
+    return jsonify(db_pool.get_pool(app.config['DATABASE']).info())
 
 
 @app.route('/video_file/<video_id>/<video_type>')
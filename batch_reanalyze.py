@@ -0,0 +1,264 @@
+"""
+批量重分析
+修改 analyze/侧面标准范围.csv 或关键帧 normal_ranges_*.csv 后，用已保存的关键点对库中所有视频
+重新执行 逐帧分析 + 关键帧分析 两个阶段，并把结果重新写入数据库。
+不解码视频、不运行 SwingNet / MediaPipe：关键点来自各视频的关键点输出目录（keypoints.npy），
+目录缺失时从 keypoints_data 表恢复；关键帧帧号来自 analysis_results.keyframes_json。
+
+用法:
+    python batch_reanalyze.py                     # 所有已完成的视频
+    python batch_reanalyze.py --video_id a b c    # 指定视频
+    python batch_reanalyze.py --view 侧面 --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import config
+import db_pool
+import keypoint_store
+
+VIEW_CN = {"side": "侧面", "front": "正面", "侧面": "侧面", "正面": "正面"}
+VIEW_EN = {"侧面": "side", "正面": "front"}
+
+
+def _add_sys_path(p):
+    p_str = str(Path(p).resolve())
+    if p_str not in sys.path:
+        sys.path.insert(0, p_str)
+
+
+def _connect():
+    return db_pool.connect(config.APP_CONFIG['DATABASE'])
+
+
+def _parse_events(keyframes_json):
+    """keyframes_json -> (events, num_events)；多挥杆结果（嵌套列表）或无法解析时返回 (None, None)。"""
+    if not keyframes_json:
+        return None, None
+    try:
+        data = json.loads(keyframes_json)
+    except (TypeError, ValueError):
+        return None, None
+    if isinstance(data, dict):
+        events, num_events = data.get("events"), data.get("num_events")
+    else:
+        events, num_events = data, None
+    if not events or not all(isinstance(e, (int, float)) for e in events):
+        return None, None
+    return [int(e) for e in events], int(num_events or len(events))
+
+
+def _restore_keypoints(conn, video_id, kp_dir):
+    """关键点目录缺失时由 keypoints_data 表恢复为 keypoints.npy，返回路径（表中也没有时返回 None）。"""
+    rows = conn.execute(
+        "SELECT frame_index, landmarks_json FROM keypoints_data WHERE video_id = ? ORDER BY frame_index",
+        (video_id,),
+    ).fetchall()
+    if not rows:
+        return None
+    kps = keypoint_store.keypoints_from_rows(
+        video_id,
+        [r["frame_index"] for r in rows],
+        [json.loads(r["landmarks_json"] or "[]") or [""] * keypoint_store.NUM_LANDMARKS for r in rows],
+    )
+    path = keypoint_store.save_keypoints(kp_dir, video_id, kps.frame_index, kps.points)
+    print(f"[批量重分析] {video_id}: 已从 keypoints_data 恢复关键点 {len(kps)} 帧")
+    return path
+
+
+def collect_jobs(conn, video_ids=None, view=None):
+    """从数据库收集待重分析的视频（已完成、有关键帧记录、关键点可用）。"""
+    sql = "SELECT video_id, view_angle FROM videos WHERE status = 'completed'"
+    params = []
+    if video_ids:
+        sql += f" AND video_id IN ({','.join('?' * len(video_ids))})"
+        params.extend(video_ids)
+    rows = conn.execute(sql + " ORDER BY upload_time", params).fetchall()
+
+    jobs = []
+    for row in rows:
+        video_id = row["video_id"]
+        view_cn = VIEW_CN.get(row["view_angle"], row["view_angle"])
+        if view and view_cn != VIEW_CN.get(view, view):
+            continue
+
+        kf_row = conn.execute(
+            "SELECT keyframes_json FROM analysis_results WHERE video_id = ? AND keyframes_json IS NOT NULL "
+            "ORDER BY id DESC LIMIT 1",
+            (video_id,),
+        ).fetchone()
+        events, num_events = _parse_events(kf_row["keyframes_json"] if kf_row else None)
+        if events is None:
+            print(f"[批量重分析] {video_id}: 缺少关键帧记录（或为多挥杆结果），跳过")
+            continue
+
+        kp_dir = os.path.join(config.KEYPOINT_CONFIG['OUTPUT_DIR'], video_id)
+        kp_path = keypoint_store.find_keypoints(kp_dir) or _restore_keypoints(conn, video_id, kp_dir)
+        if kp_path is None:
+            print(f"[批量重分析] {video_id}: 找不到关键点数据，跳过")
+            continue
+
+        jobs.append({
+            "video_id": video_id,
+            "view": VIEW_EN[view_cn],
+            "view_cn": view_cn,
+            "keypoints": kp_path,
+            "kp_dir": kp_dir,
+            "events": events,
+            "num_events": num_events,
+            "analysis_out_dir": os.path.join(config.ANALYSIS_CONFIG['OUTPUT_DIR'], video_id),
+            "kf_analysis_out_dir": os.path.join(config.KEYFRAME_ANALYSIS_CONFIG['OUTPUT_DIR'], video_id),
+        })
+    return jobs
+
+
+def _reanalyze_one(job):
+    """子进程内执行：逐帧分析 + 关键帧分析（只读关键点，只写该视频自己的输出目录）。"""
+    root = Path(__file__).resolve().parent
+    _add_sys_path(root / "analyze")
+    _add_sys_path(root / "Keyframe_analysis")
+
+    import numpy as np
+    import run_single_analysis as analysis
+    import run_keyframe_analysis as kfa
+
+    view = job["view"]
+    std_csv = config.ANALYSIS_CONFIG['STD_SIDE_PATH'] if view == "side" else config.ANALYSIS_CONFIG['STD_FRONT_PATH']
+    kf_std_csv = (config.KEYFRAME_ANALYSIS_CONFIG['STD_SIDE_PATH'] if view == "side"
+                  else config.KEYFRAME_ANALYSIS_CONFIG['STD_FRONT_PATH'])
+
+    t0 = time.time()
+    try:
+        os.makedirs(job["analysis_out_dir"], exist_ok=True)
+        os.makedirs(job["kf_analysis_out_dir"], exist_ok=True)
+        analysis.run_analysis(view=view, input_csv=job["keypoints"], std_csv=std_csv, out_dir=job["analysis_out_dir"])
+        kfa.run_keyframe_analysis(
+            view=view,
+            input_csv=job["keypoints"],
+            out_dir=job["kf_analysis_out_dir"],
+            events=np.asarray(job["events"]),
+            num_events=job["num_events"],
+            std_csv=kf_std_csv,
+        )
+    except Exception as e:
+        return {"video_id": job["video_id"], "ok": False, "error": f"{type(e).__name__}: {e}", "seconds": time.time() - t0}
+    return {"video_id": job["video_id"], "ok": True, "error": None, "seconds": time.time() - t0}
+
+
+def store_results(conn, job, ingest):
+    """
+    把一个视频的新结果写回数据库（单个事务：全部成功才提交，否则回滚保留旧结果）
+    ingest: app.ingest_analysis_data（commit=False 时任一表导入失败都会抛出异常）
+    """
+    import pandas as pd
+
+    video_id, view_cn = job["video_id"], job["view_cn"]
+    frame_csv = os.path.join(job["analysis_out_dir"], f"{view_cn}_逐帧审判结果.csv")
+    summary_csv = os.path.join(job["analysis_out_dir"], f"{view_cn}_视频级审判汇总.csv")
+    keyframe_csv = os.path.join(job["kf_analysis_out_dir"], f"{view_cn}_关键帧分析_逐帧详情.csv")
+
+    video_summary_json = None
+    if os.path.exists(summary_csv):
+        df = pd.read_csv(summary_csv, encoding="utf-8-sig")
+        video_row = df[df["视频ID"].astype(str) == video_id] if "视频ID" in df.columns else df
+        if not video_row.empty:
+            video_summary_json = video_row.iloc[0].to_json(force_ascii=False)
+
+    try:
+        ingest(conn, video_id, view_cn, job["kp_dir"], job["analysis_out_dir"], job["kf_analysis_out_dir"],
+               include_keypoints=False, commit=False, strict=True)
+        conn.execute(
+            "UPDATE analysis_results SET csv_path = ?, video_summary_json = ? "
+            "WHERE video_id = ? AND analysis_type = 'frame_by_frame'",
+            (frame_csv if os.path.exists(frame_csv) else None, video_summary_json, video_id),
+        )
+        if os.path.exists(keyframe_csv):
+            conn.execute(
+                "UPDATE analysis_results SET csv_path = ? WHERE video_id = ? AND analysis_type = 'keyframe'",
+                (keyframe_csv, video_id),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def run_batch(video_ids=None, view=None, workers=None):
+    """批量重分析入口，返回 {"total", "ok", "failed", "seconds", "videos_per_sec"}。"""
+    # app 模块只在主进程导入（Flask / cv2 较重，子进程不需要）
+    from app import ingest_analysis_data
+
+    workers = int(workers or config.REANALYZE_CONFIG['WORKERS'] or os.cpu_count() or 1)
+    conn = _connect()
+    try:
+        jobs = collect_jobs(conn, video_ids=video_ids, view=view)
+        print(f"[批量重分析] 待处理视频 {len(jobs)} 个，{workers} 个进程")
+        if not jobs:
+            return {"total": 0, "ok": 0, "failed": 0, "seconds": 0.0, "videos_per_sec": 0.0}
+
+        by_id = {job["video_id"]: job for job in jobs}
+        ok, failed = 0, []
+        t0 = time.time()
+        # spawn：与常驻分析进程池一致，避免 fork 带入父进程的线程状态
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as ex:
+            futures = [ex.submit(_reanalyze_one, job) for job in jobs]
+            # 子进程并行计算，主进程按完成顺序逐个入库（SQLite 只有一个写入方）
+            for done, fut in enumerate(as_completed(futures), 1):
+                res = fut.result()
+                video_id = res["video_id"]
+                if res["ok"]:
+                    try:
+                        store_results(conn, by_id[video_id], ingest_analysis_data)
+                        ok += 1
+                    except Exception as e:
+                        res = {**res, "ok": False, "error": f"入库失败: {e}"}
+                if not res["ok"]:
+                    failed.append(video_id)
+                    print(f"[批量重分析] {video_id} 失败: {res['error']}")
+
+                elapsed = time.time() - t0
+                print(f"[批量重分析] {done}/{len(jobs)} {video_id} ({res['seconds']:.2f}s)，"
+                      f"吞吐 {done / max(elapsed, 1e-9):.2f} 视频/秒")
+    finally:
+        conn.close()
+
+    seconds = time.time() - t0
+    stats = {
+        "total": len(jobs),
+        "ok": ok,
+        "failed": len(failed),
+        "seconds": seconds,
+        "videos_per_sec": len(jobs) / max(seconds, 1e-9),
+    }
+    print(f"[批量重分析] 完成: 成功 {ok}，失败 {len(failed)}，耗时 {seconds:.1f}s，"
+          f"吞吐 {stats['videos_per_sec']:.2f} 视频/秒")
+    if failed:
+        print(f"[批量重分析] 失败视频: {', '.join(failed)}")
+    return stats
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="用已保存的关键点批量重跑逐帧分析与关键帧分析，并更新数据库")
+    parser.add_argument("--video_id", nargs="*", default=None, help="只处理这些视频（默认所有已完成的视频）")
+    parser.add_argument("--view", type=str, default=None, choices=["side", "front", "侧面", "正面"], help="只处理某个视角")
+    parser.add_argument("--workers", type=int, default=config.REANALYZE_CONFIG['WORKERS'], help="并行进程数（0 为全部 CPU 核）")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    stats = run_batch(video_ids=args.video_id, view=args.view, workers=args.workers)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
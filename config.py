@@ -18,6 +18,61 @@ APP_CONFIG = {
     'MAX_VIDEOS_RETAINED': 9  # 仅保留最新10条数据
 }
 
+# ================== 数据库连接池配置 (db_pool.py) ==================
+DB_CONFIG = {
+    'JOURNAL_MODE': 'WAL',      # WAL 下读写互不阻塞（页面轮询与后台入库可同时进行）
+    'SYNCHRONOUS': 'NORMAL',    # WAL 模式下安全且比 FULL 少一半 fsync
+    'MMAP_SIZE': 256 * 1024 * 1024,  # 内存映射读取的上限（字节）
+    'CACHE_SIZE_KB': 64 * 1024,      # 每条连接的页缓存大小（KiB）
+    'BUSY_TIMEOUT': 30,         # 遇到锁冲突时最多等待的秒数
+    'STATEMENT_CACHE': 256,     # 每条连接缓存的预编译语句数
+    'MAX_IDLE': 8,              # 连接池保留的空闲连接数上限
+    # 逐帧指标同时写入规范化表 frame_metric_values（每帧每指标一行），跨视频统计 / 单指标时间序列直接用 SQL 查询
+    'FRAME_METRIC_TABLE': True,
+}
+
+# ================== HTTP 缓存与压缩配置 (http_cache.py) ==================
+HTTP_CACHE_CONFIG = {
+    # 已完成分析的结果允许浏览器 / 反向代理不经验证直接使用的秒数。0 表示每次都用 ETag / Last-Modified 重新验证（未变化时 304）；
+    # 结果会被批量重分析、重新上传或删除改写，设为正数时这段时间内可能返回旧结果
+    'COMPLETED_MAX_AGE': 0,
+    'MIN_COMPRESS_BYTES': 1024,  # 小于该大小的响应不压缩
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,         # 安装 brotli 时使用；11 压缩率最高但对大响应过慢
+}
+
+# ================== 分析工作进程配置 ==================
+WORKER_CONFIG = {
+    'NUM_WORKERS': 1,  # 常驻分析进程数量（每个进程各自加载一份模型）
+    'WARMUP': True,    # 进程启动时预先加载 SwingNet 与 MediaPipe Pose
+}
+
+# ================== 分析流水线配置 ==================
+PIPELINE_CONFIG = {
+    'SHARED_DECODE': True,  # 视频只解码一次，同时分发给转码、SwingNet 预处理与 MediaPipe
+    # 阶段并行（stage_graph.py）：互不依赖的阶段同时执行，端到端耗时约等于最长依赖链
+    'STAGE_WORKERS': 3,     # 并行执行阶段的线程数（1 表示按顺序执行）
+    'FRAME_QUEUE': 16,      # 共用解码时每个阶段线程最多积压的帧数
+    'TORCH_THREADS': 0,     # 并行时 torch 推理线程数上限，0 表示 CPU 核数的一半
+    'CV_THREADS': 0,        # OpenCV 线程数（0 表示不开内部线程池，与关键点检测模块的设置一致）
+    # 多挥杆模式（练习场长视频，一个文件包含多次挥杆）
+    'MULTI_SWING': False,          # 默认按单次挥杆处理
+    'MAX_SWINGS': 30,              # 单个视频最多切分的挥杆数
+    'SWING_MIN_GAP': 30,           # 相邻两次挥杆之间至少间隔的帧数
+    'SWING_MAX_FRAMES': 300,       # 单次挥杆 Address 到 Finish 最多跨越的帧数（30fps 约 10 秒），防止把相邻挥杆拼成一次
+    'SWING_MIN_CONFIDENCE': 0.2,   # 事件平均置信度（几何平均）低于该值时不再认定为挥杆
+    'SWING_PAD': 15,               # 每段挥杆在 Address 前 / Finish 后额外保留的帧数
+    'SWING_WORKERS': 2,            # 并行处理挥杆片段的进程数（1 表示在当前进程内依次处理）
+}
+
+# ================== 分析任务队列配置 ==================
+JOB_QUEUE_CONFIG = {
+    'MAX_CONCURRENT_JOBS': 1,    # 同时执行的分析任务数（建议不超过 WORKER_CONFIG['NUM_WORKERS']）
+    'MAX_QUEUE_DEPTH': 5,        # 排队+运行中任务上限，超过则上传返回 503
+    'SCHEDULING': 'fifo',        # 调度策略: 'fifo' 或 'priority'（priority 越大越先执行）
+    'DEFAULT_JOB_SECONDS': 180,  # 无历史记录时估算的单任务耗时（秒）
+}
+
 # ================== 关键帧提取配置 (Extract_key_frames) ==================
 KEYFRAME_CONFIG = {
     # 模型权重路径 - 请根据实际情况修改
@@ -33,7 +88,19 @@ KEYFRAME_CONFIG = {
 KEYPOINT_CONFIG = {
     'OUTPUT_DIR': str(ROOT_DIR / 'Keypoint_detection/output_single'),
     'SCALE_FACTOR': 1.0, # 图像缩放比例
+    # 以下两项会改变送入 MediaPipe 的图像，尚未在真实视频上确认判定结果不变，默认关闭
+    'ROI_CROP': False,   # 用上一帧关键点裁出人体区域（外扩留边）再推理，丢失人体时退回整帧
+    'MAX_INPUT_SIDE': 0, # 送入 MediaPipe 的图像长边上限（裁剪后超过则缩小，如 960），0 表示不限制
     'MODEL_COMPLEXITY': 1, # MediaPipe模型复杂度: 0, 1, 2
+    'EXPORT_CSV': False, # 是否额外导出旧版 单视频_缺陷分析数据.csv（关键点默认保存为 keypoints.npy）
+    # 分段并行检测：视频切成若干段分给多个进程，各自运行一个 Pose 实例（CPU 服务器上可设为核数，建议不超过 8）
+    'SHARD_WORKERS': 1,  # 1 表示单进程逐帧跟踪
+    'SHARD_OVERLAP': 15, # 每段开头多跑的预热帧数，让跟踪重新锁定人体（预热结果丢弃）
+    # 自适应采样：关键帧事件附近逐帧检测，其余帧稀疏检测，跳过的帧线性插值并标记（keypoints_interpolated.npy）
+    'SAMPLING': 'dense',       # 'dense' 逐帧检测 / 'adaptive' 自适应采样
+    'DENSE_WINDOW': 10,        # 每个关键帧事件前后逐帧检测的帧数
+    'SPARSE_STRIDE': 4,        # 其余帧每隔多少帧检测一次
+    'MOTION_THRESHOLD': 0.01,  # 按前两次检测匀速外推，关键点偏差超过该值（归一化坐标）时回补中间跳过的帧
 }
 
 # ================== 运动分析配置 (analyze) ==================
@@ -51,6 +118,19 @@ KEYFRAME_ANALYSIS_CONFIG = {
     'STD_FRONT_PATH': str(ROOT_DIR / 'Keyframe_analysis/正面normal_ranges_face_on_60_20_20.csv'),
 }
 
+# ================== 分阶段结果缓存配置 (result_cache.py) ==================
+CACHE_CONFIG = {
+    'ENABLED': True,
+    'DIR': str(ROOT_DIR / 'cache'),       # 缓存目录（按 视频内容哈希 + 阶段参数 寻址）
+    'MAX_BYTES': 5 * 1024 * 1024 * 1024,  # 缓存总大小上限，超过后按最近最少使用淘汰
+    'VERSION': 1,  # 分析算法变更导致旧结果失效时加 1
+}
+
+# ================== 批量重分析配置 (batch_reanalyze.py) ==================
+REANALYZE_CONFIG = {
+    'WORKERS': 0,  # 并行进程数，0 表示使用全部 CPU 核
+}
+
 # ================== 可视化配置 (visualization) ==================
 VISUALIZATION_CONFIG = {
     'OUTPUT_DIR': str(ROOT_DIR / 'visualization/output'),
@@ -0,0 +1,230 @@
+"""
+SQLite 连接池
+get_db() / 任务队列不再每次 sqlite3.connect，而是从池中取出一条已打开的连接，用完 close() 归还：
+    - 取出期间连接由当前线程独占（同一线程嵌套获取会拿到另一条连接），归还时回滚未提交的事务
+    - 连接跨请求复用，连接级的预编译语句缓存（cached_statements）随之复用，PRAGMA 只在建连时执行一次
+    - journal_mode=WAL：读写互不阻塞，/videos 轮询与后台入库不再互相等待
+    - synchronous=NORMAL：WAL 下只在检查点 fsync，掉电最多丢失最近的提交，不会损坏数据库
+    - mmap_size / cache_size：读取走内存映射与更大的页缓存
+锁等待不交给 SQLite 内置的 busy_timeout，而是 execute / executemany / commit 遇到 "database is locked"
+时在 Python 中退避重试（最长 BUSY_TIMEOUT 秒），从而精确统计锁等待次数与时长（ConnectionPool.info()，/db_stats 接口）。
+"""
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import config
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+# WAL 下读事务升级为写事务时快照已过期，重试也不会成功
+SQLITE_BUSY_SNAPSHOT = 517
+
+
+def _is_busy(error):
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED) and code != SQLITE_BUSY_SNAPSHOT
+    return "locked" in str(error) or "busy" in str(error)
+
+
+class PooledCursor(sqlite3.Cursor):
+    """execute / executemany 遇到锁冲突时退避重试。"""
+
+    def execute(self, sql, parameters=()):
+        return self.connection._retry(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # 重试时要重新遍历参数，生成器先展开
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)
+        return self.connection._retry(super().executemany, sql, seq_of_parameters)
+
+
+class PooledConnection(sqlite3.Connection):
+    """池中的连接：cursor() 默认返回 PooledCursor，close() 归还连接池。"""
+
+    _pool = None
+
+    def cursor(self, factory=PooledCursor):
+        return super().cursor(factory)
+
+    # C 实现的 Connection.execute 不经过上面的 cursor()，需要显式转发
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        return self._retry(super().commit)
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        else:
+            self._pool.release(self)
+
+    def _retry(self, fn, *args):
+        pool = self._pool
+        timeout = pool.busy_timeout if pool is not None else 0
+        started = None
+        delay = 0.001
+        while True:
+            try:
+                result = fn(*args)
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                now = time.perf_counter()
+                if started is None:
+                    started = now
+                if now - started >= timeout:
+                    if pool is not None:
+                        pool.stats.record_wait(now - started, timed_out=True)
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+                continue
+            if started is not None and pool is not None:
+                pool.stats.record_wait(time.perf_counter() - started)
+            return result
+
+
+class PoolStats:
+    """连接池计数（线程安全）。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = 0           # 新建的连接数
+        self.checkouts = 0        # 取出次数
+        self.reused = 0           # 其中直接复用空闲连接的次数
+        self.discarded = 0        # 空闲已满或连接损坏而真正关闭的次数
+        self.lock_waits = 0       # 遇到锁冲突后重试成功的次数
+        self.lock_timeouts = 0    # 等待超过 BUSY_TIMEOUT 仍失败的次数
+        self.lock_wait_seconds = 0.0
+        self.max_lock_wait_seconds = 0.0
+
+    def add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.lock_timeouts += 1
+            else:
+                self.lock_waits += 1
+            self.lock_wait_seconds += seconds
+            self.max_lock_wait_seconds = max(self.max_lock_wait_seconds, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            data = {k: v for k, v in vars(self).items() if not k.startswith("_")}
+        data["lock_wait_seconds"] = round(data["lock_wait_seconds"], 4)
+        data["max_lock_wait_seconds"] = round(data["max_lock_wait_seconds"], 4)
+        return data
+
+
+class ConnectionPool:
+    def __init__(self, db_path, max_idle=None, busy_timeout=None):
+        cfg = config.DB_CONFIG
+        self.db_path = str(db_path)
+        self.max_idle = int(cfg['MAX_IDLE'] if max_idle is None else max_idle)
+        self.busy_timeout = float(cfg['BUSY_TIMEOUT'] if busy_timeout is None else busy_timeout)
+        self.stats = PoolStats()
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._journal_mode = None
+
+    def _open(self):
+        cfg = config.DB_CONFIG
+        # timeout=0：锁等待由 PooledConnection._retry 负责（可统计）；连接会在线程之间流转
+        conn = sqlite3.connect(self.db_path, timeout=0, factory=PooledConnection, check_same_thread=False,
+                               cached_statements=int(cfg['STATEMENT_CACHE']))
+        conn.row_factory = sqlite3.Row
+        conn._pool = self
+        # 切换 WAL 需要短暂的独占锁，与其他连接冲突时同样会重试
+        mode = conn.execute(f"PRAGMA journal_mode={cfg['JOURNAL_MODE']}").fetchone()[0]
+        conn.execute(f"PRAGMA synchronous={cfg['SYNCHRONOUS']}")
+        conn.execute(f"PRAGMA mmap_size={int(cfg['MMAP_SIZE'])}")
+        # 负数表示以 KiB 为单位
+        conn.execute(f"PRAGMA cache_size={-int(cfg['CACHE_SIZE_KB'])}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if self._journal_mode is None:
+            self._journal_mode = mode
+            if str(mode).lower() != str(cfg['JOURNAL_MODE']).lower():
+                print(f"[数据库] 无法切换为 {cfg['JOURNAL_MODE']} 模式，当前: {mode}")
+        self.stats.add(opened=1)
+        return conn
+
+    def connect(self):
+        """取出一条连接（没有空闲连接时新建），用完调用 close() 归还。"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._open()
+            self.stats.add(checkouts=1)
+        else:
+            self.stats.add(checkouts=1, reused=1)
+        return conn
+
+    def release(self, conn):
+        """归还连接：回滚未提交的事务，空闲连接已满或连接异常时直接关闭。"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        self.stats.add(discarded=1)
+        try:
+            sqlite3.Connection.close(conn)
+        except sqlite3.Error:
+            pass
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn in idle:
+            sqlite3.Connection.close(conn)
+
+    def info(self):
+        """/db_stats 使用：连接池计数 + 数据库配置。"""
+        with self._lock:
+            idle = len(self._idle)
+        return {
+            "database": self.db_path,
+            "journal_mode": self._journal_mode,
+            "idle_connections": idle,
+            **self.stats.snapshot(),
+        }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """按数据库路径获取全局连接池（首次调用时创建）。"""
+    key = str(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key)
+        return pool
+
+
+def connect(db_path):
+    """从 db_path 对应的连接池取出一条连接。"""
+    return get_pool(db_path).connect()
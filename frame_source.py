@@ -0,0 +1,196 @@
+"""
+单次解码的视频帧源
+同一个视频只用 cv2.VideoCapture 解码一遍，把每一帧依次分发给所有订阅的阶段（转码、SwingNet 预处理、MediaPipe 等），
+避免每个阶段各自重新打开、重新解码整段视频。
+
+订阅者约定实现以下方法（均可省略）：
+    on_start(meta)          解码开始前调用，meta 为视频信息字典
+    on_frame(idx, frame)    每解码一帧调用一次，frame 为 BGR uint8 数组，订阅者不得原地修改
+    on_end()                解码结束后调用
+
+run(threaded=True) 时每个订阅者在各自线程中处理帧（有界队列，解码线程只负责读帧），
+SwingNet 推理与 MediaPipe 检测同时进行，而不是每一帧依次执行。
+"""
+import os
+import queue
+import threading
+
+import cv2
+
+
+class _ConsumerThread(threading.Thread):
+    """在独立线程中依次把队列里的帧交给一个订阅者，队列收到 None 后调用 on_end。"""
+
+    def __init__(self, consumer, queue_size):
+        super().__init__(name=f"frame-{type(consumer).__name__}", daemon=True)
+        self.consumer = consumer
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.error = None
+
+    def run(self):
+        ended = False
+        try:
+            while True:
+                item = self.queue.get()
+                if item is None:
+                    ended = True
+                    break
+                if hasattr(self.consumer, "on_frame"):
+                    self.consumer.on_frame(*item)
+            if hasattr(self.consumer, "on_end"):
+                self.consumer.on_end()
+        except BaseException as e:
+            self.error = e
+            # 继续取空队列，避免解码线程阻塞在 put 上
+            while not ended and self.queue.get() is not None:
+                pass
+
+
+class FrameSource:
+    def __init__(self, video_path, start_frame=0, end_frame=None):
+        """
+        video_path: 视频路径
+        start_frame / end_frame: 解码区间 [start_frame, end_frame)，end_frame 为 None 表示读到结尾
+        """
+        self.video_path = str(video_path)
+        self.start_frame = int(start_frame or 0)
+        self.end_frame = None if end_frame is None else int(end_frame)
+        self.consumers = []
+        self.meta = None
+
+    def subscribe(self, consumer):
+        """注册一个订阅者，返回该订阅者本身，便于链式使用。"""
+        self.consumers.append(consumer)
+        return consumer
+
+    def _open(self):
+        if not os.path.exists(self.video_path):
+            raise FileNotFoundError(f"Cannot open video: {self.video_path}")
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            raise FileNotFoundError(f"Cannot open video: {self.video_path}")
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.meta = {
+            "video_path": self.video_path,
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": fps,
+            "frame_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+            "start_frame": self.start_frame,
+            "end_frame": self.end_frame,
+        }
+        if self.start_frame > 0:
+            cap = self._seek(cap)
+        return cap
+
+    def _seek(self, cap):
+        """
+        定位到 start_frame，保证第一帧的序号就是 start_frame
+        部分编码 / 后端的 seek 会落在附近的关键帧上，读回实际位置，不一致时逐帧跳过（grab 不做颜色转换）
+        """
+        ok = cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        pos = int(round(cap.get(cv2.CAP_PROP_POS_FRAMES))) if ok else -1
+        if pos == self.start_frame:
+            return cap
+        print(f"[帧源] seek 到第 {self.start_frame} 帧落在第 {pos} 帧，改为逐帧跳过")
+        if pos < 0 or pos > self.start_frame:
+            cap.release()
+            cap = cv2.VideoCapture(self.video_path)
+            pos = 0
+        for _ in range(self.start_frame - pos):
+            if not cap.grab():
+                break
+        return cap
+
+    def frames(self):
+        """
+        流式生成 (帧序号, BGR帧)，不经过订阅者
+        帧序号为原视频中的绝对序号
+        """
+        cap = self._open()
+        idx = self.start_frame
+        try:
+            while self.end_frame is None or idx < self.end_frame:
+                ret, frame = cap.read()
+                if not ret or frame is None:
+                    break
+                yield idx, frame
+                idx += 1
+        finally:
+            cap.release()
+
+    def run(self, threaded=False, queue_size=16):
+        """
+        解码一遍视频并分发给所有订阅者
+        threaded: 每个订阅者在独立线程中处理帧（只有一个订阅者时不起线程）
+        queue_size: 线程模式下每个订阅者最多积压的帧数
+        返回: meta 字典（附带实际解码帧数 frames_decoded）
+        """
+        gen = self.frames()
+        # 先取首帧以触发打开视频，保证 on_start 拿到 meta
+        first = next(gen, None)
+        meta = dict(self.meta or {})
+
+        for c in self.consumers:
+            if hasattr(c, "on_start"):
+                c.on_start(meta)
+
+        if threaded and len(self.consumers) > 1:
+            return self._run_threaded(gen, first, meta, queue_size)
+
+        decoded = 0
+        try:
+            item = first
+            while item is not None:
+                idx, frame = item
+                for c in self.consumers:
+                    if hasattr(c, "on_frame"):
+                        c.on_frame(idx, frame)
+                decoded += 1
+                if decoded % 100 == 0:
+                    print(f"[帧源] 已解码 {decoded} 帧...")
+                item = next(gen, None)
+        finally:
+            gen.close()
+
+        meta["frames_decoded"] = decoded
+        self.meta = meta
+        for c in self.consumers:
+            if hasattr(c, "on_end"):
+                c.on_end()
+        print(f"[帧源] 解码完成，共 {decoded} 帧，分发给 {len(self.consumers)} 个阶段")
+        return meta
+
+    def _run_threaded(self, gen, first, meta, queue_size):
+        workers = [_ConsumerThread(c, queue_size) for c in self.consumers]
+        for w in workers:
+            w.start()
+
+        decoded = 0
+        try:
+            item = first
+            while item is not None:
+                if any(w.error is not None for w in workers):
+                    break
+                for w in workers:
+                    w.queue.put(item)
+                decoded += 1
+                if decoded % 100 == 0:
+                    print(f"[帧源] 已解码 {decoded} 帧...")
+                item = next(gen, None)
+        finally:
+            gen.close()
+            for w in workers:
+                w.queue.put(None)
+            for w in workers:
+                w.join()
+
+        for w in workers:
+            if w.error is not None:
+                raise w.error
+
+        meta["frames_decoded"] = decoded
+        self.meta = meta
+        print(f"[帧源] 解码完成，共 {decoded} 帧，由 {len(workers)} 个阶段线程并行处理")
+        return meta
@@ -0,0 +1,85 @@
+"""
+JSON 接口的 HTTP 缓存与压缩
+    ETag          响应体内容哈希（弱 ETag，压缩与否视为同一内容），请求带 If-None-Match 且一致时返回 304
+    Last-Modified 调用方提供时设置，浏览器只带 If-Modified-Since 时据此返回 304
+    Cache-Control 由调用方决定：默认 no-cache（可缓存，但每次用 ETag / Last-Modified 重新验证），
+                  已完成的分析结果可通过 COMPLETED_MAX_AGE 配置较短的免验证时间
+    压缩          按 Accept-Encoding 选择：安装了 brotli 时优先 br，否则 gzip；响应体太小时不压缩
+                  /analysis 的响应体入库时已 gzip 压缩，客户端接受 gzip 时原样发送，不再逐请求压缩
+"""
+import gzip
+import hashlib
+from datetime import timezone
+
+from flask import current_app, request
+
+import config
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只用 gzip
+    brotli = None
+
+
+def completed_cache_control():
+    """已完成分析的视频使用的 Cache-Control（批量重分析等仍会改写结果，默认同样每次重新验证）。"""
+    max_age = int(config.HTTP_CACHE_CONFIG['COMPLETED_MAX_AGE'])
+    if max_age <= 0:
+        return 'no-cache'
+    return f"public, max-age={max_age}"
+
+
+def _accepts(encoding):
+    return request.accept_encodings[encoding] > 0
+
+
+def json_response(obj=None, body=None, gzipped=None, cache_control='no-cache', last_modified=None):
+    """
+    生成带 ETag / Cache-Control 的 JSON 响应，并按 Accept-Encoding 压缩
+    obj:      要序列化的对象（与 jsonify 相同的 JSON 设置）
+    body:     已序列化的 JSON（bytes）
+    gzipped:  已 gzip 压缩的 JSON（bytes），ETag 直接取压缩数据的哈希，命中 304 时不必解压
+    last_modified: datetime，不带时区时按服务器本地时间处理（与库中 isoformat 时间一致）
+    """
+    cfg = config.HTTP_CACHE_CONFIG
+    if gzipped is None and body is None:
+        body = current_app.json.dumps(obj).encode('utf-8')
+    etag = hashlib.sha1(gzipped if gzipped is not None else body).hexdigest()
+
+    response = current_app.response_class(mimetype=current_app.json.mimetype)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.astimezone(timezone.utc)
+        last_modified = last_modified.replace(microsecond=0)
+        response.last_modified = last_modified
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        not_modified = (last_modified is not None and request.if_modified_since is not None
+                        and last_modified <= request.if_modified_since)
+    if not_modified:
+        response.status_code = 304
+        return response
+
+    if gzipped is not None and _accepts('gzip'):
+        response.set_data(gzipped)
+        response.content_encoding = 'gzip'
+        return response
+    if body is None:
+        body = gzip.decompress(gzipped)
+
+    if len(body) < cfg['MIN_COMPRESS_BYTES']:
+        response.set_data(body)
+    elif brotli is not None and _accepts('br'):
+        response.set_data(brotli.compress(body, quality=int(cfg['BROTLI_QUALITY'])))
+        response.content_encoding = 'br'
+    elif _accepts('gzip'):
+        response.set_data(gzip.compress(body, compresslevel=int(cfg['GZIP_LEVEL']), mtime=0))
+        response.content_encoding = 'gzip'
+    else:
+        response.set_data(body)
+    return response
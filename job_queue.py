@@ -0,0 +1,289 @@
+"""
+分析任务队列
+任务持久化在 SQLite（analysis_jobs 表），由固定数量的调度线程按 FIFO 或优先级顺序取出执行，
+队列深度达到上限时拒绝新任务（深度检查与入队在同一事务中完成），服务重启后未完成的任务会重新排队。
+"""
+import math
+import threading
+import traceback
+from datetime import datetime, timedelta
+
+import config
+import db_pool
+
+# 任务状态
+STATUS_RESERVED = 'reserved'  # 已占用队列位置，上传文件保存完成后才开始排队
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+
+class AnalysisJobQueue:
+    def __init__(self, db_path, handler, max_concurrent=None, max_depth=None, scheduling=None):
+        """
+        db_path: SQLite 数据库路径
+        handler: 执行任务的函数 handler(video_id, video_path, view_angle) -> bool（是否成功）
+        """
+        cfg = config.JOB_QUEUE_CONFIG
+        self.db_path = db_path
+        self.handler = handler
+        self.max_concurrent = int(max_concurrent or cfg['MAX_CONCURRENT_JOBS'])
+        self.max_depth = int(max_depth or cfg['MAX_QUEUE_DEPTH'])
+        self.scheduling = scheduling or cfg['SCHEDULING']
+        if self.scheduling not in {'fifo', 'priority'}:
+            raise ValueError("scheduling must be 'fifo' or 'priority'")
+        self.default_job_seconds = float(cfg['DEFAULT_JOB_SECONDS'])
+
+        self._cond = threading.Condition()
+        self._threads = []
+        self._started = False
+
+    # ------------------------------------------------------------------
+    # 数据库
+    # ------------------------------------------------------------------
+    def _connect(self):
+        return db_pool.connect(self.db_path)
+
+    def init_table(self):
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                video_id TEXT NOT NULL,
+                video_path TEXT NOT NULL,
+                view_angle TEXT NOT NULL,
+                priority INTEGER DEFAULT 0,
+                status TEXT NOT NULL,
+                enqueued_time TEXT NOT NULL,
+                started_time TEXT,
+                finished_time TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_analysis_jobs_status ON analysis_jobs(status, priority, id)
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _order_by(self):
+        return 'id ASC' if self.scheduling == 'fifo' else 'priority DESC, id ASC'
+
+    # ------------------------------------------------------------------
+    # 调度
+    # ------------------------------------------------------------------
+    def start(self):
+        """建表、恢复中断的任务并启动调度线程（重复调用无副作用）。"""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+
+        self.init_table()
+
+        # 上次退出时仍在运行的任务重新排队
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('UPDATE analysis_jobs SET status = ?, started_time = NULL WHERE status = ?',
+                       (STATUS_QUEUED, STATUS_RUNNING))
+        if cursor.rowcount:
+            print(f"[任务队列] 重新排队 {cursor.rowcount} 个未完成的任务")
+        # 上传未完成就退出的占位直接删除
+        cursor.execute('DELETE FROM analysis_jobs WHERE status = ?', (STATUS_RESERVED,))
+        conn.commit()
+        conn.close()
+
+        for i in range(self.max_concurrent):
+            t = threading.Thread(target=self._dispatch_loop, name=f"analysis-dispatch-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        print(f"[任务队列] 已启动 {self.max_concurrent} 个调度线程，调度策略: {self.scheduling}")
+
+    def _claim_next(self):
+        """原子地取出下一个排队任务并标记为运行中。"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(f'''
+                SELECT * FROM analysis_jobs WHERE status = ?
+                ORDER BY {self._order_by()} LIMIT 1
+            ''', (STATUS_QUEUED,)).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute('UPDATE analysis_jobs SET status = ?, started_time = ? WHERE id = ?',
+                         (STATUS_RUNNING, datetime.now().isoformat(), row['id']))
+            conn.commit()
+            return dict(row)
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, status):
+        conn = self._connect()
+        conn.execute('UPDATE analysis_jobs SET status = ?, finished_time = ? WHERE id = ?',
+                     (status, datetime.now().isoformat(), job_id))
+        conn.commit()
+        conn.close()
+
+    def _dispatch_loop(self):
+        while True:
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                print(f"[任务队列] 读取任务失败: {e}")
+                job = None
+
+            if job is None:
+                with self._cond:
+                    self._cond.wait(timeout=5)
+                continue
+
+            print(f"[任务队列] 开始任务 #{job['id']}: {job['video_id']}")
+            status = STATUS_FAILED
+            try:
+                if self.handler(job['video_id'], job['video_path'], job['view_angle']):
+                    status = STATUS_COMPLETED
+            except Exception as e:
+                print(f"[任务队列] 任务 #{job['id']} 执行异常: {e}")
+                traceback.print_exc()
+            self._finish(job['id'], status)
+            print(f"[任务队列] 任务 #{job['id']} 结束: {status}")
+
+    # ------------------------------------------------------------------
+    # 入队与查询
+    # ------------------------------------------------------------------
+    def _avg_job_seconds(self, cursor):
+        """最近完成任务的平均耗时（秒），无历史时使用配置默认值。"""
+        cursor.execute('''
+            SELECT started_time, finished_time FROM analysis_jobs
+            WHERE status = ? AND started_time IS NOT NULL AND finished_time IS NOT NULL
+            ORDER BY id DESC LIMIT 20
+        ''', (STATUS_COMPLETED,))
+        durations = []
+        for row in cursor.fetchall():
+            try:
+                d = datetime.fromisoformat(row['finished_time']) - datetime.fromisoformat(row['started_time'])
+                durations.append(d.total_seconds())
+            except (TypeError, ValueError):
+                continue
+        return sum(durations) / len(durations) if durations else self.default_job_seconds
+
+    def _running_remaining(self, cursor, avg, now):
+        """各运行中任务的预计剩余秒数。"""
+        cursor.execute('SELECT started_time FROM analysis_jobs WHERE status = ?', (STATUS_RUNNING,))
+        remaining = []
+        for row in cursor.fetchall():
+            try:
+                elapsed = (now - datetime.fromisoformat(row['started_time'])).total_seconds()
+            except (TypeError, ValueError):
+                elapsed = 0.0
+            remaining.append(max(avg - elapsed, 0.0))
+        return remaining
+
+    def _retry_after(self, cursor):
+        """预计最早有任务结束（腾出队列位置）的秒数。"""
+        avg = self._avg_job_seconds(cursor)
+        remaining = self._running_remaining(cursor, avg, datetime.now())
+        retry_after = min(remaining) if remaining else avg
+        return max(1, int(math.ceil(retry_after)))
+
+    def try_enqueue(self, video_id, video_path, view_angle, priority=0, hold=False):
+        """
+        检查队列深度并入队（同一个 BEGIN IMMEDIATE 事务，并发上传不会同时越过 MAX_QUEUE_DEPTH）
+        hold: 只占住队列位置（reserved），上传文件保存完成后调用 activate() 才开始排队，失败时调用 release()
+        返回: (任务ID, 0)；队列已满时返回 (None, Retry-After 秒数)
+        """
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            depth = conn.execute('SELECT COUNT(*) AS n FROM analysis_jobs WHERE status IN (?, ?, ?)',
+                                 (STATUS_RESERVED, STATUS_QUEUED, STATUS_RUNNING)).fetchone()['n']
+            if depth >= self.max_depth:
+                conn.rollback()
+                return None, self._retry_after(conn.cursor())
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO analysis_jobs (video_id, video_path, view_angle, priority, status, enqueued_time)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (video_id, video_path, view_angle, int(priority), STATUS_RESERVED if hold else STATUS_QUEUED,
+                  datetime.now().isoformat()))
+            job_id = cursor.lastrowid
+            conn.commit()
+        finally:
+            conn.close()
+
+        if not hold:
+            with self._cond:
+                self._cond.notify()
+        return job_id, 0
+
+    def activate(self, job_id):
+        """占位的任务开始排队。"""
+        conn = self._connect()
+        conn.execute('UPDATE analysis_jobs SET status = ?, enqueued_time = ? WHERE id = ? AND status = ?',
+                     (STATUS_QUEUED, datetime.now().isoformat(), job_id, STATUS_RESERVED))
+        conn.commit()
+        conn.close()
+
+        with self._cond:
+            self._cond.notify()
+
+    def release(self, job_id):
+        """释放未开始排队的占位（上传失败时调用）。"""
+        conn = self._connect()
+        conn.execute('DELETE FROM analysis_jobs WHERE id = ? AND status = ?', (job_id, STATUS_RESERVED))
+        conn.commit()
+        conn.close()
+
+    def get_status(self, video_id):
+        """
+        查询视频最近一次任务的排队情况
+        返回: {job_id, status, position, estimated_start_time} 或 None
+        position: 0 表示正在运行，N 表示前面还有 N-1 个排队任务
+        """
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM analysis_jobs WHERE video_id = ? ORDER BY id DESC LIMIT 1', (video_id,))
+        job = cursor.fetchone()
+        if job is None:
+            conn.close()
+            return None
+
+        info = {
+            'job_id': job['id'],
+            'status': job['status'],
+            'priority': job['priority'],
+            'enqueued_time': job['enqueued_time'],
+            'started_time': job['started_time'],
+            'position': None,
+            'estimated_start_time': None,
+        }
+
+        if job['status'] == STATUS_RUNNING:
+            info['position'] = 0
+        elif job['status'] == STATUS_QUEUED:
+            if self.scheduling == 'fifo':
+                cursor.execute('SELECT COUNT(*) AS n FROM analysis_jobs WHERE status = ? AND id < ?',
+                               (STATUS_QUEUED, job['id']))
+            else:
+                cursor.execute('''
+                    SELECT COUNT(*) AS n FROM analysis_jobs
+                    WHERE status = ? AND (priority > ? OR (priority = ? AND id < ?))
+                ''', (STATUS_QUEUED, job['priority'], job['priority'], job['id']))
+            ahead = cursor.fetchone()['n']
+            info['position'] = ahead + 1
+
+            # 预计开始时间：运行中任务的剩余时间 + 前序排队任务耗时，按并发数均摊
+            now = datetime.now()
+            avg = self._avg_job_seconds(cursor)
+            remaining = self._running_remaining(cursor, avg, now)
+            free_slots = self.max_concurrent - len(remaining)
+            if free_slots > 0 and ahead < free_slots:
+                wait = 0.0
+            else:
+                wait = (sum(remaining) + ahead * avg) / self.max_concurrent
+            info['estimated_start_time'] = (now + timedelta(seconds=wait)).isoformat()
+
+        conn.close()
+        return info
@@ -0,0 +1,342 @@
+"""
+关键点二进制存储
+每个视频的姿态序列保存为 (T,33,4) float32 数组 [x, y, z, visibility]（未检测到人体的帧为 NaN），
+与帧序号、视频ID一起写在同一目录下。读取时用内存映射，各阶段直接拿到数组，不再逐格解析 "(x,y,z)" 字符串。
+旧版 单视频_缺陷分析数据.csv 只作为可选导出，读取时仍兼容。
+
+目录结构:
+    keypoints.npy          (T,33,4) float32
+    keypoints_frames.npy   (T,) int64 帧序号（原视频中的绝对帧号）
+    keypoints_interpolated.npy  (T,) bool 自适应采样时未跑检测、由前后帧插值得到的帧（全部逐帧检测时不写）
+    keypoints_meta.json    {"video_id": ..., "num_frames": T, ...}
+"""
+import json
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+NUM_LANDMARKS = 33
+KEYPOINTS_FILE = "keypoints.npy"
+FRAMES_FILE = "keypoints_frames.npy"
+INTERPOLATED_FILE = "keypoints_interpolated.npy"
+META_FILE = "keypoints_meta.json"
+LEGACY_CSV = "单视频_缺陷分析数据.csv"
+# 解析 "(x,y,z)" / "[x,y,z]" 时去掉的括号
+_BRACKETS = str.maketrans("", "", "()[]")
+
+
+class KeypointSet:
+    """一个视频的关键点序列（points 可能是只读的内存映射数组）。"""
+
+    def __init__(self, video_id, frame_index, points, video_ids=None, path=None, interpolated=None):
+        self.video_id = str(video_id)
+        self.frame_index = np.asarray(frame_index, dtype=np.int64)
+        self.points = points
+        self.path = path
+        self._video_ids = video_ids
+        # 每帧是否为插值结果（未跑姿态检测）
+        self.interpolated = np.zeros(len(self.frame_index), dtype=bool) if interpolated is None \
+            else np.asarray(interpolated, dtype=bool)
+
+    def __len__(self):
+        return int(self.points.shape[0])
+
+    @property
+    def xyz(self):
+        """(T,33,3) 坐标视图。"""
+        return self.points[:, :, :3]
+
+    @property
+    def video_ids(self):
+        """逐行视频ID（旧版 CSV 可能包含多个视频）。"""
+        if self._video_ids is None:
+            return np.full(len(self), self.video_id, dtype=object)
+        return self._video_ids
+
+    def select_video(self, video_id):
+        """只保留某个视频的行（用于包含多个视频的旧版 CSV）。"""
+        mask = np.asarray(self.video_ids == str(video_id), dtype=bool)
+        if mask.all():
+            return self
+        return KeypointSet(video_id, self.frame_index[mask], self.points[mask],
+                           video_ids=self.video_ids[mask], path=self.path, interpolated=self.interpolated[mask])
+
+    def landmark_rows(self):
+        """逐帧的 33 个 "(x,y,z)" 字符串（未检测为空），to_dataframe 与关键点入库共用。"""
+        xyz = np.asarray(self.xyz, dtype=np.float32)
+        missing = np.isnan(xyz).any(axis=2).tolist()
+        return [
+            ["" if miss else f"({x},{y},{z})" for (x, y, z), miss in zip(frame, frame_missing)]
+            for frame, frame_missing in zip(xyz.tolist(), missing)
+        ]
+
+    def to_dataframe(self):
+        """
+        转换为旧版 CSV 的表格格式：video_id, frame_index, landmark_0..32（"(x,y,z)" 字符串，未检测为空）
+        存在插值帧时末尾追加 interpolated 列（1 表示插值）
+        """
+        data = {
+            "video_id": self.video_ids,
+            "frame_index": self.frame_index,
+        }
+        columns = list(zip(*self.landmark_rows())) if len(self) else [()] * NUM_LANDMARKS
+        for lid in range(NUM_LANDMARKS):
+            data[f"landmark_{lid}"] = list(columns[lid])
+        if self.interpolated.any():
+            data["interpolated"] = self.interpolated.astype(np.int8)
+        return pd.DataFrame(data)
+
+
+class LandmarkIndex:
+    """
+    按 (视频ID, 绝对帧号) 索引的关键点张量
+    所有视频的行按 (视频, 帧号) 组合键排序后只建一次索引，之后对任意多个 (视频, 帧号) 批量 searchsorted 取点，
+    不再按视频过滤拷贝表格、逐点 df.loc + 字符串解析。
+    同一视频同一帧出现多次时取最后一行。
+    """
+
+    _FRAME_SPAN = 1 << 32
+
+    def __init__(self, video_ids, frame_index, points):
+        vids = np.asarray(video_ids).astype(str)
+        self.points = points
+        self.videos, codes = np.unique(vids, return_inverse=True)
+        keys = codes.astype(np.int64) * self._FRAME_SPAN + np.asarray(frame_index, dtype=np.int64)
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    @classmethod
+    def from_keypoints(cls, keypoints):
+        """由 KeypointSet 建索引（points 保持内存映射，不拷贝）。"""
+        return cls(keypoints.video_ids, keypoints.frame_index, keypoints.points)
+
+    @classmethod
+    def from_dataframe(cls, df, landmarks=None):
+        """
+        由旧版表格建索引：所需的 landmark 列整表一次性解析
+        landmarks: 只解析这些关键点序号（None 为全部）
+        """
+        cols = [c for c in df.columns if str(c).startswith("landmark_")]
+        if landmarks is not None:
+            cols = [f"landmark_{i}" for i in landmarks if f"landmark_{i}" in df.columns]
+        xyz = parse_landmark_columns(df[cols]).astype(np.float32)
+        frame_index = df["frame_index"].to_numpy(dtype=np.int64) if "frame_index" in df.columns \
+            else np.arange(len(df), dtype=np.int64)
+        return cls(df["video_id"].to_numpy(), frame_index, xyz)
+
+    def __contains__(self, video_id):
+        i = int(np.searchsorted(self.videos, str(video_id)))
+        return i < len(self.videos) and self.videos[i] == str(video_id)
+
+    def locate(self, video_ids, frames):
+        """
+        每个 (视频, 帧号) 对应的行号，不存在为 -1
+        video_ids 可以是单个ID（对所有帧号广播）或与 frames 等长的数组
+        """
+        frames = np.asarray(frames, dtype=np.int64).reshape(-1)
+        vids = np.broadcast_to(np.asarray(video_ids).astype(str), frames.shape)
+        codes = pd.Index(self.videos).get_indexer(vids)
+        keys = codes.astype(np.int64) * self._FRAME_SPAN + frames
+        if len(self._keys) == 0:
+            return np.full(frames.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(self._keys, keys, side="right") - 1
+        pos_c = np.clip(pos, 0, None)
+        found = (codes >= 0) & (pos >= 0) & (self._keys[pos_c] == keys)
+        return np.where(found, self._order[pos_c], -1)
+
+    def gather(self, video_ids, frames, landmarks):
+        """
+        批量取点
+        返回: (xyz, found)
+          xyz: (N, len(landmarks), 3) float32，帧不存在时为 NaN
+          found: (N,) bool，帧是否存在
+        """
+        rows = self.locate(video_ids, frames)
+        found = rows >= 0
+        xyz = np.full((len(rows), len(landmarks), 3), np.nan, dtype=np.float32)
+        if found.any():
+            sel = np.asarray(self.points[rows[found]], dtype=np.float32)
+            xyz[found] = sel[:, list(landmarks), :3]
+        return xyz, found
+
+
+def save_keypoints(out_dir, video_id, frame_index, points, export_csv=False, meta=None, interpolated=None):
+    """
+    写入关键点目录
+    points: (T,33,4) float32，未检测到人体的帧为 NaN
+    export_csv: 是否同时导出旧版 CSV
+    interpolated: (T,) bool 插值帧标记，None 或全为 False 时不写标记文件
+    返回: keypoints.npy 路径
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    points = np.ascontiguousarray(points, dtype=np.float32).reshape(-1, NUM_LANDMARKS, 4)
+    frame_index = np.asarray(frame_index, dtype=np.int64)
+    if len(frame_index) != len(points):
+        raise ValueError("frame_index and points must have the same length")
+
+    np.save(out_dir / KEYPOINTS_FILE, points)
+    np.save(out_dir / FRAMES_FILE, frame_index)
+    interpolated = np.zeros(len(points), dtype=bool) if interpolated is None else np.asarray(interpolated, dtype=bool)
+    if interpolated.any():
+        np.save(out_dir / INTERPOLATED_FILE, interpolated)
+    elif (out_dir / INTERPOLATED_FILE).exists():
+        # 同一目录上次是自适应采样，清掉旧标记
+        (out_dir / INTERPOLATED_FILE).unlink()
+    info = dict(meta or {})
+    info.update({"video_id": str(video_id), "num_frames": int(len(points)), "num_landmarks": NUM_LANDMARKS,
+                 "interpolated_frames": int(interpolated.sum())})
+    with open(out_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+    if export_csv:
+        csv_path = out_dir / LEGACY_CSV
+        KeypointSet(video_id, frame_index, points, interpolated=interpolated).to_dataframe() \
+            .to_csv(csv_path, index=False, encoding="utf-8-sig")
+        print(f"[关键点] 已导出CSV: {csv_path}")
+
+    return str(out_dir / KEYPOINTS_FILE)
+
+
+def find_keypoints(path):
+    """在目录中查找关键点文件（优先二进制，其次旧版 CSV），找不到返回 None。"""
+    if path is None:
+        return None
+    p = Path(path)
+    if p.is_file():
+        return str(p)
+    if p.is_dir():
+        for name in (KEYPOINTS_FILE, LEGACY_CSV):
+            if (p / name).exists():
+                return str(p / name)
+    return None
+
+
+def parse_landmark_columns(df):
+    """
+    把旧版 CSV 中 landmark_0..32 的 "(x,y,z)" 字符串列一次性解析为 (T,33,3) float64 数组
+    所有合法单元格拼接成一个字符串后整体转换，不逐格调用 literal_eval；空格、缺列或格式错误的单元格为 NaN
+    （"(x,y,z)" 与 "[x,y,z]" 均可，结果与逐格 ast.literal_eval 相同）
+    """
+    T = len(df)
+    xyz = np.full((T, NUM_LANDMARKS, 3), np.nan, dtype=np.float64)
+    present = [i for i in range(NUM_LANDMARKS) if f"landmark_{i}" in df.columns]
+    if T == 0 or not present:
+        return xyz
+
+    cells = df[[f"landmark_{i}" for i in present]].to_numpy(dtype=object).ravel()
+    parsed = np.full((len(cells), 3), np.nan, dtype=np.float64)
+
+    # 恰好两个逗号的字符串单元格才可能是合法的点；空单元格（NaN）与其他格式直接为 NaN
+    ok = pd.Series(cells, dtype=object).str.count(",").eq(2).to_numpy(dtype=bool)
+    if not ok.any():
+        return xyz
+    text = ",".join(cells[ok]).translate(_BRACKETS)
+
+    # 快速路径：合法单元格拼接后由 np.fromstring 一次性转换
+    values = None
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            values = np.fromstring(text, dtype=np.float64, sep=",")
+        if values.size != 3 * int(ok.sum()):
+            values = None
+    except (TypeError, ValueError):
+        values = None
+
+    if values is None:
+        # 慢速路径：存在无法转换的分量，逐个 token 宽松转换
+        values = pd.to_numeric(pd.Series(text.split(",")).str.strip(), errors="coerce").to_numpy(dtype=np.float64)
+
+    parsed[ok] = values.reshape(-1, 3)
+    # 与逐格 literal_eval 一致：任一分量无法解析（含 nan / inf）时整个点记为 NaN
+    parsed[~np.isfinite(parsed).all(axis=1)] = np.nan
+
+    xyz[:, present, :] = parsed.reshape(T, len(present), 3)
+    return xyz
+
+
+def load_keypoints_csv(csv_path, video_id=None):
+    """读取旧版 CSV；指定 video_id 时只保留该视频的行。"""
+    df = pd.read_csv(csv_path)
+    if "video_id" not in df.columns:
+        df["video_id"] = "unknown"
+    df["video_id"] = df["video_id"].astype(str)
+    if video_id is not None:
+        df = df[df["video_id"] == str(video_id)].reset_index(drop=True)
+    frame_col = "frame_index" if "frame_index" in df.columns else None
+    frame_index = df[frame_col].to_numpy(dtype=np.int64) if frame_col else np.arange(len(df), dtype=np.int64)
+
+    points = np.full((len(df), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    points[:, :, :3] = parse_landmark_columns(df)
+    first_id = df["video_id"].iloc[0] if len(df) else (video_id or "unknown")
+    return KeypointSet(first_id, frame_index, points, video_ids=df["video_id"].to_numpy(dtype=object), path=str(csv_path))
+
+
+def keypoints_from_rows(video_id, frame_index, landmark_lists):
+    """
+    由数据库 keypoints_data 的行恢复关键点
+    landmark_lists: 每帧 33 个 "(x,y,z)" 字符串（未检测为空串），即 landmarks_json 反序列化后的列表
+    """
+    cells = pd.DataFrame(
+        [[(s or None) for s in lms] for lms in landmark_lists],
+        columns=[f"landmark_{i}" for i in range(NUM_LANDMARKS)],
+    )
+    points = np.full((len(cells), NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    points[:, :, :3] = parse_landmark_columns(cells)
+    return KeypointSet(video_id, frame_index, points)
+
+
+def load_keypoints(path, video_id=None, mmap=True):
+    """
+    读取关键点（目录 / keypoints.npy / 旧版 CSV 均可）
+    二进制格式默认内存映射（只读、零拷贝）
+    """
+    found = find_keypoints(path)
+    if found is None:
+        raise FileNotFoundError(f"Keypoints not found: {path}")
+    if found.lower().endswith(".csv"):
+        return load_keypoints_csv(found, video_id=video_id)
+
+    base = Path(found).parent
+    points = np.load(found, mmap_mode="r" if mmap else None)
+    frames_path = base / FRAMES_FILE
+    frame_index = np.load(frames_path) if frames_path.exists() else np.arange(points.shape[0], dtype=np.int64)
+    interp_path = base / INTERPOLATED_FILE
+    interpolated = np.load(interp_path) if interp_path.exists() else None
+    meta = {}
+    if (base / META_FILE).exists():
+        with open(base / META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    return KeypointSet(meta.get("video_id", base.name), frame_index, points, path=found, interpolated=interpolated)
+
+
+def interpolate_skipped(frame_index, points, sampled):
+    """
+    自适应采样后补全跳过检测的帧：按帧号在前后最近的已检测帧之间线性插值
+    任一侧没有已检测帧、或该侧未检测到人体（NaN）时保持 NaN
+    返回: (points, interpolated)，interpolated 即跳过检测的帧
+    """
+    frame_index = np.asarray(frame_index, dtype=np.int64)
+    points = np.array(points, dtype=np.float32, copy=True)
+    sampled = np.asarray(sampled, dtype=bool)
+    rows = np.flatnonzero(~sampled)
+    anchors = np.flatnonzero(sampled)
+    if len(rows) == 0:
+        return points, ~sampled
+    if len(anchors) == 0:
+        points[rows] = np.nan
+        return points, ~sampled
+
+    pos = np.searchsorted(anchors, rows)
+    left = anchors[np.clip(pos - 1, 0, None)]
+    right = anchors[np.clip(pos, None, len(anchors) - 1)]
+    span = (frame_index[right] - frame_index[left]).astype(np.float32)
+    w = np.where(span > 0, (frame_index[rows] - frame_index[left]) / np.where(span > 0, span, 1), 0).astype(np.float32)
+    filled = (1 - w)[:, None, None] * points[left] + w[:, None, None] * points[right]
+    filled[(pos == 0) | (pos == len(anchors))] = np.nan
+    points[rows] = filled
+    return points, ~sampled
@@ -0,0 +1,206 @@
+"""
+分阶段结果缓存（内容寻址）
+缓存键 = 视频内容 SHA-256 + 该阶段的全部参数（模型权重路径与修改时间、seq_length、输入尺寸、
+MediaPipe 模型复杂度、缩放倍数、标准范围文件哈希等），相同视频重复上传或参数不变重跑时直接复用：
+    swingnet           逐帧事件概率 probs.npy
+    keypoints          关键点张量 keypoints.npy / keypoints_frames.npy
+    analysis           逐帧审判 / 视频级汇总 CSV
+    keyframe_analysis  关键帧分析 CSV
+    transcode / render 转码视频、可视化与骨架视频
+只改标准范围时，前两级缓存仍命中，只重新执行判定。
+
+目录结构: <DIR>/<stage>/<key[:2]>/<key>/（条目先写到临时目录再整体 rename，进程间并发安全）
+按目录修改时间做 LRU，总大小超过 MAX_BYTES 时从最久未使用的条目开始删除。
+"""
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import config
+
+META_FILE = "meta.json"
+
+# (路径, 大小, 修改时间) -> SHA-256，同一进程内不重复哈希同一个文件
+_hash_memo = {}
+_hash_lock = threading.Lock()
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """文件内容的 SHA-256（十六进制）；文件不存在时返回 None。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    memo_key = (str(Path(path).resolve()), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _hash_lock:
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+def file_signature(path):
+    """模型权重等大文件只用 路径 + 修改时间 + 大小 标识（不读全文）。"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"path": str(Path(path).resolve()), "mtime": st.st_mtime_ns, "size": st.st_size}
+
+
+def stage_key(stage, **parts):
+    """阶段名 + 参数 -> 缓存键（参数按键名排序后序列化再哈希，包含 CACHE_CONFIG['VERSION']）。"""
+    payload = json.dumps({"stage": stage, "version": config.CACHE_CONFIG.get('VERSION', 1), **parts}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _dir_size(path):
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResultCache:
+    """磁盘缓存：每个条目是一个目录，包含若干结果文件与 meta.json。"""
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, stage, key):
+        return self.root / stage / key[:2] / key
+
+    def get(self, stage, key):
+        """命中时返回条目目录并刷新其 LRU 时间，未命中返回 None。"""
+        entry = self._entry(stage, key)
+        if not entry.is_dir():
+            return None
+        try:
+            os.utime(entry)
+        except OSError:
+            # 刚好被其他进程淘汰
+            return None
+        return entry
+
+    def meta(self, entry):
+        try:
+            with open(Path(entry) / META_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, stage, key, files=None, meta=None, writer=None):
+        """
+        写入条目
+        files: {条目内文件名: 源文件路径}，源文件不存在的项跳过
+        writer: 可选回调 writer(tmp_dir)，直接在临时目录中写文件（如 np.save）
+        返回条目目录；写入失败返回 None（缓存失败不影响主流程）
+        """
+        entry = self._entry(stage, key)
+        tmp_root = self.root / ".tmp"
+        tmp_root.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=f"{stage}_", dir=tmp_root))
+        try:
+            for name, src in (files or {}).items():
+                if src and os.path.exists(src):
+                    shutil.copy2(src, tmp / name)
+            if writer is not None:
+                writer(tmp)
+            with open(tmp / META_FILE, "w", encoding="utf-8") as f:
+                json.dump({**(meta or {}), "stage": stage, "created": time.time()}, f, ensure_ascii=False, indent=2)
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(tmp, entry)
+            except OSError:
+                # 其他进程已写入同一条目，保留已有的
+                shutil.rmtree(tmp, ignore_errors=True)
+        except Exception as e:
+            print(f"[缓存] 写入失败 {stage}/{key[:12]}: {e}")
+            shutil.rmtree(tmp, ignore_errors=True)
+            return None
+        self.evict()
+        return entry
+
+    def entries(self):
+        """所有条目: [(最近使用时间, 大小, 目录)]。"""
+        out = []
+        for stage_dir in self.root.iterdir():
+            if not stage_dir.is_dir() or stage_dir.name.startswith("."):
+                continue
+            for entry in stage_dir.glob("*/*"):
+                try:
+                    out.append((entry.stat().st_mtime, _dir_size(entry), entry))
+                except OSError:
+                    pass
+        return out
+
+    def evict(self):
+        """总大小超过上限时按 LRU 删除条目，返回删除的条目数。"""
+        entries = sorted(self.entries(), key=lambda e: e[0])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            print(f"[缓存] 已淘汰 {removed} 个条目，当前占用 {total / 1024 / 1024:.1f} MB")
+        return removed
+
+
+def copy_csv(src, dst, id_value=None, id_columns=("视频ID", "video_id")):
+    """
+    复制缓存的结果 CSV；id_value 非空时把视频ID列整体替换为当前视频ID
+    （同一视频重复上传会得到新的视频ID，其余单元格按原文本保留）
+    """
+    Path(dst).parent.mkdir(parents=True, exist_ok=True)
+    if id_value is None:
+        shutil.copyfile(src, dst)
+        return str(dst)
+    with open(src, "r", encoding="utf-8-sig", newline="") as f:
+        rows = list(csv.reader(f))
+    if rows:
+        cols = [j for j, name in enumerate(rows[0]) if name in id_columns]
+        for row in rows[1:]:
+            for j in cols:
+                if j < len(row):
+                    row[j] = str(id_value)
+    with open(dst, "w", encoding="utf-8-sig", newline="") as f:
+        csv.writer(f, lineterminator=os.linesep).writerows(rows)
+    return str(dst)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """全局缓存（按 CACHE_CONFIG 创建）；缓存关闭时返回 None。"""
+    global _cache
+    if not config.CACHE_CONFIG['ENABLED']:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(config.CACHE_CONFIG['DIR'], config.CACHE_CONFIG['MAX_BYTES'])
+        return _cache
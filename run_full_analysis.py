@@ -1,8 +1,10 @@
 import argparse
 import sys
 import json
+import time
 from pathlib import Path
 import config
+from stage_manifest import STAGES
 
 def _add_sys_path(p: Path):
     p_str = str(p.resolve())
@@ -10,11 +12,91 @@ def _add_sys_path(p: Path):
         sys.path.insert(0, p_str)
 
 
-def main():
+def _stage_dirs():
+    root = Path(__file__).resolve().parent
+    return {
+        "root": root,
+        "extract": root / "Extract_key_frames",
+        "keypoint": root / "Keypoint_detection",
+        "analyze": root / "analyze",
+        "keyframe_analysis": root / "Keyframe_analysis",
+        "visualization": root / "visualization",
+    }
+
+
+def _import_keyframe_module():
+    try:
+        import Extract_key_frames as kf
+    except Exception as e:
+        if isinstance(e, ModuleNotFoundError):
+            missing = getattr(e, "name", None)
+            if missing in {"cv2", "torch", "torchvision"}:
+                raise RuntimeError(
+                    f"关键帧提取依赖缺失：{missing}。\n"
+                    "请先安装依赖：pip install opencv-python torch torchvision\n"
+                    "（或用 conda 安装对应包），再重试。"
+                ) from e
+        raise RuntimeError(
+            "无法导入关键帧提取模块。请确认 Extract_key_frames/Extract_key_frames.py 及其依赖存在。"
+        ) from e
+    return kf
+
+
+def _import_keypoint_module():
+    try:
+        import export_all_keypoints as kp
+    except Exception as e:
+        if isinstance(e, ModuleNotFoundError):
+            missing = getattr(e, "name", None)
+            if missing in {"cv2", "mediapipe"}:
+                raise RuntimeError(
+                    f"关键点检测依赖缺失：{missing}。\n"
+                    "请先安装依赖：pip install opencv-python mediapipe\n"
+                    "（或用 conda 安装对应包），再重试。"
+                ) from e
+        raise RuntimeError(
+            "无法导入关键点检测模块。请确认已安装 mediapipe / opencv / pandas 等依赖，并且 Keypoint_detection/export_all_keypoints.py 存在。"
+        ) from e
+    return kp
+
+
+def warmup(weights=None, num_events=None, model_complexity=None):
+    """预先导入各阶段模块并加载 SwingNet / MediaPipe Pose（供常驻工作进程调用）。"""
+    dirs = _stage_dirs()
+    for key in ("extract", "keypoint", "analyze", "keyframe_analysis", "visualization"):
+        _add_sys_path(dirs[key])
+
+    weights = weights or config.KEYFRAME_CONFIG['WEIGHTS_PATH']
+    num_events = num_events or config.KEYFRAME_CONFIG['NUM_EVENTS']
+    if model_complexity is None:
+        model_complexity = config.KEYPOINT_CONFIG['MODEL_COMPLEXITY']
+
+    import Extract_key_frames as kf
+    import export_all_keypoints as kp
+    import run_single_analysis  # noqa: F401
+    import run_keyframe_analysis  # noqa: F401
+
+    if Path(weights).exists():
+        kf.load_event_detector(weights, num_events=num_events)
+    else:
+        print(f"[预热] 关键帧模型权重不存在，跳过模型加载: {weights}")
+    kp.get_pose(model_complexity)
+
+
+def build_arg_parser():
     parser = argparse.ArgumentParser(description="Golf swing: keyframes -> keypoints -> analysis")
     parser.add_argument("--video_path", type=str, required=True, help="输入视频路径")
     parser.add_argument("--view_angle", "--view", type=str, required=True, help="视频视角：侧面或正面")
     parser.add_argument("--video_id", type=str, default=None, help="视频ID（可选，用于文件命名）")
+    parser.add_argument("--shared_decode", action=argparse.BooleanOptionalAction, default=config.PIPELINE_CONFIG['SHARED_DECODE'], help="视频只解码一次，分发给关键帧预处理与关键点检测")
+    parser.add_argument("--transcode", action="store_true", help="同时转码出浏览器兼容视频（结果字典中的 transcoded）")
+    parser.add_argument("--multi_swing", action="store_true", default=config.PIPELINE_CONFIG['MULTI_SWING'], help="多挥杆模式：按挥杆切分长视频，只在挥杆片段上并行做后续分析")
+    parser.add_argument("--max_swings", type=int, default=config.PIPELINE_CONFIG['MAX_SWINGS'], help="多挥杆模式下最多切分的挥杆数")
+    parser.add_argument("--swing_workers", type=int, default=config.PIPELINE_CONFIG['SWING_WORKERS'], help="多挥杆模式下并行处理的进程数")
+    parser.add_argument("--cache", action=argparse.BooleanOptionalAction, default=config.CACHE_CONFIG['ENABLED'], help="按 视频内容哈希 + 阶段参数 复用已缓存的各阶段结果")
+    parser.add_argument("--stage_workers", type=int, default=config.PIPELINE_CONFIG['STAGE_WORKERS'], help="互不依赖的阶段并行执行的线程数（1 表示按顺序执行）")
+    parser.add_argument("--from_stage", "--from-stage", type=str, default=None, choices=STAGES, help="该阶段及之后的阶段强制重跑，之前的阶段复用上次完成的结果")
+    parser.add_argument("--only_stage", "--only-stage", type=str, default=None, choices=STAGES, help="只重跑该阶段（依赖的上游阶段必须已完成）")
 
     # Keyframe extraction options
     parser.add_argument("--kf_weights", type=str, default=config.KEYFRAME_CONFIG['WEIGHTS_PATH'], help="关键帧模型权重(.pth.tar)")
@@ -25,9 +107,11 @@ def main():
     parser.add_argument("--kf_width", type=int, default=config.KEYFRAME_CONFIG['INPUT_SIZE'][1])
 
     # Keypoint detection options
-    parser.add_argument("--kp_output_dir", type=str, default=config.KEYPOINT_CONFIG['OUTPUT_DIR'], help="关键点CSV输出目录")
+    parser.add_argument("--kp_output_dir", type=str, default=config.KEYPOINT_CONFIG['OUTPUT_DIR'], help="关键点输出目录")
     parser.add_argument("--kp_scale", type=float, default=config.KEYPOINT_CONFIG['SCALE_FACTOR'], help="关键点检测前对帧放大倍数")
     parser.add_argument("--kp_model_complexity", type=int, default=config.KEYPOINT_CONFIG['MODEL_COMPLEXITY'], choices=[0, 1, 2], help="MediaPipe Pose 模型复杂度")
+    parser.add_argument("--kp_sampling", type=str, default=config.KEYPOINT_CONFIG['SAMPLING'], choices=["dense", "adaptive"], help="关键点采样：dense 逐帧检测 / adaptive 关键帧事件附近逐帧、其余稀疏检测并插值")
+    parser.add_argument("--kp_workers", type=int, default=config.KEYPOINT_CONFIG['SHARD_WORKERS'], help="关键点分段并行检测的进程数（1 表示单进程逐帧跟踪，并参与共用解码）")
 
     # Analysis options
     parser.add_argument("--std_csv", type=str, default=None, help="标准范围CSV（不填则按view自动选）")
@@ -41,8 +125,326 @@ def main():
     parser.add_argument("--viz_output_dir", type=str, default=config.VISUALIZATION_CONFIG['OUTPUT_DIR'], help="可视化视频输出目录")
     parser.add_argument("--viz_panel_width", type=int, default=config.VISUALIZATION_CONFIG['PANEL_WIDTH'], help="可视化面板宽度")
     parser.add_argument("--generate_skeleton", action="store_true", default=config.VISUALIZATION_CONFIG['GENERATE_SKELETON'], help="是否生成骨架视频")
+    return parser
+
+
+def _analysis_std_csv(args):
+    if args.std_csv:
+        return args.std_csv
+    if args.view == "side":
+        return config.ANALYSIS_CONFIG['STD_SIDE_PATH']
+    return config.ANALYSIS_CONFIG['STD_FRONT_PATH']
+
+
+def _keyframe_std_csv(view):
+    if view == "side":
+        return config.KEYFRAME_ANALYSIS_CONFIG['STD_SIDE_PATH']
+    return config.KEYFRAME_ANALYSIS_CONFIG['STD_FRONT_PATH']
+
+
+def _summary_verdict(summary_df):
+    if summary_df is not None and len(summary_df) > 0 and "视频判定" in summary_df.columns:
+        return str(summary_df.iloc[0]["视频判定"])
+    return None
+
+
+def _cache_keys(args, video_hash):
+    """各阶段结果缓存键：视频内容哈希 + 影响该阶段结果的全部参数（下游阶段的键包含上游阶段的键）。"""
+    import result_cache as rc
+
+    kf_key = rc.stage_key(
+        "swingnet", video=video_hash, weights=rc.file_signature(args.kf_weights),
+        seq_length=args.kf_seq_length, input_size=[args.kf_height, args.kf_width], num_events=args.kf_num_events,
+    )
+    sampling = args.kp_sampling
+    if sampling == "adaptive":
+        # 自适应采样的结果取决于关键帧事件与采样参数
+        cfg = config.KEYPOINT_CONFIG
+        sampling = {
+            "mode": sampling, "swingnet": kf_key, "decode": args.kf_decode, "window": cfg['DENSE_WINDOW'],
+            "stride": cfg['SPARSE_STRIDE'], "motion_threshold": cfg['MOTION_THRESHOLD'],
+        }
+    # 分段并行检测的结果只在跟踪误差范围内与单进程一致，分段数与预热帧数也计入键（自适应采样不分段）
+    shards = None
+    if args.kp_workers > 1 and args.kp_sampling != "adaptive":
+        shards = {"workers": args.kp_workers, "overlap": config.KEYPOINT_CONFIG['SHARD_OVERLAP']}
+    kp_key = rc.stage_key(
+        "keypoints", video=video_hash, model_complexity=args.kp_model_complexity, scale=args.kp_scale,
+        sampling=sampling, roi=config.KEYPOINT_CONFIG['ROI_CROP'], max_side=config.KEYPOINT_CONFIG['MAX_INPUT_SIDE'],
+        shards=shards,
+    )
+    an_key = rc.stage_key(
+        "analysis", keypoints=kp_key, view=args.view, standards=rc.file_sha256(_analysis_std_csv(args)),
+    )
+    kfa_key = rc.stage_key(
+        "keyframe_analysis", keypoints=kp_key, swingnet=kf_key, decode=args.kf_decode, view=args.view,
+        standards=rc.file_sha256(_keyframe_std_csv(args.view)),
+    )
+    return {
+        "swingnet": kf_key,
+        "keypoints": kp_key,
+        "analysis": an_key,
+        "keyframe_analysis": kfa_key,
+        "transcode": rc.stage_key("transcode", video=video_hash),
+        "render": rc.stage_key(
+            "render", video=video_hash, keypoints=kp_key, analysis=an_key, panel_width=args.viz_panel_width,
+            visualization=bool(args.enable_visualization), skeleton=bool(args.generate_skeleton),
+        ),
+    }
+
+
+def _limit_threads():
+    """阶段并行时限制 torch / OpenCV 的内部线程数，避免多个阶段同时抢占全部 CPU 核。"""
+    import os
+
+    cfg = config.PIPELINE_CONFIG
+    torch_threads = cfg['TORCH_THREADS'] or max(1, (os.cpu_count() or 2) // 2)
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+    try:
+        import cv2
+        cv2.setNumThreads(cfg['CV_THREADS'])
+    except ImportError:
+        pass
+
+
+def _manifest_inputs(args, keys):
+    """断点续跑各阶段的输入哈希：在缓存键的基础上加入输出位置与结果中的视频ID。"""
+    import result_cache as rc
+
+    video_id = args.video_id or Path(args.video_path).stem
+    return {
+        "transcode": keys["transcode"],
+        "keyframes": rc.stage_key("keyframes", swingnet=keys["swingnet"], decode=args.kf_decode),
+        "keypoints": rc.stage_key(
+            "keypoints", keypoints=keys["keypoints"], video_id=video_id,
+            out_dir=str(Path(args.kp_output_dir).resolve()),
+        ),
+        "analysis": rc.stage_key(
+            "analysis", analysis=keys["analysis"], video_id=video_id,
+            out_dir=str(Path(args.analysis_out_dir).resolve()),
+        ),
+        "keyframe_analysis": rc.stage_key(
+            "keyframe_analysis", keyframe_analysis=keys["keyframe_analysis"], video_id=video_id,
+            out_dir=str(Path(args.keyframe_analysis_out_dir).resolve()),
+        ),
+        "visualization": rc.stage_key(
+            "visualization", render=keys["render"], video_id=video_id,
+            out_dir=str(Path(args.viz_output_dir).resolve()),
+        ),
+    }
+
+
+def _cached_tables(cache, stage, key, out_dir, names, id_value):
+    """恢复缓存的结果 CSV 到 out_dir（视频ID列替换为当前视频ID），未命中返回 None。"""
+    import result_cache as rc
+
+    entry = cache.get(stage, key)
+    if entry is None or not all((entry / name).exists() for name in names):
+        return None
+    try:
+        return [rc.copy_csv(entry / name, Path(out_dir) / name, id_value=id_value) for name in names]
+    except OSError:
+        return None
+
+
+def _cached_file(cache, stage, key, name, dst_stem):
+    """恢复缓存的单个输出文件（扩展名与缓存时一致），返回目标路径；未命中返回 None。"""
+    import shutil
+
+    entry = cache.get(stage, key)
+    if entry is None:
+        return None
+    matches = sorted(entry.glob(f"{name}.*"))
+    if not matches:
+        return None
+    dst = f"{dst_stem}{matches[0].suffix}"
+    try:
+        Path(dst).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(matches[0], dst)
+    except OSError:
+        return None
+    return dst
+
+
+def _run_swing(job):
+    """处理一个挥杆片段：片段内关键点检测 -> 逐帧分析 -> 关键帧分析（可在子进程中执行）。"""
+    dirs = _stage_dirs()
+    for key in ("root", "keypoint", "analyze", "keyframe_analysis"):
+        _add_sys_path(dirs[key])
+
+    import numpy as np
+    import export_all_keypoints as kp
+    import run_single_analysis as analysis
+    import run_keyframe_analysis as kfa
+    from frame_source import FrameSource
+
+    swing_id = job["swing_id"]
+    print(f"[挥杆 {swing_id}] 帧区间 [{job['start']}, {job['end']})")
+    source = FrameSource(job["video_path"], start_frame=job["start"], end_frame=job["end"])
+    consumer = source.subscribe(kp.make_pose_consumer(
+        job["video_path"],
+        scale=job["kp_scale"],
+        model_complexity=job["kp_model_complexity"],
+        video_id=swing_id
+    ))
+    source.run()
+    keypoints_path = kp.save_keypoints(consumer, job["kp_out_dir"])
+    if not keypoints_path:
+        raise RuntimeError(f"挥杆 {swing_id} 未生成关键点数据。")
+
+    frame_out, video_out, summary_df = analysis.run_analysis(
+        view=job["view"],
+        input_csv=keypoints_path,
+        std_csv=job["std_csv"],
+        out_dir=job["analysis_out_dir"],
+    )
+    kf_frame_out, kf_video_out, kf_summary_df = kfa.run_keyframe_analysis(
+        view=job["view"],
+        input_csv=keypoints_path,
+        out_dir=job["keyframe_analysis_out_dir"],
+        events=np.asarray(job["events"]),
+        num_events=job["num_events"],
+        std_csv=job["kf_std_csv"],
+    )
+    return {
+        "swing_id": swing_id,
+        "keypoints": keypoints_path,
+        "frame_out": frame_out,
+        "video_out": video_out,
+        "kf_frame_out": kf_frame_out,
+        "kf_video_out": kf_video_out,
+        "verdict": _summary_verdict(summary_df),
+        "kf_verdict": _summary_verdict(kf_summary_df),
+    }
+
+
+def _concat_csvs(paths, out_path):
+    """把各挥杆的结果表纵向合并为一个 CSV，返回输出路径（没有可合并的表时返回 None）。"""
+    import pandas as pd
+
+    frames = [pd.read_csv(p, encoding="utf-8-sig") for p in paths if p and Path(p).exists()]
+    if not frames:
+        return None
+    pd.concat(frames, ignore_index=True).to_csv(out_path, index=False, encoding="utf-8-sig")
+    return str(out_path)
+
+
+def _run_multi_swing(args, kf, streamer, transcoded):
+    """多挥杆模式：切分挥杆片段，片段间的空闲帧不做关键点检测与判定，各片段并行分析。"""
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    cfg = config.PIPELINE_CONFIG
+    view_angle_cn = "侧面" if args.view == "side" else "正面"
+    video_id = args.video_id or Path(args.video_path).stem
+
+    print("[1/4] 挥杆切分与关键帧提取中...")
+    sw_result = kf.extract_swings(
+        video_path=args.video_path,
+        weights=args.kf_weights,
+        seq_length=args.kf_seq_length,
+        num_events=args.kf_num_events,
+        height=args.kf_height,
+        width=args.kf_width,
+        output_root=str(_stage_dirs()["extract"] / "output"),
+        streamer=streamer,
+        max_swings=args.max_swings,
+        min_gap=cfg['SWING_MIN_GAP'],
+        min_confidence=cfg['SWING_MIN_CONFIDENCE'],
+        pad=cfg['SWING_PAD'],
+        max_frames=cfg['SWING_MAX_FRAMES'],
+    )
+    swings = sw_result["swings"]
+    print(f"  - 检测到 {len(swings)} 次挥杆")
+
+    jobs = []
+    for k, sw in enumerate(swings):
+        swing_id = f"{video_id}_s{k:02d}"
+        sub = f"swing_{k:02d}"
+        jobs.append({
+            "swing_id": swing_id,
+            "video_path": args.video_path,
+            "view": args.view,
+            "start": sw["start"],
+            "end": sw["end"],
+            "events": [int(e) for e in sw["events"]],
+            "num_events": sw_result["num_events"],
+            "kp_scale": args.kp_scale,
+            "kp_model_complexity": args.kp_model_complexity,
+            "kp_out_dir": str(Path(args.kp_output_dir) / sub),
+            "analysis_out_dir": str(Path(args.analysis_out_dir) / sub),
+            "keyframe_analysis_out_dir": str(Path(args.keyframe_analysis_out_dir) / sub),
+            "std_csv": _analysis_std_csv(args),
+            "kf_std_csv": _keyframe_std_csv(args.view),
+        })
+
+    print(f"[2-4/4] 并行分析 {len(jobs)} 个挥杆片段（{max(1, args.swing_workers)} 个进程）...")
+    if args.swing_workers <= 1 or len(jobs) <= 1:
+        outputs = [_run_swing(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=min(args.swing_workers, len(jobs)),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as ex:
+            outputs = list(ex.map(_run_swing, jobs))
+
+    # 合并各挥杆结果，文件名与单挥杆模式一致
+    Path(args.analysis_out_dir).mkdir(parents=True, exist_ok=True)
+    Path(args.keyframe_analysis_out_dir).mkdir(parents=True, exist_ok=True)
+    frame_out = _concat_csvs([o["frame_out"] for o in outputs],
+                             Path(args.analysis_out_dir) / f"{view_angle_cn}_逐帧审判结果.csv")
+    video_out = _concat_csvs([o["video_out"] for o in outputs],
+                             Path(args.analysis_out_dir) / f"{view_angle_cn}_视频级审判汇总.csv")
+    kf_frame_out = _concat_csvs([o["kf_frame_out"] for o in outputs],
+                                Path(args.keyframe_analysis_out_dir) / f"{view_angle_cn}_关键帧分析_逐帧详情.csv")
+    kf_video_out = _concat_csvs([o["kf_video_out"] for o in outputs],
+                                Path(args.keyframe_analysis_out_dir) / f"{view_angle_cn}_关键帧分析_视频汇总.csv")
+
+    swings_info = []
+    for sw, job, out in zip(swings, jobs, outputs):
+        swings_info.append({
+            "swing_id": job["swing_id"],
+            "start": sw["start"],
+            "end": sw["end"],
+            "events": job["events"],
+            "confidence": sw["confidence"],
+            "keyframe_dir": sw["out_dir"],
+            **{k: v for k, v in out.items() if k != "swing_id"},
+        })
+    swings_json = Path(args.analysis_out_dir) / "swings.json"
+    with open(swings_json, "w", encoding="utf-8") as f:
+        json.dump({"video_id": video_id, "view": args.view, "swings": swings_info}, f, ensure_ascii=False, indent=2)
+
+    print("\n========= 多挥杆判定 =========")
+    for info in swings_info:
+        print(f"{info['swing_id']} [{info['start']}, {info['end']}): 视频判定={info['verdict']}, 关键帧判定={info['kf_verdict']}")
+    print(f"挥杆切分结果: {swings_json}")
+
+    return {
+        "video_id": args.video_id,
+        "view": args.view,
+        "events": [info["events"] for info in swings_info],
+        "keyframe_dir": sw_result["out_dir"],
+        "keypoints": None,
+        "frame_out": frame_out,
+        "video_out": video_out,
+        "kf_frame_out": kf_frame_out,
+        "kf_video_out": kf_video_out,
+        "visualization": None,
+        "skeleton": None,
+        "transcoded": transcoded,
+        "swings": swings_info,
+        "swings_json": str(swings_json),
+    }
 
-    args = parser.parse_args()
+
+def main(argv=None):
+    """运行完整分析流程；argv 为 None 时读取命令行参数。返回各阶段输出路径字典。"""
+    args = build_arg_parser().parse_args(argv)
     
     # 标准化view参数 - 将中文转换为英文
     view_mapping = {
@@ -56,12 +458,12 @@ def main():
     # 保存中文视角用于文件命名
     view_angle_cn = "侧面" if args.view == "side" else "正面"
 
-    root = Path(__file__).resolve().parent
-    extract_dir = root / "Extract_key_frames"
-    keypoint_dir = root / "Keypoint_detection"
-    analyze_dir = root / "analyze"
-    keyframe_analysis_dir = root / "Keyframe_analysis"
-    visualization_dir = root / "visualization"
+    dirs = _stage_dirs()
+    extract_dir = dirs["extract"]
+    keypoint_dir = dirs["keypoint"]
+    analyze_dir = dirs["analyze"]
+    keyframe_analysis_dir = dirs["keyframe_analysis"]
+    visualization_dir = dirs["visualization"]
 
     _add_sys_path(extract_dir)
     _add_sys_path(keypoint_dir)
@@ -69,23 +471,11 @@ def main():
     _add_sys_path(keyframe_analysis_dir)
     _add_sys_path(visualization_dir)
 
-    # -------------------- 1) Keyframes --------------------
-    try:
-        import Extract_key_frames as kf
-    except Exception as e:
-        if isinstance(e, ModuleNotFoundError):
-            missing = getattr(e, "name", None)
-            if missing in {"cv2", "torch", "torchvision"}:
-                raise RuntimeError(
-                    f"关键帧提取依赖缺失：{missing}。\n"
-                    "请先安装依赖：pip install opencv-python torch torchvision\n"
-                    "（或用 conda 安装对应包），再重试。"
-                ) from e
-        raise RuntimeError(
-            "无法导入关键帧提取模块。请确认 Extract_key_frames/Extract_key_frames.py 及其依赖存在。"
-        ) from e
+    kf = _import_keyframe_module()
+    kp = _import_keypoint_module()
+    if args.stage_workers > 1:
+        _limit_threads()
 
-    print("[1/4] 关键帧提取中...")
     kf_weights = args.kf_weights
 
     if not Path(kf_weights).exists():
@@ -94,86 +484,140 @@ def main():
             "请通过 --kf_weights 指定正确的 .pth.tar 路径。"
         )
 
-    kf_result = kf.extract_key_frames(
-        video_path=args.video_path,
-        weights=kf_weights,
-        seq_length=args.kf_seq_length,
-        num_events=args.kf_num_events,
-        decode=args.kf_decode,
-        height=args.kf_height,
-        width=args.kf_width,
-        output_root=str(extract_dir / "output"),
-    )
-    print(f"  - 关键帧图片输出目录: {kf_result['out_dir']}")
-    print(f"  - 事件帧序号: {kf_result['events']}")
-    
-    # 保存events到JSON文件供后续使用
-    events_json_path = Path(kf_result['out_dir']) / 'events.json'
-    with open(events_json_path, 'w', encoding='utf-8') as f:
-        # 将numpy数组转换为Python列表
-        events_list = kf_result['events'].tolist() if hasattr(kf_result['events'], 'tolist') else list(kf_result['events'])
-        json.dump({'events': events_list, 'num_events': kf_result.get('num_events', 8)}, f, indent=2)
-    print(f"  - 事件信息已保存: {events_json_path}")
-
-    # -------------------- 2) Keypoints --------------------
-    try:
-        import export_all_keypoints as kp
-    except Exception as e:
-        if isinstance(e, ModuleNotFoundError):
-            missing = getattr(e, "name", None)
-            if missing in {"cv2", "mediapipe"}:
+    # -------------------- 结果缓存 / 断点续跑 --------------------
+    # 视频内容哈希 + 阶段参数 命中的阶段直接复用，不再解码 / 推理
+    import numpy as np
+    import result_cache
+    import stage_manifest as sm
+
+    cache = result_cache.get_cache() if args.cache else None
+    cache_keys = {}
+    if cache is not None or not args.multi_swing:
+        cache_keys = _cache_keys(args, result_cache.file_sha256(args.video_path))
+
+    # 本视频输出目录下的阶段完成清单：输入未变且输出未被改动的阶段直接复用
+    manifest = None
+    resumed = {}
+    plan = {s: sm.AUTO for s in sm.STAGES}
+    if not args.multi_swing:
+        plan = sm.plan_stages(args.from_stage, args.only_stage)
+        if args.kp_sampling == "adaptive" and plan["keypoints"] == sm.RUN and plan["keyframes"] == sm.OPTIONAL:
+            # 自适应采样依赖关键帧事件：只运行关键点检测时必须能复用关键帧结果
+            plan["keyframes"] = sm.REQUIRE
+        manifest = sm.StageManifest(args.analysis_out_dir)
+        stage_inputs = _manifest_inputs(args, cache_keys)
+        for stage in sm.STAGES:
+            if plan[stage] == sm.RUN:
+                continue
+            outputs = manifest.lookup(stage, stage_inputs[stage])
+            if outputs is not None:
+                resumed[stage] = outputs
+                print(f"[断点续跑] 复用已完成阶段: {stage}")
+            elif plan[stage] == sm.REQUIRE:
                 raise RuntimeError(
-                    f"关键点检测依赖缺失：{missing}。\n"
-                    "请先安装依赖：pip install opencv-python mediapipe\n"
-                    "（或用 conda 安装对应包），再重试。"
-                ) from e
-        raise RuntimeError(
-            "无法导入关键点检测模块。请确认已安装 mediapipe / opencv / pandas 等依赖，并且 Keypoint_detection/export_all_keypoints.py 存在。"
-        ) from e
+                    f"阶段 {stage} 没有可复用的结果，无法只运行 {args.only_stage}。\n"
+                    "请先完整运行一次，或改用 --from_stage。"
+                )
+    elif args.from_stage or args.only_stage:
+        print("[断点续跑] 多挥杆模式不支持 --from_stage / --only_stage，按完整流程运行")
+    run = {s: s not in resumed and plan[s] != sm.OPTIONAL for s in sm.STAGES}
+    # --from_stage / --only_stage 指定重跑的阶段不读结果缓存（仍写入），保证真正重新计算
+    cached = {s: cache is not None and plan[s] != sm.RUN for s in sm.STAGES}
+
+    cached_streamer = None
+    cached_kp_entry = None
+    transcoded = None
+    if args.transcode and manifest is not None:
+        outputs = manifest.lookup("transcode", stage_inputs["transcode"])
+        if outputs is not None:
+            transcoded = outputs["transcoded"]
+            print(f"[断点续跑] 复用转码视频: {transcoded}")
+    if cache is not None:
+        entry = cache.get("swingnet", cache_keys["swingnet"]) if run["keyframes"] and cached["keyframes"] else None
+        if entry is not None and (entry / "probs.npy").exists():
+            meta = cache.meta(entry)
+            cached_streamer = kf.CachedProbs(np.load(entry / "probs.npy"), meta.get("num_events", args.kf_num_events))
+            print("[缓存] 命中 SwingNet 事件概率")
+        if not args.multi_swing and run["keypoints"] and cached["keypoints"]:
+            cached_kp_entry = cache.get("keypoints", cache_keys["keypoints"])
+            if cached_kp_entry is not None:
+                print("[缓存] 命中关键点")
+        if args.transcode and not transcoded:
+            stem = Path(args.video_path).with_name(f"{Path(args.video_path).stem}_web")
+            transcoded = _cached_file(cache, "transcode", cache_keys["transcode"], "transcoded", str(stem))
+            if transcoded:
+                print(f"[缓存] 命中转码视频: {transcoded}")
+
+    need_swingnet = run["keyframes"] and cached_streamer is None
+    # 分段并行检测时各进程自行解码自己的片段；自适应采样要等关键帧事件算出后再检测。两者都不订阅共用解码
+    need_pose = (not args.multi_swing and run["keypoints"] and cached_kp_entry is None
+                 and args.kp_workers <= 1 and args.kp_sampling != "adaptive")
+    need_transcode = args.transcode and not transcoded
+
+    # -------------------- 0) Shared decode --------------------
+    # 视频只解码一遍，同时喂给 SwingNet 流式推理、MediaPipe 与转码（缓存命中的阶段不再订阅）
+    swing_streamer = cached_streamer
+    pose_consumer = None
+    video_meta = None
+    if args.shared_decode and (need_swingnet or need_pose or need_transcode):
+        from frame_source import FrameSource
+        from video_utils import TranscodeSink
+
+        print("[0/4] 解码视频（关键帧推理 / 关键点检测共用）...")
+        source = FrameSource(args.video_path)
+        if need_swingnet:
+            swing_streamer = source.subscribe(kf.make_swingnet_streamer(
+                kf_weights,
+                num_events=args.kf_num_events,
+                seq_length=args.kf_seq_length,
+                height=args.kf_height,
+                width=args.kf_width,
+            ))
+        if need_pose:
+            # 多挥杆模式下关键点只在切分出的挥杆片段上检测，不在这里跑整段视频
+            pose_consumer = source.subscribe(kp.make_pose_consumer(
+                args.video_path,
+                scale=args.kp_scale,
+                model_complexity=args.kp_model_complexity,
+                video_id=args.video_id
+            ))
+        transcoder = source.subscribe(TranscodeSink(args.video_path)) if need_transcode else None
+        video_meta = source.run(threaded=args.stage_workers > 1, queue_size=config.PIPELINE_CONFIG['FRAME_QUEUE'])
+        if transcoder is not None:
+            transcoded = transcoder.output_path
+    elif need_transcode:
+        from video_utils import convert_video_to_compatible_format
+        transcoded = convert_video_to_compatible_format(args.video_path)
+
+    if cache is not None:
+        if need_swingnet and swing_streamer is not None:
+            cache.put("swingnet", cache_keys["swingnet"], meta={"num_events": swing_streamer.num_events},
+                      writer=lambda d: np.save(d / "probs.npy", swing_streamer.probs()))
+        if need_transcode and transcoded:
+            cache.put("transcode", cache_keys["transcode"], files={f"transcoded{Path(transcoded).suffix}": transcoded})
+    if manifest is not None and need_transcode and transcoded:
+        manifest.record("transcode", stage_inputs["transcode"], {"transcoded": transcoded}, files=[transcoded])
+
+    if args.multi_swing:
+        return _run_multi_swing(args, kf, swing_streamer, transcoded)
+
+    # -------------------- 1-5) 阶段依赖图 --------------------
+    # keyframes 与 keypoints 互不依赖；analysis 依赖 keypoints；keyframe_analysis 依赖两者；
+    # 可视化视频依赖 analysis，骨架视频只依赖 keypoints。stage_workers > 1 时互不依赖的阶段并行执行
+    from stage_graph import StageGraph
 
     kp_out_dir = args.kp_output_dir
+    # 与 make_pose_consumer 一致：未指定 video_id 时取视频文件名
+    kp_video_id = args.video_id or Path(args.video_path).stem
+    # 判定结果中的视频ID（run_analysis 会去掉 .mp4 后缀）
+    result_video_id = str(kp_video_id).replace('.mp4', '')
 
-    print("[2/4] 关键点检测中...")
-    keypoints_csv = kp.process_video(
-        args.video_path,
-        kp_out_dir,
-        scale=args.kp_scale,
-        model_complexity=args.kp_model_complexity,
-        video_id=args.video_id
-    )
-    if not keypoints_csv:
-        raise RuntimeError("关键点检测未生成CSV（process_video 返回 None）。")
-    print(f"  - 关键点CSV: {keypoints_csv}")
-
-    # -------------------- 3) Analysis --------------------
     try:
         import run_single_analysis as analysis
     except Exception as e:
         raise RuntimeError(
             "无法导入运动分析模块。请确认 analyze/run_single_analysis.py 及相关标准判断脚本存在。"
         ) from e
-
-    analysis_out_dir = args.analysis_out_dir
-
-    # 确定标准文件路径
-    if args.std_csv:
-        std_csv_path = args.std_csv
-    else:
-        if args.view == "side":
-            std_csv_path = config.ANALYSIS_CONFIG['STD_SIDE_PATH']
-        else:
-            std_csv_path = config.ANALYSIS_CONFIG['STD_FRONT_PATH']
-
-    print("[3/4] 运动分析与缺陷判定中...")
-    frame_out, video_out, summary_df = analysis.run_analysis(
-        view=args.view,
-        input_csv=keypoints_csv,
-        std_csv=std_csv_path,
-        out_dir=analysis_out_dir,
-    )
-
-
-    # -------------------- 4) Keyframe Analysis --------------------
     try:
         import run_keyframe_analysis as kfa
     except Exception as e:
@@ -181,31 +625,308 @@ def main():
             "无法导入关键帧分析模块。请确认 Keyframe_analysis/run_keyframe_analysis.py 存在且依赖已安装。"
         ) from e
 
+    analysis_out_dir = args.analysis_out_dir
     keyframe_out_dir = args.keyframe_analysis_out_dir
-
-    # 侧面和正面分别调用对应的关键帧分析
-    if args.view == "side":
-        kf_std_csv = config.KEYFRAME_ANALYSIS_CONFIG['STD_SIDE_PATH']
-        print("[4/4] 关键帧幅度分析中...（侧面）")
-        kf_frame_out, kf_video_out, kf_summary_df = kfa.run_keyframe_analysis(
-            view="side",
-            input_csv=keypoints_csv,
-            out_dir=keyframe_out_dir,
-            events=kf_result.get("events"),
-            num_events=int(kf_result.get("num_events") or 8),
-            std_csv=kf_std_csv,
-        )
-    else:
-        kf_std_csv = config.KEYFRAME_ANALYSIS_CONFIG['STD_FRONT_PATH']
-        print("[4/4] 关键帧幅度分析中...（正面）")
-        kf_frame_out, kf_video_out, kf_summary_df = kfa.run_keyframe_analysis(
-            view="front",
-            input_csv=keypoints_csv,
-            out_dir=keyframe_out_dir,
-            events=kf_result.get("events"),
-            num_events=int(kf_result.get("num_events") or 8),
-            std_csv=kf_std_csv,
+    analysis_names = [f"{view_angle_cn}_逐帧审判结果.csv", f"{view_angle_cn}_视频级审判汇总.csv"]
+    kfa_names = [f"{view_angle_cn}_关键帧分析_逐帧详情.csv", f"{view_angle_cn}_关键帧分析_视频汇总.csv"]
+
+    def stage_keyframes():
+        """1) 关键帧提取，返回 {out_dir, events(列表), num_events}；跳过时返回 None。"""
+        if "keyframes" in resumed:
+            print("[1/4] 关键帧提取（复用上次结果）")
+            return dict(resumed["keyframes"])
+        if not run["keyframes"]:
+            print("[1/4] 关键帧提取（跳过）")
+            return None
+
+        started = time.perf_counter()
+        print("[1/4] 关键帧提取中...")
+        kf_result = kf.extract_key_frames(
+            video_path=args.video_path,
+            weights=kf_weights,
+            seq_length=args.kf_seq_length,
+            num_events=args.kf_num_events,
+            decode=args.kf_decode,
+            height=args.kf_height,
+            width=args.kf_width,
+            output_root=str(extract_dir / "output"),
+            streamer=swing_streamer,
         )
+        if cache is not None and swing_streamer is None:
+            # 未共用解码时 extract_key_frames 自行推理，结果在这里写入缓存
+            cache.put("swingnet", cache_keys["swingnet"], meta={"num_events": kf_result["num_events"]},
+                      writer=lambda d: np.save(d / "probs.npy", kf_result["probs"]))
+        print(f"  - 关键帧图片输出目录: {kf_result['out_dir']}")
+        print(f"  - 事件帧序号: {kf_result['events']}")
+
+        # 保存events到JSON文件供后续使用
+        events_json_path = Path(kf_result['out_dir']) / 'events.json'
+        with open(events_json_path, 'w', encoding='utf-8') as f:
+            # 将numpy数组转换为Python列表
+            events_list = kf_result['events'].tolist() if hasattr(kf_result['events'], 'tolist') else list(kf_result['events'])
+            json.dump({'events': events_list, 'num_events': kf_result.get('num_events', 8)}, f, indent=2)
+        print(f"  - 事件信息已保存: {events_json_path}")
+        outputs = {"out_dir": str(kf_result['out_dir']), "events": events_list, "num_events": int(kf_result.get('num_events') or 8)}
+        manifest.record("keyframes", stage_inputs["keyframes"], outputs,
+                        files=[events_json_path], seconds=time.perf_counter() - started)
+        return outputs
+
+    def stage_keypoints(kf_result=None):
+        """2) 关键点检测，返回 keypoints.npy 路径；跳过时返回 None。自适应采样时 kf_result 提供关键帧事件。"""
+        if "keypoints" in resumed:
+            print("[2/4] 关键点检测（复用上次结果）")
+            return resumed["keypoints"]["keypoints"]
+        if not run["keypoints"]:
+            print("[2/4] 关键点检测（跳过）")
+            return None
+
+        import keypoint_store
+
+        started = time.perf_counter()
+        print("[2/4] 关键点检测中...")
+        if cached_kp_entry is not None:
+            interp_path = cached_kp_entry / keypoint_store.INTERPOLATED_FILE
+            keypoints_path = keypoint_store.save_keypoints(
+                kp_out_dir,
+                kp_video_id,
+                np.load(cached_kp_entry / keypoint_store.FRAMES_FILE),
+                np.load(cached_kp_entry / keypoint_store.KEYPOINTS_FILE),
+                export_csv=config.KEYPOINT_CONFIG['EXPORT_CSV'],
+                interpolated=np.load(interp_path) if interp_path.exists() else None,
+            )
+        elif pose_consumer is not None:
+            keypoints_path = kp.save_keypoints(pose_consumer, kp_out_dir)
+        else:
+            keypoints_path = kp.process_video(
+                args.video_path,
+                kp_out_dir,
+                scale=args.kp_scale,
+                model_complexity=args.kp_model_complexity,
+                video_id=args.video_id,
+                workers=args.kp_workers,
+                sampling=args.kp_sampling,
+                events=kf_result["events"] if kf_result else None,
+            )
+        if not keypoints_path:
+            raise RuntimeError("关键点检测未生成数据（process_video 返回 None）。")
+
+        kp_names = [keypoint_store.KEYPOINTS_FILE, keypoint_store.FRAMES_FILE, keypoint_store.INTERPOLATED_FILE]
+        kp_files = [keypoints_path] + [str(Path(keypoints_path).parent / name) for name in kp_names[1:]]
+        if cache is not None and cached_kp_entry is None:
+            cache.put("keypoints", cache_keys["keypoints"], files=dict(zip(kp_names, kp_files)))
+        manifest.record("keypoints", stage_inputs["keypoints"], {"keypoints": keypoints_path},
+                        files=kp_files, seconds=time.perf_counter() - started)
+        print(f"  - 关键点数据: {keypoints_path}")
+        return keypoints_path
+
+    # 本次计算得到的逐帧表（DataFrame），随结果返回给 app 直接入库，不必再读回 CSV；复用 / 命中缓存时为空
+    tables = {}
+
+    def stage_analysis(keypoints_path):
+        """3) 逐帧审判，返回 (frame_out, video_out, summary_df)。"""
+        if "analysis" in resumed:
+            import pandas as pd
+
+            print("[3/4] 运动分析与缺陷判定（复用上次结果）")
+            frame_out, video_out = resumed["analysis"]["frame_out"], resumed["analysis"]["video_out"]
+            return frame_out, video_out, pd.read_csv(video_out, encoding="utf-8-sig")
+        if not run["analysis"]:
+            print("[3/4] 运动分析与缺陷判定（跳过）")
+            return None, None, None
+
+        started = time.perf_counter()
+        cached_tables = None
+        if cached["analysis"]:
+            cached_tables = _cached_tables(cache, "analysis", cache_keys["analysis"], analysis_out_dir,
+                                           analysis_names, result_video_id)
+
+        print("[3/4] 运动分析与缺陷判定中...")
+        if cached_tables is not None:
+            import pandas as pd
+
+            print("[缓存] 命中逐帧审判结果")
+            frame_out, video_out = cached_tables
+            summary_df = pd.read_csv(video_out, encoding="utf-8-sig")
+        else:
+            frame_out, video_out, summary_df, tables["frame"] = analysis.run_analysis(
+                view=args.view,
+                input_csv=keypoints_path,
+                std_csv=_analysis_std_csv(args),
+                out_dir=analysis_out_dir,
+                return_frames=True,
+            )
+            if cache is not None:
+                cache.put("analysis", cache_keys["analysis"], files=dict(zip(analysis_names, [frame_out, video_out])))
+        manifest.record("analysis", stage_inputs["analysis"], {"frame_out": frame_out, "video_out": video_out},
+                        files=[frame_out, video_out], seconds=time.perf_counter() - started)
+        return frame_out, video_out, summary_df
+
+    def stage_keyframe_analysis(kf_result, keypoints_path):
+        """4) 关键帧幅度分析，返回 (kf_frame_out, kf_video_out, kf_summary_df)。"""
+        if "keyframe_analysis" in resumed:
+            import pandas as pd
+
+            print(f"[4/4] 关键帧幅度分析（{view_angle_cn}，复用上次结果）")
+            kf_frame_out = resumed["keyframe_analysis"]["kf_frame_out"]
+            kf_video_out = resumed["keyframe_analysis"]["kf_video_out"]
+            return kf_frame_out, kf_video_out, pd.read_csv(kf_video_out, encoding="utf-8-sig")
+        if not run["keyframe_analysis"]:
+            print("[4/4] 关键帧幅度分析（跳过）")
+            return None, None, None
+
+        started = time.perf_counter()
+        cached_kf_tables = None
+        if cached["keyframe_analysis"]:
+            cached_kf_tables = _cached_tables(cache, "keyframe_analysis", cache_keys["keyframe_analysis"],
+                                              keyframe_out_dir, kfa_names, kp_video_id)
+
+        # 侧面和正面分别调用对应的关键帧分析
+        if cached_kf_tables is not None:
+            import pandas as pd
+
+            print(f"[4/4] 关键帧幅度分析中...（{view_angle_cn}，命中缓存）")
+            kf_frame_out, kf_video_out = cached_kf_tables
+            kf_summary_df = pd.read_csv(kf_video_out, encoding="utf-8-sig")
+        else:
+            print(f"[4/4] 关键帧幅度分析中...（{view_angle_cn}）")
+            kf_frame_out, kf_video_out, kf_summary_df, kf_frame_df = kfa.run_keyframe_analysis(
+                view=args.view,
+                input_csv=keypoints_path,
+                out_dir=keyframe_out_dir,
+                events=np.asarray(kf_result.get("events")),
+                num_events=int(kf_result.get("num_events") or 8),
+                std_csv=_keyframe_std_csv(args.view),
+                return_frames=True,
+            )
+            if kf_frame_df is not None:
+                tables["kf_frame"] = kf_frame_df
+            if cache is not None and kf_frame_out:
+                cache.put("keyframe_analysis", cache_keys["keyframe_analysis"],
+                          files=dict(zip(kfa_names, [kf_frame_out, kf_video_out])))
+        if kf_frame_out:
+            manifest.record("keyframe_analysis", stage_inputs["keyframe_analysis"],
+                            {"kf_frame_out": kf_frame_out, "kf_video_out": kf_video_out},
+                            files=[kf_frame_out, kf_video_out], seconds=time.perf_counter() - started)
+        return kf_frame_out, kf_video_out, kf_summary_df
+
+    # 5) 可视化 / 骨架视频（可选）
+    render = run["visualization"] and (args.enable_visualization or args.generate_skeleton)
+    if "visualization" in resumed:
+        print("\n[5/6] 可视化 / 骨架视频（复用上次结果）")
+    elif render:
+        try:
+            import generate_visualization_video as viz
+        except Exception as e:
+            print(f"\n[警告] 无法导入可视化模块: {e}")
+            print("跳过可视化视频生成。")
+            render = False
+    cached_viz = cached_skeleton = None
+    if render:
+        viz_out_dir = args.viz_output_dir
+        Path(viz_out_dir).mkdir(parents=True, exist_ok=True)
+
+        # 生成输出文件名
+        base_name = args.video_id or Path(args.video_path).stem
+        viz_stem = str(Path(viz_out_dir) / f"{base_name}_{view_angle_cn}_可视化")
+        skeleton_stem = str(Path(viz_out_dir) / f"{base_name}_{view_angle_cn}_skeleton")
+        if cached["visualization"]:
+            cached_viz = _cached_file(cache, "render", cache_keys["render"], "visualization", viz_stem)
+            cached_skeleton = _cached_file(cache, "render", cache_keys["render"], "skeleton", skeleton_stem)
+
+    def stage_visualization(keypoints_path, analysis_result):
+        """5a) 标准可视化视频，失败时返回 None。"""
+        if cached_viz:
+            print(f"\n[5a/6] 可视化视频命中缓存: {cached_viz}")
+            return cached_viz
+        viz_output = f"{viz_stem}.mp4"
+        print("\n[5a/6] 生成可视化视频中...")
+        try:
+            actual_viz_output = viz.generate_visualization_video(
+                video_path=args.video_path,
+                keypoints_csv=keypoints_path,
+                analysis_csv=analysis_result[0],
+                output_path=viz_output,
+                panel_width=args.viz_panel_width
+            )
+        except Exception as e:
+            print(f"[错误] 可视化视频生成失败: {e}")
+            return None
+        return actual_viz_output or viz_output
+
+    def stage_skeleton(keypoints_path):
+        """5b) 纯骨架视频（白底），失败时返回 None。"""
+        if cached_skeleton:
+            print(f"\n[5b/6] 骨架视频命中缓存: {cached_skeleton}")
+            return cached_skeleton
+        skeleton_output = f"{skeleton_stem}.mp4"
+        print("\n[5b/6] 生成骨架视频中...")
+        try:
+            # 获取原视频尺寸和帧率（共用解码时已读取）
+            if video_meta is not None:
+                video_width = video_meta["width"]
+                video_height = video_meta["height"]
+                video_fps = video_meta["fps"]
+            else:
+                import cv2
+                cap = cv2.VideoCapture(args.video_path)
+                video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+                video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+                video_fps = cap.get(cv2.CAP_PROP_FPS)
+                cap.release()
+
+            actual_skeleton_output = viz.generate_skeleton_only_video(
+                keypoints_csv=keypoints_path,
+                output_path=skeleton_output,
+                video_width=video_width,
+                video_height=video_height,
+                fps=video_fps
+            )
+        except Exception as e:
+            print(f"[错误] 骨架视频生成失败: {e}")
+            return None
+        return actual_skeleton_output or skeleton_output
+
+    graph = StageGraph(args.stage_workers)
+    graph.add("keyframes", stage_keyframes)
+    graph.add("keypoints", stage_keypoints, deps=("keyframes",) if args.kp_sampling == "adaptive" else ())
+    graph.add("analysis", stage_analysis, deps=("keypoints",))
+    graph.add("keyframe_analysis", stage_keyframe_analysis, deps=("keyframes", "keypoints"))
+    if render and args.enable_visualization:
+        graph.add("visualization", stage_visualization, deps=("keypoints", "analysis"))
+    if render and args.generate_skeleton:
+        graph.add("skeleton", stage_skeleton, deps=("keypoints",))
+    stage_results = graph.run()
+    print("[流水线] 各阶段耗时: " + ", ".join(f"{name} {sec:.1f}s" for name, sec in graph.timings.items()))
+
+    kf_result = stage_results["keyframes"]
+    events_list = kf_result["events"] if kf_result else None
+    keypoints_path = stage_results["keypoints"]
+    frame_out, video_out, summary_df = stage_results["analysis"]
+    kf_frame_out, kf_video_out, kf_summary_df = stage_results["keyframe_analysis"]
+
+    viz_output = None
+    skeleton_output = None
+    if "visualization" in resumed:
+        viz_output = resumed["visualization"]["visualization"]
+        skeleton_output = resumed["visualization"]["skeleton"]
+    elif render:
+        viz_output = stage_results.get("visualization")
+        skeleton_output = stage_results.get("skeleton")
+        if cache is not None and ((viz_output and not cached_viz) or (skeleton_output and not cached_skeleton)):
+            files = {}
+            if viz_output and Path(viz_output).exists():
+                files[f"visualization{Path(viz_output).suffix}"] = viz_output
+            if skeleton_output and Path(skeleton_output).exists():
+                files[f"skeleton{Path(skeleton_output).suffix}"] = skeleton_output
+            if files:
+                cache.put("render", cache_keys["render"], files=files)
+
+        # 只有要求的视频都生成成功才记为完成，失败的话下次重跑只补这一步
+        if (viz_output or not args.enable_visualization) and (skeleton_output or not args.generate_skeleton):
+            seconds = max(graph.timings.get("visualization", 0.0), graph.timings.get("skeleton", 0.0))
+            manifest.record("visualization", stage_inputs["visualization"],
+                            {"visualization": viz_output, "skeleton": skeleton_output},
+                            files=[viz_output, skeleton_output], seconds=seconds)
 
     # Print final verdict
     verdict = None
@@ -216,6 +937,9 @@ def main():
         if "Top问题指标(按异常占比)" in summary_df.columns:
             top_issues = str(summary_df.iloc[0]["Top问题指标(按异常占比)"])
 
+    if summary_df is not None:
+        tables["summary"] = summary_df
+
     print("\n========= 最终判定 =========")
     print(f"视角(view): {args.view}")
     print(f"视频: {args.video_path}")
@@ -244,73 +968,6 @@ def main():
     if kf_top_issues:
         print(f"关键帧Top问题指标: {kf_top_issues}")
 
-    # -------------------- 5) Visualization (optional) --------------------
-    viz_output = None
-    skeleton_output = None
-    
-    if args.enable_visualization or args.generate_skeleton:
-        try:
-            import generate_visualization_video as viz
-        except Exception as e:
-            print(f"\n[警告] 无法导入可视化模块: {e}")
-            print("跳过可视化视频生成。")
-        else:
-            viz_out_dir = args.viz_output_dir
-            
-            Path(viz_out_dir).mkdir(parents=True, exist_ok=True)
-            
-            # 生成输出文件名
-            if args.video_id:
-                base_name = args.video_id
-            else:
-                base_name = Path(args.video_path).stem
-            
-            # 生成标准可视化视频
-            if args.enable_visualization:
-                viz_output = str(Path(viz_out_dir) / f"{base_name}_{view_angle_cn}_可视化.mp4")
-                
-                print("\n[5a/6] 生成可视化视频中...")
-                try:
-                    actual_viz_output = viz.generate_visualization_video(
-                        video_path=args.video_path,
-                        keypoints_csv=keypoints_csv,
-                        analysis_csv=frame_out,
-                        output_path=viz_output,
-                        panel_width=args.viz_panel_width
-                    )
-                    if actual_viz_output:
-                        viz_output = actual_viz_output
-                except Exception as e:
-                    print(f"[错误] 可视化视频生成失败: {e}")
-                    viz_output = None
-            
-            # 生成纯骨架视频（白底）
-            if args.generate_skeleton:
-                skeleton_output = str(Path(viz_out_dir) / f"{base_name}_{view_angle_cn}_skeleton.mp4")
-                
-                print("\n[5b/6] 生成骨架视频中...")
-                try:
-                    # 获取原视频尺寸和帧率
-                    import cv2
-                    cap = cv2.VideoCapture(args.video_path)
-                    video_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                    video_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                    video_fps = cap.get(cv2.CAP_PROP_FPS)
-                    cap.release()
-                    
-                    actual_skeleton_output = viz.generate_skeleton_only_video(
-                        keypoints_csv=keypoints_csv,
-                        output_path=skeleton_output,
-                        video_width=video_width,
-                        video_height=video_height,
-                        fps=video_fps
-                    )
-                    if actual_skeleton_output:
-                        skeleton_output = actual_skeleton_output
-                except Exception as e:
-                    print(f"[错误] 骨架视频生成失败: {e}")
-                    skeleton_output = None
-
     print("\n========= 输出文件 =========")
     print(f"逐帧结果: {frame_out}")
     print(f"视频级汇总: {video_out}")
@@ -321,6 +978,22 @@ def main():
     if skeleton_output:
         print(f"骨架视频: {skeleton_output}")
 
+    return {
+        "video_id": args.video_id,
+        "view": args.view,
+        "events": events_list,
+        "keyframe_dir": kf_result['out_dir'] if kf_result else None,
+        "keypoints": keypoints_path,
+        "frame_out": frame_out,
+        "video_out": video_out,
+        "kf_frame_out": kf_frame_out,
+        "kf_video_out": kf_video_out,
+        "visualization": viz_output,
+        "skeleton": skeleton_output,
+        "transcoded": transcoded,
+        "tables": tables,
+    }
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,72 @@
+"""
+阶段依赖图执行器
+run_full_analysis 中互不依赖的阶段（关键帧提取 / 关键点检测，可视化视频 / 骨架视频 等）在线程池中并行执行，
+端到端耗时约等于依赖图上最长的一条路径。
+
+    graph = StageGraph(max_workers=3)
+    graph.add("keypoints", detect)
+    graph.add("analysis", analyze, deps=("keypoints",))   # analyze(keypoints 的返回值)
+    results = graph.run()                                  # {阶段名: 返回值}
+
+torch 推理、MediaPipe 与 OpenCV 编解码在原生代码中会释放 GIL，用线程即可并行，
+模型与中间结果也不必跨进程传递。max_workers 为 1 时按添加顺序依次执行。
+"""
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class StageGraph:
+    def __init__(self, max_workers=1):
+        self.max_workers = max(1, int(max_workers or 1))
+        self.stages = {}
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, deps=()):
+        """添加阶段：fn 按 deps 顺序接收各上游阶段的返回值。"""
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"阶段 {name} 依赖的 {dep} 尚未添加")
+        self.stages[name] = (fn, tuple(deps))
+
+    def _call(self, name, results):
+        fn, deps = self.stages[name]
+        started = time.perf_counter()
+        value = fn(*(results[d] for d in deps))
+        with self._lock:
+            self.timings[name] = time.perf_counter() - started
+        return value
+
+    def run(self):
+        """执行全部阶段，返回 {阶段名: 返回值}；任一阶段出错时不再启动新阶段，等运行中的结束后抛出该错误。"""
+        results = {}
+        if self.max_workers == 1:
+            for name in self.stages:
+                results[name] = self._call(name, results)
+            return results
+
+        pending = dict(self.stages)
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as ex:
+            while pending or running:
+                if error is None:
+                    for name, (_fn, deps) in list(pending.items()):
+                        if all(d in results for d in deps):
+                            running[ex.submit(self._call, name, results)] = name
+                            del pending[name]
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        results[name] = fut.result()
+                    except Exception as e:
+                        print(f"[流水线] 阶段 {name} 失败: {e}")
+                        if error is None:
+                            error = e
+        if error is not None:
+            raise error
+        return results
@@ -0,0 +1,112 @@
+"""
+分阶段完成清单（断点续跑）
+run_full_analysis 每完成一个阶段，就在该视频的分析输出目录写入 stage_manifest.json：
+    {"stages": {阶段名: {"inputs": 输入哈希, "outputs": 输出, "files": {文件: [大小, 修改时间]},
+                         "seconds": 耗时, "finished": 完成时间}}}
+重跑时输入哈希一致且输出文件未被改动的阶段直接复用，例如可视化（第 5 步）失败后重试，
+不会再从关键帧提取开始重算。
+
+--from_stage X  X 及之后的阶段强制重跑，之前的阶段有可复用结果就复用
+--only_stage X  只重跑 X，它依赖的上游阶段必须已有可复用结果，其余阶段能复用就复用、否则跳过
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+MANIFEST_FILE = "stage_manifest.json"
+
+# 单挥杆流程的阶段（按执行顺序）及各阶段依赖的上游阶段
+STAGES = ("keyframes", "keypoints", "analysis", "keyframe_analysis", "visualization")
+DEPENDS = {
+    "keyframes": (),
+    "keypoints": (),
+    "analysis": ("keypoints",),
+    "keyframe_analysis": ("keyframes", "keypoints"),
+    "visualization": ("keypoints", "analysis"),
+}
+
+# 阶段执行方式
+RUN = "run"            # 强制重跑
+AUTO = "auto"          # 有可复用结果就复用，否则重跑
+REQUIRE = "require"    # 必须复用，没有可复用结果时报错
+OPTIONAL = "optional"  # 有可复用结果就复用，否则跳过
+
+
+def plan_stages(from_stage=None, only_stage=None):
+    """根据 --from_stage / --only_stage 得到 {阶段: 执行方式}。"""
+    if from_stage and only_stage:
+        raise ValueError("--from_stage 与 --only_stage 不能同时使用。")
+    for name in (from_stage, only_stage):
+        if name and name not in STAGES:
+            raise ValueError(f"未知阶段: {name}（可选: {', '.join(STAGES)}）")
+
+    if only_stage:
+        return {
+            s: RUN if s == only_stage else REQUIRE if s in DEPENDS[only_stage] else OPTIONAL
+            for s in STAGES
+        }
+    if from_stage:
+        start = STAGES.index(from_stage)
+        return {s: RUN if i >= start else AUTO for i, s in enumerate(STAGES)}
+    return {s: AUTO for s in STAGES}
+
+
+def _file_stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class StageManifest:
+    """某个视频输出目录下的阶段完成清单。"""
+
+    def __init__(self, out_dir):
+        self.path = Path(out_dir) / MANIFEST_FILE
+        self.stages = {}
+        # 并行执行的阶段可能同时记录完成
+        self._lock = threading.RLock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.stages = json.load(f).get("stages", {})
+        except (OSError, ValueError, AttributeError):
+            self.stages = {}
+
+    def lookup(self, stage, inputs):
+        """输入哈希一致且记录的输出文件都未改动时返回该阶段的输出，否则返回 None。"""
+        entry = self.stages.get(stage)
+        if not entry or entry.get("inputs") != inputs:
+            return None
+        for path, stat in entry.get("files", {}).items():
+            if _file_stat(path) != stat:
+                return None
+        return entry.get("outputs")
+
+    def record(self, stage, inputs, outputs, files=(), seconds=None):
+        """记录阶段完成并立即落盘（之后进程崩溃也不丢失）。"""
+        entry = {
+            "inputs": inputs,
+            "outputs": outputs,
+            "files": {str(p): _file_stat(p) for p in files if p and _file_stat(p) is not None},
+            "seconds": None if seconds is None else round(float(seconds), 3),
+            "finished": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with self._lock:
+            self.stages[stage] = entry
+            self.save()
+
+    def save(self):
+        """先写临时文件再 os.replace，避免中途退出留下半截 JSON。"""
+        try:
+            with self._lock:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(prefix=".stage_manifest_", suffix=".json", dir=self.path.parent)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"stages": self.stages}, f, ensure_ascii=False, indent=2)
+                os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[断点续跑] 阶段清单写入失败 {self.path}: {e}")
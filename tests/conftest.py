@@ -0,0 +1,8 @@
+"""测试公共设置：把仓库根目录与 analyze/ 加入 sys.path（与各脚本运行时的导入方式一致）。"""
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for p in (ROOT, ROOT / "analyze"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
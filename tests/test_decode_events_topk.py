@@ -0,0 +1,47 @@
+"""decode_events_topk 多挥杆解码的回归用例。"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("cv2")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Extract_key_frames"))
+
+from Extract_key_frames import decode_events_topk  # noqa: E402
+
+NUM_EVENTS = 8
+
+
+def _three_swings():
+    """三次挥杆（Address 在第 50 / 250 / 450 帧，事件间隔 10 帧）；第一次 Address 最清晰，第三次后续事件最清晰。"""
+    probs = np.full((600, NUM_EVENTS + 1), 0.01)
+    for start, p_address, p_rest in ((50, 0.95, 0.6), (250, 0.8, 0.8), (450, 0.6, 0.95)):
+        probs[start, 0] = p_address
+        for i in range(1, NUM_EVENTS):
+            probs[start + 10 * i, i] = p_rest
+    return probs / probs.sum(axis=1, keepdims=True)
+
+
+def test_without_max_span_swings_merge():
+    events, _ = decode_events_topk(_three_swings(), NUM_EVENTS, top_k=5, min_gap=30, min_confidence=0.2)
+    # 不限跨度时第一次的 Address 与第三次的后续事件拼成一个序列
+    assert events.tolist() == [[50, 460, 470, 480, 490, 500, 510, 520]]
+
+
+def test_max_span_separates_swings():
+    events, scores = decode_events_topk(_three_swings(), NUM_EVENTS, top_k=5, min_gap=30,
+                                        min_confidence=0.2, max_span=150)
+    assert events[:, 0].tolist() == [50, 250, 450]
+    assert (events[:, -1] - events[:, 0] == 70).all()
+    assert (np.exp(scores / NUM_EVENTS) > 0.8).all()
+
+
+def test_large_max_span_matches_unlimited():
+    probs = np.random.default_rng(0).dirichlet(np.ones(NUM_EVENTS + 1), size=500)
+    a, sa = decode_events_topk(probs, NUM_EVENTS, top_k=6, min_gap=20)
+    b, sb = decode_events_topk(probs, NUM_EVENTS, top_k=6, min_gap=20, max_span=10 ** 6)
+    assert (a == b).all() and np.allclose(sa, sb)
+    c, _ = decode_events_topk(probs, NUM_EVENTS, top_k=6, min_gap=20, max_span=40)
+    assert (c[:, -1] - c[:, 0] <= 40).all()
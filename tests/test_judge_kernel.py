@@ -0,0 +1,242 @@
+"""judge_kernel 与原逐指标 / 逐帧审判实现的一致性测试。"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import judge_kernel as jk
+
+
+# ----------------------------------------------------------------------
+# 原实现（侧向 / 正面标准判断中的逐指标 mask 链、逐格 apply 与逐帧循环）
+# ----------------------------------------------------------------------
+def _grade_from_dev(v):
+    if pd.isna(v):
+        return np.nan
+    if v <= 0:
+        return 0
+    elif v <= 0.5:
+        return 1
+    else:
+        return 2
+
+
+def _frame_verdict(a_cnt, s):
+    if pd.isna(a_cnt) or pd.isna(s):
+        return np.nan
+    a_cnt = int(a_cnt)
+    s = float(s)
+    if a_cnt == 0 and s >= 90:
+        return "优秀"
+    if a_cnt == 0:
+        return "标准"
+    if a_cnt <= 2 and s >= 75:
+        return "基本标准"
+    return "不标准"
+
+
+def _judge_per_metric(X, lo, hi, weights, modes):
+    out = {"ok": [], "low_bad": [], "high_bad": [], "dev": [], "grade": []}
+    for j in range(X.shape[1]):
+        x = pd.Series(X[:, j])
+        if modes[j] == "abs_le":
+            thr = hi[j]
+            ok = x.abs() <= thr
+            low_bad = x.abs() > thr
+            high_bad = x.abs() > thr
+            dev = ((x.abs() - thr) / (thr + 1e-9)).clip(lower=0)
+        else:
+            ok = (x >= lo[j]) & (x <= hi[j])
+            low_bad = x < lo[j]
+            high_bad = x > hi[j]
+            width = (hi[j] - lo[j]) if (hi[j] - lo[j]) != 0 else 1e-9
+            dev = pd.Series(np.zeros(len(x)), dtype=float)
+            dev = dev.mask(low_bad, (lo[j] - x) / width)
+            dev = dev.mask(high_bad, (x - hi[j]) / width)
+            dev = dev.fillna(np.nan).clip(lower=0)
+        out["ok"].append(ok.to_numpy())
+        out["low_bad"].append(low_bad.to_numpy())
+        out["high_bad"].append(high_bad.to_numpy())
+        out["dev"].append(dev.to_numpy(dtype=float))
+        out["grade"].append(dev.apply(_grade_from_dev).to_numpy(dtype=float))
+    out = {k: np.stack(v, axis=1) for k, v in out.items()}
+
+    dev_mat = out["dev"]
+    mask = np.isfinite(dev_mat)
+    w_eff = np.where(mask, np.tile(np.asarray(weights, dtype=float), (len(X), 1)), 0.0)
+    denom = w_eff.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        wdev = np.where(denom > 0, (np.where(mask, dev_mat, 0.0) * w_eff).sum(axis=1) / denom, np.nan)
+    out["wdev"] = wdev
+    out["score"] = 100.0 * (1.0 - np.clip(wdev, 0.0, 1.0))
+    out["abnormal_cnt"] = np.nansum(out["grade"] == 2, axis=1).astype(int)
+    out["mild_cnt"] = np.nansum(out["grade"] == 1, axis=1).astype(int)
+    out["verdict"] = np.array([_frame_verdict(a, s) for a, s in zip(out["abnormal_cnt"], out["score"])], dtype=object)
+    return out
+
+
+def _streak_loop(bad, groups, min_streak):
+    """原 add_streak_filter：逐视频扫描连续异常段，只保留长度 >= min_streak 的段。"""
+    effective = np.zeros(len(bad), dtype=bool)
+    for g in pd.unique(groups):
+        inds = np.flatnonzero(groups == g)
+        seq = bad[inds]
+        start = None
+        for i, v in enumerate(seq):
+            if v and start is None:
+                start = i
+            if ((not v) or i == len(seq) - 1) and start is not None:
+                end = i if (not v) else i + 1
+                if end - start >= min_streak:
+                    effective[inds[start:end]] = True
+                start = None
+    return effective
+
+
+def _longest_loop(eff):
+    """原 video_level_summary 中的最长有效异常段。"""
+    longest = cur = 0
+    for v in eff:
+        cur = cur + 1 if v else 0
+        longest = max(longest, cur)
+    return longest
+
+
+def _assert_verdicts_equal(a, b):
+    a, b = np.asarray(a, dtype=object), np.asarray(b, dtype=object)
+    assert (pd.isna(a) == pd.isna(b)).all()
+    assert (a[~pd.isna(a)] == b[~pd.isna(b)]).all()
+
+
+# ----------------------------------------------------------------------
+# 夹具
+# ----------------------------------------------------------------------
+@pytest.fixture
+def metrics():
+    """含 NaN、边界值、零宽区间与 abs_le 规则的指标矩阵。"""
+    rng = np.random.default_rng(0)
+    T, M = 400, 6
+    lo = np.array([-1.0, 0.0, 2.0, 5.0, -0.5, 0.0])
+    hi = np.array([1.0, 10.0, 2.0, 9.0, 0.5, 3.0])  # 第 3 个指标零宽区间
+    modes = ["between", "between", "between", "between", "abs_le", "abs_le"]
+    weights = np.array([1.2, 1.0, 0.8, 1.0, 1.3, 0.5])
+    X = rng.normal(loc=(lo + hi) / 2, scale=np.maximum(hi - lo, 1.0), size=(T, M))
+    X[rng.random((T, M)) < 0.1] = np.nan
+    X[:5] = np.nan                      # 整帧缺失
+    X[5, :] = lo                        # 正好在下限
+    X[6, :] = hi                        # 正好在上限
+    X[7, 0] = hi[0] + 0.5 * (hi[0] - lo[0])   # 偏差正好 0.5（轻微 / 异常分界）
+    return X, lo, hi, weights, modes
+
+
+# ----------------------------------------------------------------------
+# 逐帧审判
+# ----------------------------------------------------------------------
+def test_judge_matrix_matches_per_metric(metrics):
+    X, lo, hi, weights, modes = metrics
+    got = jk.judge_matrix(X, lo, hi, weights, modes=modes)
+    ref = _judge_per_metric(X, lo, hi, weights, modes)
+
+    for key in ("ok", "low_bad", "high_bad"):
+        np.testing.assert_array_equal(got[key], ref[key], err_msg=key)
+    for key in ("dev", "grade", "wdev", "score"):
+        np.testing.assert_allclose(got[key], ref[key], rtol=1e-12, atol=1e-12, equal_nan=True, err_msg=key)
+    np.testing.assert_array_equal(got["abnormal_cnt"], ref["abnormal_cnt"])
+    np.testing.assert_array_equal(got["mild_cnt"], ref["mild_cnt"])
+    _assert_verdicts_equal(got["verdict"], ref["verdict"])
+
+
+def test_judge_matrix_all_missing_frame():
+    # between 的缺失值偏差为 0、abs_le 的为 NaN：只有 abs_le 指标时整帧缺失的评分与结论为 NaN
+    X = np.full((2, 2), np.nan)
+    lo, hi, weights = np.zeros(2), np.ones(2), np.ones(2)
+    for modes in (["abs_le", "abs_le"], ["between", "abs_le"]):
+        got = jk.judge_matrix(X, lo, hi, weights, modes=modes)
+        ref = _judge_per_metric(X, lo, hi, weights, modes)
+        np.testing.assert_allclose(got["score"], ref["score"], equal_nan=True)
+        _assert_verdicts_equal(got["verdict"], ref["verdict"])
+    assert pd.isna(jk.judge_matrix(X, lo, hi, weights, modes=["abs_le", "abs_le"])["verdict"]).all()
+
+
+def test_judge_matrix_default_modes_are_between(metrics):
+    X, lo, hi, weights, _ = metrics
+    got = jk.judge_matrix(X, lo, hi, weights)
+    ref = _judge_per_metric(X, lo, hi, weights, ["between"] * X.shape[1])
+    np.testing.assert_allclose(got["dev"], ref["dev"], equal_nan=True)
+    _assert_verdicts_equal(got["verdict"], ref["verdict"])
+
+
+def test_grade_deviation_matches_apply():
+    dev = np.array([np.nan, -1.0, 0.0, 1e-12, 0.25, 0.5, 0.5000001, 3.0])
+    expected = np.array([_grade_from_dev(v) for v in dev], dtype=float)
+    np.testing.assert_array_equal(jk.grade_deviation(dev), expected)
+
+
+def test_frame_verdicts_matches_loop():
+    abnormal = np.array([0, 0, 0, 1, 2, 2, 3, 0, 1])
+    score = np.array([90.0, 89.99, 0.0, 75.0, 75.0, 74.99, 100.0, np.nan, np.nan])
+    expected = [_frame_verdict(a, s) for a, s in zip(abnormal, score)]
+    _assert_verdicts_equal(jk.frame_verdicts(abnormal, score), expected)
+
+
+# ----------------------------------------------------------------------
+# 连续段
+# ----------------------------------------------------------------------
+STREAK_CASES = [
+    # (异常序列, 视频分组)
+    ([1, 1, 1, 0, 0, 1, 1, 0, 1, 1, 1, 1], [0] * 12),        # 开头 / 结尾都是达标的异常段
+    ([1, 1, 0, 0, 0, 0, 0, 1, 1], [0] * 9),                  # 开头 / 结尾的短段被过滤
+    ([1, 1, 1, 1], [0] * 4),                                 # 全部异常
+    ([0, 0, 0], [0] * 3),                                    # 没有异常
+    ([1], [0]),                                              # 只有一帧
+    ([], []),                                                # 空视频
+    ([0, 1, 1, 1, 1, 1, 0], [0, 0, 0, 1, 1, 1, 1]),          # 跨视频边界的连续段按视频拆开
+    ([1, 1, 1, 1, 1, 1], [0, 0, 1, 1, 1, 2]),                # 每个视频都从异常开始、以异常结束
+]
+
+
+def _offsets(groups):
+    return jk.group_offsets(np.asarray(groups, dtype=np.int64))[0]
+
+
+@pytest.mark.parametrize("bad,groups", STREAK_CASES)
+@pytest.mark.parametrize("min_streak", [1, 2, 3])
+def test_streak_mask_matches_loop(bad, groups, min_streak):
+    bad = np.asarray(bad, dtype=bool)
+    groups = np.asarray(groups, dtype=np.int64)
+    got = jk.streak_mask(bad, min_streak, _offsets(groups))
+    np.testing.assert_array_equal(got, _streak_loop(bad, groups, min_streak))
+
+
+@pytest.mark.parametrize("bad,groups", STREAK_CASES)
+def test_run_lengths_stay_inside_videos(bad, groups):
+    bad = np.asarray(bad, dtype=bool)
+    groups = np.asarray(groups, dtype=np.int64)
+    starts, ends = jk.run_lengths(bad, _offsets(groups))
+    covered = np.zeros(len(bad), dtype=bool)
+    for s, e in zip(starts, ends):
+        assert bad[s:e].all()
+        assert len(set(groups[s:e])) == 1
+        covered[s:e] = True
+    np.testing.assert_array_equal(covered, bad)
+
+
+@pytest.mark.parametrize("bad,groups", STREAK_CASES)
+def test_streak_stats_match_loop(bad, groups):
+    bad = np.asarray(bad, dtype=bool)
+    groups = np.asarray(groups, dtype=np.int64)
+    offsets = _offsets(groups)
+    longest, segments = jk.streak_stats(bad, offsets)
+    assert len(longest) == len(offsets) - 1
+    for g in range(len(offsets) - 1):
+        seq = bad[offsets[g]:offsets[g + 1]]
+        assert longest[g] == _longest_loop(seq)
+        assert segments[g] == int(np.sum(np.diff(seq.astype(int), prepend=0) == 1))
+
+
+def test_streak_mask_random_matches_loop():
+    rng = np.random.default_rng(3)
+    groups = np.sort(rng.integers(0, 6, size=500))
+    bad = rng.random(500) < 0.4
+    for min_streak in (1, 3, 5):
+        np.testing.assert_array_equal(jk.streak_mask(bad, min_streak, _offsets(groups)),
+                                      _streak_loop(bad, groups, min_streak))
@@ -0,0 +1,138 @@
+"""keypoint_store 二进制关键点存储与旧版 CSV 解析的测试（只依赖 NumPy / pandas）。"""
+import ast
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import keypoint_store as ks
+
+
+def _points(T, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.random((T, ks.NUM_LANDMARKS, 4)).astype(np.float32)
+    points[2] = np.nan  # 未检测到人体的帧
+    return points
+
+
+def _literal_eval_xyz(cell):
+    """旧版逐格解析（各指标脚本中的 parse_xyz）。"""
+    if pd.isna(cell):
+        return [np.nan] * 3
+    try:
+        x, y, z = ast.literal_eval(str(cell))
+        return [float(x), float(y), float(z)]
+    except Exception:
+        return [np.nan] * 3
+
+
+def test_save_load_round_trip(tmp_path):
+    points = _points(6)
+    frames = np.arange(100, 106)
+    path = ks.save_keypoints(tmp_path, "vid1", frames, points, meta={"fps": 30})
+
+    assert path == str(tmp_path / ks.KEYPOINTS_FILE)
+    assert not (tmp_path / ks.INTERPOLATED_FILE).exists()
+    kps = ks.load_keypoints(tmp_path)
+    assert kps.video_id == "vid1"
+    assert kps.frame_index.tolist() == frames.tolist()
+    np.testing.assert_array_equal(np.asarray(kps.points), points)
+    assert not kps.interpolated.any()
+
+
+def test_load_is_memory_mapped(tmp_path):
+    ks.save_keypoints(tmp_path, "vid1", np.arange(4), _points(4))
+    mapped = ks.load_keypoints(tmp_path / ks.KEYPOINTS_FILE)
+    assert isinstance(mapped.points, np.memmap)
+    assert not mapped.points.flags.writeable
+    loaded = ks.load_keypoints(tmp_path, mmap=False)
+    assert not isinstance(loaded.points, np.memmap)
+    np.testing.assert_array_equal(np.asarray(mapped.points), loaded.points)
+
+
+def test_interpolated_flags_round_trip_and_cleared(tmp_path):
+    interpolated = np.array([False, True, True, False])
+    ks.save_keypoints(tmp_path, "vid1", np.arange(4), _points(4), interpolated=interpolated)
+    assert ks.load_keypoints(tmp_path).interpolated.tolist() == interpolated.tolist()
+
+    # 同一目录改为逐帧检测后旧标记被清掉
+    ks.save_keypoints(tmp_path, "vid1", np.arange(4), _points(4))
+    assert not (tmp_path / ks.INTERPOLATED_FILE).exists()
+    assert not ks.load_keypoints(tmp_path).interpolated.any()
+
+
+def test_csv_export_reads_back(tmp_path):
+    points = _points(5)
+    ks.save_keypoints(tmp_path, "vid1", np.arange(5), points, export_csv=True)
+    kps = ks.load_keypoints(tmp_path / ks.LEGACY_CSV)
+    assert kps.frame_index.tolist() == list(range(5))
+    np.testing.assert_allclose(kps.xyz, points[:, :, :3], rtol=1e-6)
+    assert np.isnan(kps.points[:, :, 3]).all()
+
+
+def test_save_rejects_length_mismatch(tmp_path):
+    with pytest.raises(ValueError):
+        ks.save_keypoints(tmp_path, "vid1", np.arange(3), _points(4))
+
+
+def test_interpolate_skipped():
+    frames = np.array([0, 1, 2, 4, 5, 6])
+    points = np.zeros((6, ks.NUM_LANDMARKS, 4), dtype=np.float32)
+    points[:, :, 0] = frames[:, None]
+    points[5] = np.nan  # 最后一个已检测帧没有人体
+    sampled = np.array([True, False, True, False, True, True])
+
+    out, interpolated = ks.interpolate_skipped(frames, points, sampled)
+    assert interpolated.tolist() == (~sampled).tolist()
+    assert out[1, 0, 0] == pytest.approx(1.0)
+    # 按帧号而不是行号插值：帧 4 位于帧 2 与帧 5 之间
+    assert out[3, 0, 0] == pytest.approx(4.0)
+    assert np.isnan(out[5]).all()
+    np.testing.assert_array_equal(out[sampled][:2], points[sampled][:2])
+
+
+def test_interpolate_skipped_edges():
+    frames = np.arange(5)
+    points = np.ones((5, ks.NUM_LANDMARKS, 4), dtype=np.float32)
+    # 首尾没有另一侧的已检测帧时保持 NaN
+    out, _ = ks.interpolate_skipped(frames, points, np.array([False, True, True, True, False]))
+    assert np.isnan(out[0]).all() and np.isnan(out[4]).all()
+    assert not np.isnan(out[1:4]).any()
+    # 没有任何已检测帧
+    out, interpolated = ks.interpolate_skipped(frames, points, np.zeros(5, dtype=bool))
+    assert np.isnan(out).all() and interpolated.all()
+
+
+CELLS = [
+    "(0.1,0.2,0.3)", "(1e-3, -2, 3.5)", "(-0.5,2,-3)", "1,2,3", "[1,2,3]", " (1,2,3)",
+    "", None, np.nan, "()", "(1,2)", "(1,2,3,4)", "(a,b,c)", "(1,,3)", "(nan,nan,nan)", "(inf,1,2)", "(1,2,3)x",
+]
+
+
+@pytest.mark.parametrize("cell", CELLS)
+def test_parse_landmark_cell_matches_literal_eval(cell):
+    df = pd.DataFrame({"landmark_0": [cell, "(0.4,0.5,0.6)"]})
+    xyz = ks.parse_landmark_columns(df)
+    np.testing.assert_allclose(xyz[0, 0], _literal_eval_xyz(cell), equal_nan=True)
+    np.testing.assert_allclose(xyz[1, 0], [0.4, 0.5, 0.6])
+
+
+def test_parse_landmark_columns_matches_literal_eval():
+    # 多列混合合法与格式错误的单元格：长短不一的错误单元格不能让相邻单元格错位
+    rng = np.random.default_rng(1)
+    cells = rng.choice(np.array(CELLS, dtype=object), size=(40, 3))
+    df = pd.DataFrame(cells, columns=["landmark_0", "landmark_5", "landmark_32"])
+    xyz = ks.parse_landmark_columns(df)
+
+    assert xyz.shape == (40, ks.NUM_LANDMARKS, 3)
+    for col, lid in ((0, 0), (1, 5), (2, 32)):
+        expected = np.array([_literal_eval_xyz(c) for c in cells[:, col]])
+        np.testing.assert_allclose(xyz[:, lid], expected, equal_nan=True)
+    # 缺失的列全部为 NaN
+    assert np.isnan(xyz[:, 1]).all()
+
+
+def test_parse_landmark_columns_empty():
+    assert ks.parse_landmark_columns(pd.DataFrame({"landmark_0": []})).shape == (0, ks.NUM_LANDMARKS, 3)
+    xyz = ks.parse_landmark_columns(pd.DataFrame({"landmark_0": [np.nan, np.nan]}))
+    assert np.isnan(xyz).all()
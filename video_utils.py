@@ -2,6 +2,91 @@ import cv2
 import os
 import sys
 
+from frame_source import FrameSource
+
+# 转码策略列表（按优先级尝试）
+TRANSCODE_STRATEGIES = [
+    {'codec': 'avc1', 'ext': '.mp4', 'name': 'H.264'},
+    {'codec': 'vp80', 'ext': '.webm', 'name': 'VP8'},
+    {'codec': 'mp4v', 'ext': '.mp4', 'name': 'MPEG-4'}
+]
+
+
+def _remove_quietly(path):
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except:
+            pass
+
+
+class TranscodeSink:
+    """
+    转码订阅者：挂到 FrameSource 上，与其他阶段共用同一次解码写出浏览器兼容视频
+    on_start 时按策略顺序选择第一个能初始化的编码器，结束后 output_path 为成功的输出路径（失败为 None）
+    """
+
+    def __init__(self, input_path, output_dir=None, strategies=None):
+        directory = output_dir if output_dir else os.path.dirname(input_path)
+        self.name = os.path.splitext(os.path.basename(input_path))[0]
+        self.directory = directory
+        self.strategies = list(strategies or TRANSCODE_STRATEGIES)
+        self.writer = None
+        self.strategy = None
+        self.output_path = None
+        self.frame_count = 0
+        self.total_frames = 0
+
+    def on_start(self, meta):
+        width, height = meta['width'], meta['height']
+        fps = meta['fps']
+        self.total_frames = meta.get('frame_count', 0)
+        # 如果无法获取FPS，默认30
+        if fps <= 0 or fps > 120:
+            fps = 30.0
+        print(f"[转码] 视频信息: {width}x{height}, {fps:.2f} fps, {self.total_frames} frames")
+
+        for strategy in self.strategies:
+            # 如果原视频已经是该格式，且我们假设原视频可能不兼容，
+            # 我们仍然尝试转码，但文件名要区分
+            output_path = os.path.join(self.directory, f"{self.name}_web{strategy['ext']}")
+            print(f"[转码] 尝试策略: {strategy['name']} -> {os.path.basename(output_path)}")
+            try:
+                fourcc = cv2.VideoWriter_fourcc(*strategy['codec'])
+                out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+            except Exception as e:
+                print(f"[转码] 异常: {e}")
+                _remove_quietly(output_path)
+                continue
+            if not out.isOpened():
+                print(f"[转码] 无法初始化编码器: {strategy['name']}")
+                continue
+            self.writer = out
+            self.strategy = strategy
+            self.output_path = output_path
+            return
+
+    def on_frame(self, idx, frame):
+        if self.writer is None:
+            return
+        self.writer.write(frame)
+        self.frame_count += 1
+        if self.frame_count % 100 == 0:
+            print(f"  - 转码进度: {self.frame_count}/{self.total_frames}")
+
+    def on_end(self):
+        if self.writer is None:
+            return
+        self.writer.release()
+        self.writer = None
+        if self.frame_count > 0:
+            print(f"[转码] 成功: {self.output_path}")
+        else:
+            print(f"[转码] 失败: 生成了0帧")
+            _remove_quietly(self.output_path)
+            self.output_path = None
+
+
 def convert_video_to_compatible_format(input_path, output_dir=None):
     """
     将视频转换为浏览器兼容格式 (H.264/MP4 或 VP8/WEBM)
@@ -11,87 +96,27 @@ def convert_video_to_compatible_format(input_path, output_dir=None):
         print(f"[转码] 输入文件不存在: {input_path}")
         return None
 
-    # 生成输出路径
-    directory = output_dir if output_dir else os.path.dirname(input_path)
-    filename = os.path.basename(input_path)
-    name, ext = os.path.splitext(filename)
-    
-    # 策略列表
-    strategies = [
-        {'codec': 'avc1', 'ext': '.mp4', 'name': 'H.264'},
-        {'codec': 'vp80', 'ext': '.webm', 'name': 'VP8'},
-        {'codec': 'mp4v', 'ext': '.mp4', 'name': 'MPEG-4'}
-    ]
-    
-    cap = cv2.VideoCapture(input_path)
-    if not cap.isOpened():
-        print(f"[转码] 无法打开视频文件: {input_path}")
-        return None
-        
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    
-    # 如果无法获取FPS，默认30
-    if fps <= 0 or fps > 120:
-        fps = 30.0
-        
-    print(f"[转码] 视频信息: {width}x{height}, {fps:.2f} fps, {total_frames} frames")
-        
-    success_path = None
-    
-    for strategy in strategies:
-        # 如果原视频已经是该格式，且我们假设原视频可能不兼容，
-        # 我们仍然尝试转码，但文件名要区分
-        output_path = os.path.join(directory, f"{name}_web{strategy['ext']}")
-        
-        print(f"[转码] 尝试策略: {strategy['name']} -> {os.path.basename(output_path)}")
-        
+    strategies = list(TRANSCODE_STRATEGIES)
+    while strategies:
+        source = FrameSource(input_path)
+        sink = source.subscribe(TranscodeSink(input_path, output_dir, strategies=strategies))
         try:
-            fourcc = cv2.VideoWriter_fourcc(*strategy['codec'])
-            out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-            
-            if not out.isOpened():
-                print(f"[转码] 无法初始化编码器: {strategy['name']}")
-                continue
-                
-            # 重置读取位置
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            
-            frame_count = 0
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                out.write(frame)
-                frame_count += 1
-                
-                if frame_count % 100 == 0:
-                    print(f"  - 转码进度: {frame_count}/{total_frames}")
-            
-            out.release()
-            
-            if frame_count > 0:
-                print(f"[转码] 成功: {output_path}")
-                success_path = output_path
-                break
-            else:
-                print(f"[转码] 失败: 生成了0帧")
-                if os.path.exists(output_path):
-                    try:
-                        os.remove(output_path)
-                    except:
-                        pass
-                    
+            source.run()
+        except FileNotFoundError:
+            print(f"[转码] 无法打开视频文件: {input_path}")
+            return None
         except Exception as e:
             print(f"[转码] 异常: {e}")
-            if os.path.exists(output_path):
-                try:
-                    os.remove(output_path)
-                except:
-                    pass
-            continue
-            
-    cap.release()
-    return success_path
+            if sink.writer is not None:
+                sink.writer.release()
+            _remove_quietly(sink.output_path)
+            sink.output_path = None
+
+        if sink.output_path:
+            return sink.output_path
+        if sink.strategy is None:
+            # 所有编码器都无法初始化
+            return None
+        # 当前编码器写出 0 帧，换下一个策略重新解码
+        strategies = strategies[strategies.index(sink.strategy) + 1:]
+    return None
@@ -13,6 +13,10 @@ import pandas as pd
 import ast
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import keypoint_store
 
 # MediaPipe骨架连接定义 (33个关键点)
 POSE_CONNECTIONS = [
@@ -185,7 +189,7 @@ def generate_visualization_video(
     
     参数:
         video_path: 原始视频路径
-        keypoints_csv: 关键点CSV文件路径
+        keypoints_csv: 关键点文件路径（keypoints.npy / 所在目录 / 旧版CSV）
         analysis_csv: 分析结果CSV文件路径
         output_path: 输出视频路径
         panel_width: 左侧信息面板宽度
@@ -198,13 +202,13 @@ def generate_visualization_video(
     
     # 读取数据
     try:
-        keypoints_df = pd.read_csv(keypoints_csv)
+        keypoints = keypoint_store.load_keypoints(keypoints_csv)
         analysis_df = pd.read_csv(analysis_csv)
     except Exception as e:
-        print(f"[错误] 读取CSV文件失败: {e}")
+        print(f"[错误] 读取数据文件失败: {e}")
         return None
     
-    print(f"  - 关键点数据: {len(keypoints_df)} 帧")
+    print(f"  - 关键点数据: {len(keypoints)} 帧")
     print(f"  - 分析数据: {len(analysis_df)} 帧")
     
     # 打开原视频
@@ -304,23 +308,9 @@ def generate_visualization_video(
             break
         
         # 获取当前帧的关键点数据
-        if frame_idx < len(keypoints_df):
-            kp_row = keypoints_df.iloc[frame_idx]
-            
-            # 提取关键点坐标
-            landmarks_2d = []
-            for i in range(33):
-                col_name = f'landmark_{i}'
-                if col_name in kp_row:
-                    landmark_3d = parse_landmark(kp_row[col_name])
-                    # 转换为像素坐标
-                    x = landmark_3d[0] * frame_width
-                    y = landmark_3d[1] * frame_height
-                    landmarks_2d.append([x, y])
-                else:
-                    landmarks_2d.append([np.nan, np.nan])
-            
-            landmarks_2d = np.array(landmarks_2d)
+        if frame_idx < len(keypoints):
+            # 归一化坐标转换为像素坐标
+            landmarks_2d = np.asarray(keypoints.xyz[frame_idx, :, :2], dtype=np.float64) * np.array([frame_width, frame_height])
             
             # 在视频帧上绘制关键点
             frame = draw_pose_landmarks(frame, landmarks_2d)
@@ -389,7 +379,7 @@ def main():
     
     parser = argparse.ArgumentParser(description="生成带关键点和参数指标的可视化视频")
     parser.add_argument("--video", type=str, required=True, help="原始视频路径")
-    parser.add_argument("--keypoints", type=str, required=True, help="关键点CSV文件路径")
+    parser.add_argument("--keypoints", type=str, required=True, help="关键点文件路径（keypoints.npy / 所在目录 / 旧版CSV）")
     parser.add_argument("--analysis", type=str, required=True, help="分析结果CSV文件路径")
     parser.add_argument("--output", type=str, required=True, help="输出视频路径")
     parser.add_argument("--panel_width", type=int, default=config.VISUALIZATION_CONFIG['PANEL_WIDTH'], help="左侧面板宽度")
@@ -419,7 +409,7 @@ def generate_skeleton_only_video(
     生成纯骨架视频（白色背景）
     
     参数:
-        keypoints_csv: 关键点CSV文件路径
+        keypoints_csv: 关键点文件路径（keypoints.npy / 所在目录 / 旧版CSV）
         output_path: 输出视频路径
         video_width: 视频宽度
         video_height: 视频高度
@@ -432,12 +422,12 @@ def generate_skeleton_only_video(
     
     # 读取关键点数据
     try:
-        keypoints_df = pd.read_csv(keypoints_csv)
+        keypoints = keypoint_store.load_keypoints(keypoints_csv)
     except Exception as e:
-        print(f"[错误] 读取CSV文件失败: {e}")
+        print(f"[错误] 读取关键点数据失败: {e}")
         return None
     
-    print(f"  - 总帧数: {len(keypoints_df)}")
+    print(f"  - 总帧数: {len(keypoints)}")
     
     # 创建输出视频
     # 尝试不同的编码策略
@@ -514,27 +504,12 @@ def generate_skeleton_only_video(
         connections_with_side.append((start_idx, end_idx, side))
     
     # 逐帧生成
-    for frame_idx in range(len(keypoints_df)):
+    for frame_idx in range(len(keypoints)):
         # 创建白色背景
         frame = np.ones((video_height, video_width, 3), dtype=np.uint8) * np.array(background_color, dtype=np.uint8)
         
-        # 获取当前帧的关键点数据
-        kp_row = keypoints_df.iloc[frame_idx]
-        
-        # 提取关键点坐标
-        landmarks_2d = []
-        for i in range(33):
-            col_name = f'landmark_{i}'
-            if col_name in kp_row:
-                landmark_3d = parse_landmark(kp_row[col_name])
-                # 归一化坐标转换为像素坐标
-                x = landmark_3d[0] * video_width
-                y = landmark_3d[1] * video_height
-                landmarks_2d.append([x, y])
-            else:
-                landmarks_2d.append([np.nan, np.nan])
-        
-        landmarks_2d = np.array(landmarks_2d)
+        # 获取当前帧的关键点数据（归一化坐标转换为像素坐标）
+        landmarks_2d = np.asarray(keypoints.xyz[frame_idx, :, :2], dtype=np.float64) * np.array([video_width, video_height])
         
         # 绘制骨架连接线（根据左右侧使用不同颜色）
         for start_idx, end_idx, side in connections_with_side:
@@ -614,14 +589,14 @@ def generate_skeleton_only_video(
         
         # 显示进度
         if (frame_idx + 1) % 100 == 0:
-            progress = ((frame_idx + 1) / len(keypoints_df)) * 100
-            print(f"  - 处理进度: {frame_idx + 1}/{len(keypoints_df)} ({progress:.1f}%)")
+            progress = ((frame_idx + 1) / len(keypoints)) * 100
+            print(f"  - 处理进度: {frame_idx + 1}/{len(keypoints)} ({progress:.1f}%)")
     
     # 释放资源
     out.release()
     
     print(f"[完成] 骨架视频已保存至: {final_output_path}")
-    print(f"  - 共生成 {len(keypoints_df)} 帧")
+    print(f"  - 共生成 {len(keypoints)} 帧")
     
     return final_output_path
 